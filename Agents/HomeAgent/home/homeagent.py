@@ -7,16 +7,18 @@ import random
 import copy
 import time
 import atexit
+import numpy
 
 from volttron.platform.vip.agent import Agent, Core, PubSub, compat, RPC
 from volttron.platform.agent import utils
 from volttron.platform.messaging import headers as headers_mod
 
-from DCMGClasses.CIP import tagClient
+from DCMGClasses.CIP import tagClient, asyncTagClient
 from DCMGClasses.resources.misc import listparse
 from DCMGClasses.resources.mathtools import combin
 from DCMGClasses.resources import control, resource, customer, optimization
 from DCMGClasses.resources.demand import appliances, human
+from DCMGClasses.database import backends, schema, writer, telemetry, archive
 
 
 from . import settings
@@ -73,24 +75,29 @@ class HomeAgent(Agent):
         self.currentTag = "BRANCH_{branch}_BUS_{bus}_LOAD_{load}_Current".format(branch = self.branchNumber, bus = self.busNumber, load = self.loadNumber)
         self.voltageTag = "BRANCH_{branch}_BUS_{bus}_Voltage".format(branch = self.branchNumber, bus = self.busNumber)
         
-        #add dist-packages to python path for mysql module
-        sys.path.append('/usr/lib/python2.7/dist-packages')
-        sys.path.append('/usr/local/lib/python2.7/dist-packages')
-        print(sys.path)
-        import mysql.connector
-        
         #connect to database
-        self.dbconn = mysql.connector.connect(user='smartgrid',password='ugrid123',host='localhost',database='testdbase')
+        self.dbbackend = backends.makeBackend(self.config.get("database"),self.name)
+        #bring the tables up to date, keeping whatever earlier runs logged
+        schema.migrate(self.dbbackend)
+        self.run = schema.startRun(self.dbbackend,self.name)
+        self.dbwriter = writer.BatchWriter(self.dbbackend,settings.DB_BATCH_SIZE,settings.DB_FLUSH_INTERVAL,settings.DB_QUEUE_SIZE)
+        self.dbwriter.start()
+        self.log = telemetry.TelemetryLog(self.dbwriter,self.t0,self.currentPeriodNumber,self.run)
+        
+        #old telemetry is moved into a columnar archive in the background
+        self.archive = archive.Archive("{dir}/{name}".format(dir = settings.ARCHIVE_DIRECTORY, name = self.name))
+        self.compactor = archive.Compactor(self.dbbackend,self.archive,self.name,settings.ARCHIVE_INTERVAL,settings.ARCHIVE_AGE)
+        self.compactor.start()
         
         #create resource objects for resources
         resource.makeResource(self.resources,self.Resources,False)
         
         #create database entries for resources
         for res in self.Resources:
-            self.dbnewresource(res,self.dbconn,self.t0)
+            self.log.resource(res)
         
         #register exit function
-        atexit.register(self.exit_handler,self.dbconn)
+        atexit.register(self.exit_handler)
         
         
         self.Appliances.extend(appliances.makeAppliancesFromList(self.appliances))
@@ -101,7 +108,7 @@ class HomeAgent(Agent):
         
         for app in self.Appliances:
             #add appliance to database
-            self.dbnewappliance(app,self.dbconn,self.t0)
+            self.log.appliance(app)
             
         
 #         for app in self.appliances:
@@ -117,7 +124,7 @@ class HomeAgent(Agent):
 #             appliances.addCostFn(newapp,app)
 #             
 #             #add appliance to database
-#             self.dbnewappliance(newapp,self.dbconn,self.t0)
+#             self.log.appliance(newapp)
 #             
 #             print("ADDED A NEW APPLIANCE TO APPLIANCE LIST:")
 #             newapp.printInfo(1)
@@ -150,6 +157,10 @@ class HomeAgent(Agent):
         end = start + timedelta(seconds = settings.ST_PLAN_INTERVAL)
         
         self.PlanningWindow = control.Window(self.name,self.winlength,1,end,settings.ST_PLAN_INTERVAL)
+        #device models' next states, kept across planning rounds
+        self.transitions = optimization.TransitionCache()
+        #what earlier solves found for each bid group and period
+        self.warmstart = optimization.WarmStart()
         self.CurrentPeriod = control.Period(0,start,end)
         self.NextPeriod = self.PlanningWindow.periods[0]
         self.CurrentPeriod.nextperiod = self.NextPeriod
@@ -181,8 +192,9 @@ class HomeAgent(Agent):
         for res in self.Resources:
             res.disconnectSource()
         
-        #close database connection
-        self.dbconn.close() 
+        #write out queued rows and close database connection
+        self.compactor.stop()
+        self.dbwriter.close()
         
     @Core.receiver('onstart')
     def setup(self,sender,**kwargs):
@@ -212,7 +224,7 @@ class HomeAgent(Agent):
         before = time.time()
         self.NextPeriod.offerprice, self.NextPeriod.plan.optimalcontrol = self.determineOffer(True)
         #add plan to database
-        self.dbnewplan(self.NextPeriod.plan.optimalcontrol,time.time()-before,self.dbconn,self.t0)
+        self.log.plan(self.NextPeriod.plan.optimalcontrol,time.time()-before,self.NextPeriod.periodNumber,self.name)
         
         if settings.DEBUGGING_LEVEL >= 2:
             print("HOMEOWNER {me} generated offer price: {price}".format(me = self.name,price = self.NextPeriod.offerprice))
@@ -234,8 +246,18 @@ class HomeAgent(Agent):
             
     @Core.periodic(settings.RESOURCE_MEASUREMENT_INTERVAL)
     def resourceMeasurement(self):
+        #read every resource's channel in one request
+        taglist = []
+        for res in self.Resources:
+            ch = res.DischargeChannel
+            taglist.extend([ch.unregVtag, ch.unregItag, ch.regVtag, ch.regItag])
+        if not taglist:
+            return
+        meas = tagClient.readTagsDict(taglist)
+        if meas is None:
+            return
         for res in self.Resources:
-            self.dbupdateresource(res,self.dbconn,self.t0)
+            self.log.resstate(res,meas)
         
     @Core.periodic(settings.SIMSTEP_INTERVAL)
     def simStep(self):
@@ -264,7 +286,7 @@ class HomeAgent(Agent):
                 app.simulationStep(frac*app.nominalpower,settings.SIMSTEP_INTERVAL)
                 #update database
                 if self.dbsafe:
-                    self.dbupdateappliance(app,frac*app.nominalpower,self.dbconn,self.t0)
+                    self.log.appstate(app,frac*app.nominalpower)
         #if the unconstrained power demand is lower than the actual power consumption,
         #assume all demand is satisfied and any extra actual consumptio  cn            
         else:    
@@ -273,12 +295,12 @@ class HomeAgent(Agent):
                     app.simulationStep(app.nominalpower,settings.SIMSTEP_INTERVAL)
                     #update database
                     if self.dbsafe:
-                        self.dbupdateappliance(app,app.nominalpower,self.dbconn,self.t0)   
+                        self.log.appstate(app,app.nominalpower)   
                 else:
                     app.simulationStep(0,settings.SIMSTEP_INTERVAL)
                     #update database
                     if self.dbsafe:
-                        self.dbupdateappliance(app,0,self.dbconn,self.t0)
+                        self.log.appstate(app,0)
                     
 #NOW DONE THROUGH PREFERENCE MANAGER OBJECT
 #     def costFn(self,period,statecomps):
@@ -465,95 +487,10 @@ class HomeAgent(Agent):
                                         
             #received when a homeowner's bid has been accepted    
             elif messageSubject == 'bid_acceptance':
-                #if acceptable, update the plan
-                side = mesdict.get("side",None)
-                service = mesdict.get("service",None)
-                amount = mesdict.get("amount",None)
-                rate = mesdict.get("rate",None)
-                periodNumber = mesdict.get("period_number",None)
-                uid = mesdict.get("uid",None)
-    
-                
-                period = self.PlanningWindow.getPeriodByNumber(periodNumber)
-                
-                #amount or rate may have been changed
-                #service also may have been changed from power to regulation
-                if side == "supply":
-                    bid = period.supplybidmanager.findPending(uid)
-                    
-                    #stop processing if bid does not exist
-                    if bid == None:
-                        return
-                    
-                    period.supplybidmanager.bidAccepted(bid,**mesdict)
-                    if bid.resourceName:
-                        name = bid.resourceName
-                        res = listparse.lookUpByName(name,self.Resources)
-                        if service == "power":
-                            period.disposition.components[name] = control.DeviceDisposition(name,amount,"power")
-                        elif service == "reserve":
-                            period.disposition.components[name] = control.DeviceDisposition(name,amount,"reserve",-.2)
-                    
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("-->HOMEOWNER {me} ACK SUPPLY BID ACCEPTANCE".format(me = self.name))
-                        bid.printInfo()
-                        print(" TEMP DEBUG: resname: {rnam}".format(rnam = name))
-                        
-                elif side == "demand":
-                    bid = period.demandbidmanager.findPending(uid)
-                    
-                    #stop processing if the bid doesn't exist
-                    if bid == None:
-                        return
-                
-                    period.demandbidmanager.bidAccepted(bid,**mesdict)
-                    
-                    if bid.resourceName:
-                        name = bid.resourceName
-                        period.disposition.components[name] = control.DeviceDisposition(name,amount,"charge")
-                    else:
-                        period.disposition.closeRelay = True
-                        plan = bid.plan
-                        if plan.optimalcontrol:
-                            print("has opt control")
-                            comps = plan.optimalcontrol.components
-                            for app in self.Appliances:
-                                if app.name in comps:
-                                    if settings.DEBUGGING_LEVEL >= 2:
-                                        print("HOMEOWNER {me} adding appliance disposition for {them} in {per}".format(me = self.name, them = app.name, per = period.periodNumber))
-                                    period.disposition.components[app.name] = control.DeviceDisposition(app.name,comps[app.name],"consumption")
-                                else:
-                                    period.disposition.components[app.name] = control.DeviceDisposition(app.name,0,"consumption")
-                        else:
-                            pass
-                    
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("-->HOMEOWNER {me} ACK DEMAND BID ACCEPTANCE for {id}".format(me = self.name, id = uid))
-                        bid.printInfo()
-                        
-                if settings.DEBUGGING_LEVEL >= 2:
-                    period.disposition.printInfo(0)
+                self.processAcceptance(mesdict)
         
             elif messageSubject == "bid_rejection":
-                side = mesdict.get("side",None)
-                amount = mesdict.get("amount",None)
-                rate = mesdict.get("rate",None)
-                periodNumber = mesdict.get("period_number",None)
-                uid = mesdict.get("uid",None)
-                name = mesdict.get("resource_name",None)
-                
-                period = self.PlanningWindow.getPeriodByNumber(periodNumber)
-                
-                if side == "supply":
-                    bid = period.supplybidmanager.findPending(uid)
-                    period.supplybidmanager.bidRejected(bid)
-                elif side == "demand":
-                    bid = period.demandbidmanager.findPending(uid)
-                    period.demandbidmanager.bidRejected(bid)
-                
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("-->HOMEOWNER {me} ACK BID REJECTION FOR {id}".format(me = self.name, id = bid.uid))
-                        bid.printInfo()
+                self.processRejection(mesdict)
                         
             #subject used for handling general announcements            
             elif messageSubject == "announcement":
@@ -603,26 +540,131 @@ class HomeAgent(Agent):
                         
                         
             elif messageSubject == "rate_announcement":
-                rate = mesdict.get("rate")
-                pnum = mesdict.get("period_number")
-                period = self.PlanningWindow.getPeriodByNumber(pnum)
-                if period:
-                    #print("period exists")
-                    #update expected energy cost variable
-                    period.expectedenergycost = rate
-                    
-                    if period == self.CurrentPeriod:
-                        self.currentSpot = rate
-                        self.priceForecast()
-                    #if the rate announcement is for the next period
-                    elif period == self.NextPeriod:
-                        #print("period is next period")
-                        #and there had either not been an announcement or the announced rate differs
-                        period.firmrate = True
-                
-                if settings.DEBUGGING_LEVEL >= 2:
-                    print("RECEIVED RATE NOTIFICATION FROM {them} FOR PERIOD {per}. NEW RATE IS {rate}".format(them = messageSender, per = pnum, rate = rate))
+                self.processRate(mesdict,messageSender)
+            
+            #the outcomes of all of this home's bids and the rate for the period, in one message
+            elif messageSubject == "market_results":
+                for outcome in mesdict.get("results",[]):
+                    if outcome.get("accepted",False):
+                        self.processAcceptance(outcome)
+                    else:
+                        self.processRejection(outcome)
+                if mesdict.get("rate",None) is not None:
+                    self.processRate(mesdict,messageSender)
     
+    #received when a homeowner's bid has been accepted
+    def processAcceptance(self,mesdict):
+        #if acceptable, update the plan
+        side = mesdict.get("side",None)
+        service = mesdict.get("service",None)
+        amount = mesdict.get("amount",None)
+        rate = mesdict.get("rate",None)
+        periodNumber = mesdict.get("period_number",None)
+        uid = mesdict.get("uid",None)
+
+        
+        period = self.PlanningWindow.getPeriodByNumber(periodNumber)
+        
+        #amount or rate may have been changed
+        #service also may have been changed from power to regulation
+        if side == "supply":
+            bid = period.supplybidmanager.findPending(uid)
+            
+            #stop processing if bid does not exist
+            if bid == None:
+                return
+            
+            period.supplybidmanager.bidAccepted(bid,**mesdict)
+            if bid.resourceName:
+                name = bid.resourceName
+                res = listparse.lookUpByName(name,self.Resources)
+                if service == "power":
+                    period.disposition.components[name] = control.DeviceDisposition(name,amount,"power")
+                elif service == "reserve":
+                    period.disposition.components[name] = control.DeviceDisposition(name,amount,"reserve",-.2)
+            
+            if settings.DEBUGGING_LEVEL >= 2:
+                print("-->HOMEOWNER {me} ACK SUPPLY BID ACCEPTANCE".format(me = self.name))
+                bid.printInfo()
+                print(" TEMP DEBUG: resname: {rnam}".format(rnam = name))
+                
+        elif side == "demand":
+            bid = period.demandbidmanager.findPending(uid)
+            
+            #stop processing if the bid doesn't exist
+            if bid == None:
+                return
+        
+            period.demandbidmanager.bidAccepted(bid,**mesdict)
+            
+            if bid.resourceName:
+                name = bid.resourceName
+                period.disposition.components[name] = control.DeviceDisposition(name,amount,"charge")
+            else:
+                period.disposition.closeRelay = True
+                plan = bid.plan
+                if plan.optimalcontrol:
+                    print("has opt control")
+                    comps = plan.optimalcontrol.components
+                    for app in self.Appliances:
+                        if app.name in comps:
+                            if settings.DEBUGGING_LEVEL >= 2:
+                                print("HOMEOWNER {me} adding appliance disposition for {them} in {per}".format(me = self.name, them = app.name, per = period.periodNumber))
+                            period.disposition.components[app.name] = control.DeviceDisposition(app.name,comps[app.name],"consumption")
+                        else:
+                            period.disposition.components[app.name] = control.DeviceDisposition(app.name,0,"consumption")
+                else:
+                    pass
+            
+            if settings.DEBUGGING_LEVEL >= 2:
+                print("-->HOMEOWNER {me} ACK DEMAND BID ACCEPTANCE for {id}".format(me = self.name, id = uid))
+                bid.printInfo()
+                
+        if settings.DEBUGGING_LEVEL >= 2:
+            period.disposition.printInfo(0)
+
+    def processRejection(self,mesdict):
+        side = mesdict.get("side",None)
+        amount = mesdict.get("amount",None)
+        rate = mesdict.get("rate",None)
+        periodNumber = mesdict.get("period_number",None)
+        uid = mesdict.get("uid",None)
+        name = mesdict.get("resource_name",None)
+        
+        period = self.PlanningWindow.getPeriodByNumber(periodNumber)
+        
+        if side == "supply":
+            bid = period.supplybidmanager.findPending(uid)
+            period.supplybidmanager.bidRejected(bid)
+        elif side == "demand":
+            bid = period.demandbidmanager.findPending(uid)
+            period.demandbidmanager.bidRejected(bid)
+        
+            if settings.DEBUGGING_LEVEL >= 2:
+                print("-->HOMEOWNER {me} ACK BID REJECTION FOR {id}".format(me = self.name, id = bid.uid))
+                bid.printInfo()
+
+    def processRate(self,mesdict,messageSender):
+        rate = mesdict.get("rate")
+        pnum = mesdict.get("period_number")
+        period = self.PlanningWindow.getPeriodByNumber(pnum)
+        if period:
+            #print("period exists")
+            #update expected energy cost variable
+            period.expectedenergycost = rate
+            
+            if period == self.CurrentPeriod:
+                self.currentSpot = rate
+                self.priceForecast()
+            #if the rate announcement is for the next period
+            elif period == self.NextPeriod:
+                #print("period is next period")
+                #and there had either not been an announcement or the announced rate differs
+                period.firmrate = True
+        
+        if settings.DEBUGGING_LEVEL >= 2:
+            print("RECEIVED RATE NOTIFICATION FROM {them} FOR PERIOD {per}. NEW RATE IS {rate}".format(them = messageSender, per = pnum, rate = rate))
+
     def prepareBids(self,period):
         
         #submit bids based on plans
@@ -887,157 +929,126 @@ class HomeAgent(Agent):
         threshold = .005
         #largest step size we can take to bracket the bid rate
         maxstep = 2
-        #initial lower bound for bid rate
-        initprice = 0
-        
-        
-        bound = initprice
-        
-        upper = initprice
-        lower = initprice
-        
-        pstep = .1
-        pstepinc = .2
-        
-        #saves best bid so far so we can fall back on this to avoid submitting null bids when we approach optimal bid from the wrong side
-        savebid = None
-        saveopt = None
         
         #if the bidgroup contains many devices, sacrifice precision for speed
         if len(bidgroup) >= 3:
             maxitr = 4
         else:
             maxitr = 8
+        
+        #search as far from 0 as bracketing in growing steps would have gone
+        span = 0
+        pstep = .1
+        pstepinc = .2
+        for itr in range(maxitr + 1):
+            span += pstep
+            if pstep < maxstep:
+                pstep += pstepinc
             
         #turns debugging on or off for subroutines
         #subdebug = True
         subdebug = False
         
-        start = time.time()
-        rec = self.getOptimalForPrice(bound,bidgroup,subdebug)
-        oneround = time.time() - start
-        print("took {sec} seconds to find initial cost: {cos}".format(sec = oneround, cos = rec.pathcost))
-        
-        itr = 0
-        if rec.pathcost > 0:
-            while rec.pathcost > 0:
-                upper = bound
-                itr += 1
-                bound -= pstep
-                
-                
-                if pstep < maxstep:
-                    pstep += pstepinc
-                    
-                if itr > maxitr:
-                    print("HOMEOWNER {me}: couldn't bracket zero crossing".format(me = self.name))
-                    return 0, rec
-                
-                rec = self.getOptimalForPrice(bound,bidgroup,subdebug)
-                print("bracketing price - price: {pri}, costfn: {cos}".format(pri = bound, cos = rec.pathcost))
-            lower = bound 
-                
-        elif rec.pathcost < 0:
-            while rec.pathcost < 0:
-                lower = bound
-                itr += 1
-                bound += pstep
-                
-                
-                if pstep < maxstep:
-                    pstep += pstepinc
-                    
-                if itr > maxitr:
-                    print("HOMEOWNER {me}: couldn't bracket zero crossing".format(me = self.name))
-                    return 0, rec
-                
-                rec = self.getOptimalForPrice(bound,bidgroup,subdebug)                
-                print("bracketing price - price: {pri}, costfn: {cos}".format(pri = bound, cos = rec.pathcost))
-            upper = bound
-        else:
-            #got it right the first time
-            return bound, rec
+        #every price tried and its recommended input, to fall back on when the offer
+        #would be for a null action
+        tried = []
+        price = None
         
-        if bound == initprice:
-            return
-            
-#         if bound < initprice:
-#             lower = bound
-#             upper = initprice
-#         elif bound > initprice:
-#             lower = initprice
-#             upper = bound
-#         else:
-#             return 
-        
-        print("bracketed price - upper: {upp}, lower: {low}".format(upp = upper, low = lower))
-        
-            
-        itr = 0
-        while abs(rec.pathcost) > threshold:
-            
-            mid = (upper + lower)*.5
-            
+        start = time.time()
+        prices = numpy.linspace(-span,span,settings.OFFER_SWEEP_POINTS)
+        for sweep in range(settings.OFFER_SWEEPS):
             before = time.time()
-            rec = self.getOptimalForPrice(mid,bidgroup,subdebug)
+            recs = self.getOptimalForPrices(list(prices),bidgroup,subdebug)
             after = time.time()
-            print("new cost {cos} for price {mid}. iteration took {sec} seconds".format(cos = rec.pathcost, mid = mid, sec = after - before))
-            
-            if rec.pathcost > 0:
-                upper = mid
-            elif rec.pathcost < 0:
-                lower = mid
-            else:
-                pass
-            
-            itr += 1
+            if recs is None:
+                self.setWindowPrice(0)
+                return 0, None
+            results = [(float(p), rec) for p, rec in zip(prices,recs) if rec]
+            tried.extend(results)
+            print("swept {n} prices from {low} to {upp}. took {sec} seconds".format(n = len(prices), low = prices[0], upp = prices[-1], sec = after - before))
             
-            #temporary debugging
-            print("new range {low} - {upp}".format(low = lower, upp = upper))
+            for p, rec in results:
+                if abs(rec.pathcost) <= threshold:
+                    price = p
+                    break
+            if price is not None:
+                break
             
-            if abs(upper - lower) < .01:
-                if settings.DEBUGGING_LEVEL >= 1:
-                    print("HOMEOWNER {me} has narrowed the price window without reducing cost sufficiently. RANGE: {lower}-{upper} COST: {cost}".format(me = self.name,lower = lower, upper = upper, cost = rec.pathcost))
-                return (upper + lower)*.5, rec
+            #the cost rises with the price, so the crossing is where it goes from
+            #negative to positive
+            bracket = None
+            for (low, lowrec), (upp, upprec) in zip(results,results[1:]):
+                if lowrec.pathcost < 0 and upprec.pathcost > 0:
+                    bracket = low, lowrec, upp, upprec
+                    break
+            if bracket is None:
+                print("HOMEOWNER {me}: couldn't bracket zero crossing".format(me = self.name))
+                self.setWindowPrice(0)
+                if not results:
+                    return 0, None
+                nearest = min(results,key = lambda result: abs(result[0]))
+                return 0, nearest[1]
             
-            if itr > maxitr:
-                if settings.DEBUGGING_LEVEL >= 1:
-                    elapsed = time.time() - start
-                    print("HOMEOWNER {me} took too many iterations ({sec} seconds) to generate offer price. RANGE: {lower}-{upper} COST: {cost}".format(me = self.name, sec = elapsed, lower = lower, upper = upper, cost = rec.pathcost))
-                    if rec.isnull():
-                        if saveopt:
-                            print("avoiding null bid by submitting saved bid. bid: {bid} for {act}".format(bid = savebid, act = saveopt.components))
-                            return savebid, saveopt
-                        else:
-                            print("no saved bid to fall back on submit null bid")
-                            return 0,rec
-                    else:
-                        return (upper + lower)*.5, rec
-            
-            #bids associated with null actions by saving acceptable non-null bids
-            if mid > 0 and rec.pathcost <= 0:
-                print("HOMEOWNER {me} not saving bid because it is null".format(me = self.name))
-                if not rec.isnull():
-                    saveopt = rec
-                    savebid = mid
-                    print("HOMEOWNER {me} saving acceptable bid: {bid} for action: {act}".format(me = self.name, bid = savebid, act = saveopt.components))
-        
-        price = (upper + lower)*.5
+            lower, lowrec, upper, upprec = bracket
+            print("bracketed price - upper: {upp}, lower: {low}".format(upp = upper, low = lower))
+            if upper - lower < .01:
+                break
+            prices = numpy.linspace(lower,upper,settings.OFFER_SWEEP_POINTS)
+        
+        if price is None:
+            #between two close prices the cost is nearly linear in the price, so the
+            #crossing is estimated by interpolation. it isn't exactly linear, e.g. a
+            #battery's input cost is scaled by 1 - erf(price/replacementcost), so an
+            #estimate that misses gives way to whichever end of the bracket is closer
+            price = lower - lowrec.pathcost*(upper - lower)/(upprec.pathcost - lowrec.pathcost)
+            rec = self.getOptimalForPrice(price,bidgroup,subdebug)
+            if not rec or abs(rec.pathcost) > threshold:
+                if abs(lowrec.pathcost) <= abs(upprec.pathcost):
+                    price, rec = lower, lowrec
+                else:
+                    price, rec = upper, upprec
+        
         elapsed = time.time() - start
         if settings.DEBUGGING_LEVEL >= 2:
             print("HOMEOWNER {me} determined offer price: {bid} (took {et} seconds)".format(me = self.name, bid = price, et = elapsed))
         
-        if rec.isnull():
-            if saveopt:
+        if not rec or rec.isnull():
+            #avoid bids associated with null actions by falling back on the highest
+            #acceptable price with a non-null action
+            saved = [(p, r) for p, r in tried if p > 0 and r.pathcost <= 0 and not r.isnull()]
+            if saved:
+                savebid, saveopt = max(saved,key = lambda result: result[0])
                 print("avoiding null bid by submitting saved bid. bid: {bid} for {act}".format(bid = savebid, act = saveopt.components))
+                self.setWindowPrice(savebid)
                 return savebid, saveopt
             else:
                 print("no saved bid to fall back on submit null bid")
+                self.setWindowPrice(0)
                 return 0,rec
         else:
+            self.setWindowPrice(price)
             return price, rec
     
+    '''expects every period in the planning window to cost price. the sweeps leave the
+    periods at whatever price was tried last, and periods appended to the window later
+    start out at the price of the last one'''
+    def setWindowPrice(self,price):
+        for period in self.PlanningWindow.periods:
+            period.setExpectedCost(price)
+    
     def getOptimalForPrice(self,price,bidgroup,debug = False):
+        recs = self.getOptimalForPrices([price],bidgroup,debug)
+        if recs and recs[0]:
+            return recs[0]
+        else:
+            if debug:
+                print("no recommended action")
+            return 0
+    
+    '''solves the planning window for every price in prices in one pass and returns the
+    recommended input from the current state for each price, or None where there is no
+    recommendation. the path costs are kept as arrays with a column for each price'''
+    def getOptimalForPrices(self,prices,bidgroup,debug = False):
         #to do list:
         #the last period should not have a stategrid made, instead, just evaluate the costfn for the simulated terminal states in the penultimate period
         #the first period does not need a stategrid either, just evaluate the actual state
@@ -1045,7 +1056,7 @@ class HomeAgent(Agent):
         
         
         if debug:
-            print("HOMEOWNER {me} starting new iteration".format(me = self.name))
+            print("HOMEOWNER {me} starting new iteration for {n} prices".format(me = self.name, n = len(prices)))
             
         #window = control.Window(self.name,self.winlength,self.NextPeriod.periodNumber,self.NextPeriod.startTime,settings.ST_PLAN_INTERVAL)
         window = self.PlanningWindow
@@ -1060,9 +1071,11 @@ class HomeAgent(Agent):
         if debug:
             print("HOMEOWNER {me} saving current state: {sta}".format(me =  self.name, sta = snapstate))
         
+        #path cost of each state of the period after the one being worked on
+        values = None
+        choices = None
         selperiod = window.periods[-1]
         while selperiod:
-            selperiod.expectedenergycost = price
             #begin sub
             if debug:
                 print(">HOMEOWNER {me} now working on period {per}".format(me = self.name, per = selperiod.periodNumber))
@@ -1076,62 +1089,41 @@ class HomeAgent(Agent):
             if not plan.stategrid.grid:
                 print("Homeowner {me} encountered a missing state grid for period {per}".format(me = self.name, per = selperiod.periodNumber))
                 return
-            for state in plan.stategrid.grid:
-                #if this is not the last period
-                if selperiod.nextperiod:
-                    if debug:
-                        print(">WORKING ON A NEW STATE: {sta}".format(sta = state.components))
-                    #make inputs for the state currently being examined
-                    self.makeInputs(state,plan,debug)
-                    if debug:
-                        print(">EVALUATING {n} ACTIONS".format(n = len(plan.admissiblecontrols)))
-                    
-                    #find the best input for this state
-                    currentbest = float('inf')
-                    for input in plan.admissiblecontrols:
-                        self.findInputCost(state,input,plan,settings.ST_PLAN_INTERVAL,debug)
-                        if input.pathcost < currentbest:
-                            if debug:
-                                print(">NEW BEST OPTION! {newcost} < {oldcost}".format(newcost = input.pathcost, oldcost = currentbest))
-                            currentbest = input.pathcost
-                            #associate state with optimal input
-                            state.setoptimalinput(input)
-                        #else:
-                        #    if debug:
-                        #        print(">NO BETTER: {newcost} >= {oldcost}".format(newcost = input.pathcost, oldcost = currentbest))
-                    
-                    
-                    if debug:
-                        print(">HOMEOWNER {me}: optimal input for state {sta} is {inp}".format(me = self.name, sta = state.components, inp = state.optimalinput.components))
-                else:
-                    if debug:
-                        print(">HOMEOWNER {me}: this is the final period in the window".format(me = self.name))
+            #if this is not the last period
+            if selperiod.nextperiod:
+                values, choices, inputs = self.optimizeStage(plan,settings.ST_PLAN_INTERVAL,prices,values,debug)
+            else:
+                if debug:
+                    print(">HOMEOWNER {me}: this is the final period in the window".format(me = self.name))
+                    for state in plan.stategrid.grid:
                         state.printInfo()
             
+            selperiod.expectedenergycost = prices[-1]
             selperiod = selperiod.previousperiod
             #end sub
             
         for dev in plan.devices:
             dev.revertStateGrid()
-               
+        
+        recs = [None]*len(prices)
+        if choices is None:
+            return recs
+        
         #get beginning of path from current state
         plan = window.periods[0].getplan(bidgroup)
         curstate = plan.stategrid.match(snapstate)
-        if curstate:
-            recaction = curstate.optimalinput
-        else:
+        if not curstate:
             if debug:
                 print("no state match found for {snap}".format(snap = snapstate))
-            recaction = None
-            
-        if recaction:
-            #return recaction.pathcost
-            return recaction
-        else:
-            if debug:
-                print("no recommended action")
-            return 0
-            
+            return recs
+        
+        i = plan.stategrid.grid.index(curstate)
+        for p in range(len(prices)):
+            k = choices[i,p]
+            if k >= 0:
+                recs[p] = optimization.InputSignal(dict(inputs[k].components),inputs[k].gridconnected,inputs[k].drevent)
+                recs[p].pathcost = float(values[i,p])
+        return recs
             
         
     def takeStateSnapshot(self):
@@ -1144,55 +1136,149 @@ class HomeAgent(Agent):
             
         
                 
-    def findInputCost(self,state,input,plan,duration,debug = False):
+    '''finds the optimal input for every point of the plan's state grid and every price
+    at once. nextvalues holds the path costs of the next plan's grid points, with a
+    column for each price, or None if the next period is the last. returns the path
+    costs of this plan's grid points, the index of each one's optimal input in inputs
+    (-1 where no input is admissible) and inputs. what earlier solves for the same
+    period found is reused wherever it can't have changed'''
+    def optimizeStage(self,plan,duration,prices,nextvalues,debug = False):
         period = plan.period
-        
-        if debug:
-            print(">>HOMEOWNER {me}: finding cost for input {inp}".format(me = self.name, inp = input.components))
-        #find next state if this input is applied
-        comps = self.applySimulatedInput(state,input,duration,False)
+        grid = plan.stategrid.grid
+        inputs = self.makeInputs(plan,debug)
+        nstates = len(grid)
+        ninputs = len(inputs)
+        nprices = len(prices)
+        if not inputs:
+            return numpy.full((nstates,nprices),numpy.nan), numpy.full((nstates,nprices),-1,dtype = int), inputs
+        
+        names = sorted(grid[0].components.keys())
+        keys = [tuple([state.components[name] for name in names]) for state in grid]
+        memo = self.warmstart.memo(plan.devices,period.periodNumber)
+        memo.setInputs([(tuple(sorted(input.components.items())),input.gridconnected,input.drevent) for input in inputs])
+        
+        new = [state for state, key in zip(grid,keys) if key not in memo.rows]
+        if new:
+            self.evaluateRows(plan,new,inputs,names,duration,memo)
+        allowed = numpy.array([memo.rows[key][0] for key in keys])
+        nextstates = numpy.array([memo.rows[key][1] for key in keys])
+        statecosts = numpy.array([memo.rows[key][2] for key in keys])
+        
+        #cost of getting to the next state at each price. none of the devices' input
+        #costs depend on the state the input is applied in
+        transcosts = numpy.zeros((ninputs,nprices))
+        for p, price in enumerate(prices):
+            if price in memo.solutions:
+                transcosts[:,p] = memo.solutions[price].inputcosts
+                continue
+            period.nextperiod.expectedenergycost = price
+            for k, input in enumerate(inputs):
+                for key in input.components:
+                    dev = listparse.lookUpByName(key,self.Devices)
+                    transcosts[k,p] += dev.inputCostFn(input.components[key],period.nextperiod,None,duration)
         
         #if the next period is not the last, consider the path cost from that point forward
-        if period.nextperiod.nextperiod:
-            #cost of optimal path from next state forward
-            #pathcost = period.nextperiod.plan.stategrid.interpolatepath(comps,False)
-            pathcost = plan.nextplan.stategrid.interpolatepath(comps,False)
+        if nextvalues is not None and names:
+            nextgrid = plan.nextplan.stategrid
+            nextkeys = tuple([tuple([point.components[name] for name in names]) for point in nextgrid.grid])
+            #the weights only change when this plan's or the next plan's grid does
+            if memo.weights[0] == (keys,nextkeys):
+                weights = memo.weights[1]
+            else:
+                weights = nextgrid.interpolationWeights(nextstates.reshape(-1,len(names)),names)
+                memo.weights = ((keys,nextkeys),weights)
         else:
-            #otherwise, only consider the statecost 
-            pathcost = 0
-        #add cost of being in next state for next period
-        
-        #evaluate the state cost function
-        pathcost += self.Preferences.eval(period,comps)
-        
-        #cost of getting to next state with t
-        totaltrans = 0
-        for key in input.components:
-            dev = listparse.lookUpByName(key, self.Devices)
-            totaltrans += dev.inputCostFn(input.components[key],period.nextperiod,state,duration)
-        input.pathcost = pathcost + totaltrans
+            nextkeys = None
+            weights = None
+        
+        #a state keeps the optimal input it had for the same price last time unless one of
+        #the next plan's path costs its inputs lead to has changed since
+        values = numpy.empty((nstates,nprices))
+        choices = numpy.empty((nstates,nprices),dtype = int)
+        dirty = numpy.ones((nstates,nprices),dtype = bool)
+        for p, price in enumerate(prices):
+            last = memo.solutions.get(price)
+            if last is None or last.nextkeys != nextkeys:
+                continue
+            if weights is None:
+                depends = numpy.zeros(nstates,dtype = bool)
+            else:
+                column = nextvalues[:,p]
+                #a missing path cost changes every interpolated value
+                if numpy.isnan(column).any() or numpy.isnan(last.nextvalues).any():
+                    continue
+                changed = column != last.nextvalues
+                depends = (weights[:,changed] != 0).any(axis = 1).reshape(nstates,ninputs).any(axis = 1)
+            for i, key in enumerate(keys):
+                if not depends[i] and key in last.values:
+                    values[i,p], choices[i,p] = last.values[key]
+                    dirty[i,p] = False
+        
+        rows = dirty.any(axis = 1)
+        nrows = rows.sum()
+        if nrows:
+            total = statecosts[rows][:,:,None] + transcosts[None,:,:]
+            if weights is not None:
+                rowweights = weights.reshape(nstates,ninputs,-1)[rows].reshape(nrows*ninputs,-1)
+                total += nextgrid.weightedPaths(rowweights,nextvalues).reshape(nrows,ninputs,nprices)
+            total[~allowed[rows]] = float('inf')
+            best = numpy.argmin(total,axis = 1)
+            bestvalues = total[numpy.arange(nrows)[:,None],best,numpy.arange(nprices)[None,:]]
+            #a state without an admissible input has no optimal input
+            missing = numpy.isinf(bestvalues)
+            best[missing] = -1
+            bestvalues[missing] = numpy.nan
+            values[rows] = numpy.where(dirty[rows],bestvalues,values[rows])
+            choices[rows] = numpy.where(dirty[rows],best,choices[rows])
+        
+        for p, price in enumerate(prices):
+            nextcolumn = nextvalues[:,p].copy() if weights is not None else None
+            memo.addSolution(price,optimization.StageSolution(nextkeys,nextcolumn,transcosts[:,p].copy(),dict(zip(keys,zip(values[:,p],choices[:,p])))))
+        self.warmstart.evaluated += int(dirty.sum())
+        self.warmstart.reused += int(dirty.size - dirty.sum())
         
         if debug:
-            print(">>HOMEOWNER {me}: transition to state: {sta}".format(me = self.name, sta = comps))
-            print(">>HOMEOWNER {me}: transition cost is {trans}, total path cost is {path}".format(me = self.name, trans = totaltrans, path = input.pathcost))
+            for i, state in enumerate(grid):
+                print(">HOMEOWNER {me}: optimal inputs for state {sta} are {inp}".format(me = self.name, sta = state.components, inp = [inputs[k].components if k >= 0 else None for k in choices[i]]))
         
-        return input.pathcost
+        plan.setAdmissibleInputs(inputs)
+        return values, choices, inputs
     
-            
-    def applySimulatedInput(self,state,input,duration,debug = False):
-        total = 0
-        newstatecomps = {}
-        
-        for devname in state.components:
-            devstate = state.components[devname]
-            devinput = input.components[devname]
-            newstate = listparse.lookUpByName(devname,self.Devices).applySimulatedInput(devstate,devinput,duration)
-            newstatecomps[devname] = newstate
-        
-        if debug:
-            print(">>>HOMEOWNER {me}: starting state is {start}, ending state is {end}".format(me = self.name, start = state.components, end = newstatecomps))
-        
-        return newstatecomps
+    '''works out which inputs are admissible in each of the given states, where each
+    input leads and what being there costs, none of which depend on the price, and
+    keeps them in memo'''
+    def evaluateRows(self,plan,states,inputs,names,duration,memo):
+        period = plan.period
+        stategrid = numpy.array([[state.components[name] for name in names] for state in states],dtype = float)
+        actions = numpy.array([[input.components[name] for name in names] for input in inputs],dtype = float)
+        nstates = len(states)
+        ninputs = len(inputs)
+        
+        allowed = numpy.array([[self.admissibleInput(input,state,plan,False) for input in inputs] for state in states],dtype = bool)
+        
+        #a device's next state depends only on its own state and input, so each distinct
+        #pair is looked up once and the results are spread over every state and input
+        nextstates = numpy.empty((nstates,ninputs,len(names)))
+        for j, name in enumerate(names):
+            dev = listparse.lookUpByName(name,self.Devices)
+            statevals, stateindex = numpy.unique(stategrid[:,j],return_inverse = True)
+            actionvals, actionindex = numpy.unique(actions[:,j],return_inverse = True)
+            table = self.transitions.table(dev,[float(sv) for sv in statevals],[float(av) for av in actionvals],duration)
+            nextstates[:,:,j] = table[stateindex][:,actionindex]
+        
+        #cost of being in the next state for the next period. many state and input pairs
+        #end up in the same state, so each next state is evaluated once
+        statecosts = numpy.empty((nstates,ninputs))
+        evaluated = {}
+        for i in range(nstates):
+            for k in range(ninputs):
+                key = tuple(nextstates[i,k])
+                if key not in evaluated:
+                    evaluated[key] = self.Preferences.eval(period,dict(zip(names,[float(x) for x in key])))
+                statecosts[i,k] = evaluated[key]
+        
+        for i, state in enumerate(states):
+            memo.rows[tuple([state.components[name] for name in names])] = (allowed[i], nextstates[i], statecosts[i])
         
 #     def makeDPGrid(self,period,bidgroup,debug = False):
 #         inputdict = {}
@@ -1214,7 +1300,9 @@ class HomeAgent(Agent):
 #             print("HOMEOWNER {me} made state grid for period {per} with {num} points".format(me = self.name, per = period.periodNumber, num = len(period.plan.stategrid.grid)))
 #         
         
-    def makeInputs(self,state,plan,debug = False):
+    '''every input that could be given to the plan's devices, whether or not it is
+    admissible in a particular state'''
+    def makeInputs(self,plan,debug = False):
         inputdict = {}
         inputs = []
         
@@ -1224,8 +1312,6 @@ class HomeAgent(Agent):
             if dev.actionpoints:
                 if len(plan.devices) >= 3:
                     inputdict[dev.name] = dev.getActionpoints("lofi")
-                elif len(plan.devices) == 1:
-                    inputdict[dev.name] = dev.getActionpoints()
                 else:
                     inputdict[dev.name] = dev.getActionpoints()
             
@@ -1235,27 +1321,19 @@ class HomeAgent(Agent):
         #grid connected inputs
         if period.pendingdrevents:
             for devact in devactions:
-                newinput = optimization.InputSignal(devact,True,period.pendingdrevents[0])
-                
-                if self.admissibleInput(newinput,state,plan,False):
-                    inputs.append(newinput)
+                inputs.append(optimization.InputSignal(devact,True,period.pendingdrevents[0]))
         
         #no DR participation
         for devact in devactions:
-            newinput = optimization.InputSignal(devact,True,None)
-                
-            if self.admissibleInput(newinput,state,plan,False):
-                inputs.append(newinput)
+            inputs.append(optimization.InputSignal(devact,True,None))
             
         #non grid connected inputs
         #do this later... needs special consideration
         
         if debug:
             print("HOMEOWNER {me} made input list for period {per} with {num} points".format(me = self.name, per = period.periodNumber, num = len(inputs)))
-
         
-        plan.setAdmissibleInputs(inputs)
-
+        return inputs
         
     def admissibleInput(self,input,state,plan,debug = False):
         #sum power from all components
@@ -1396,6 +1474,7 @@ class HomeAgent(Agent):
         self.CurrentPeriod = self.PlanningWindow.periods[0]
         self.PlanningWindow.shiftWindow()
         self.NextPeriod = self.PlanningWindow.periods[0]
+        self.warmstart.expire(self.NextPeriod.periodNumber)
         
         #request forecast
         for period in self.PlanningWindow.periods:
@@ -1420,7 +1499,7 @@ class HomeAgent(Agent):
         #add plan to database
         if self.NextPeriod.plans:
             for plan in self.NextPeriod.plans:
-                self.dbnewplan(plan.optimalcontrol,time.time()-before,self.dbconn,self.t0)
+                self.log.plan(plan.optimalcontrol,time.time()-before,self.NextPeriod.periodNumber,self.name)
                 plan.planningcomplete = True
                 
 #         if settings.DEBUGGING_LEVEL >= 2:
@@ -1455,32 +1534,34 @@ class HomeAgent(Agent):
     def enactPlan(self,period):
         comps = period.disposition.components
         
-        #operate main relay
-        if period.disposition.closeRelay:
-            self.connectLoad()
-            if settings.DEBUGGING_LEVEL >= 2:
-                print("HOMEOWNER {me} connecting load in period {per}".format(me = self.name, per = period.periodNumber))
-        else:
-            self.disconnectLoad()
-        
-        #update resource dispositions
-        for res in self.Resources:
-            #is the resource in this period's disposition?
-            if res.name in comps:
-                devdisp = comps[res.name]
-                if devdisp.mode == "power":
-                    res.setDisposition(devdisp.value)
-                elif devdisp.mode == "reserve":
-                    if devdisp.param:
-                        res.setDisposition(devdisp.value,devdisp.param)
+        #relay and setpoint writes go out in one message
+        with tagClient.WriteBatch(confirm = True):
+            #operate main relay
+            if period.disposition.closeRelay:
+                self.connectLoad()
+                if settings.DEBUGGING_LEVEL >= 2:
+                    print("HOMEOWNER {me} connecting load in period {per}".format(me = self.name, per = period.periodNumber))
+            else:
+                self.disconnectLoad()
+        
+            #update resource dispositions
+            for res in self.Resources:
+                #is the resource in this period's disposition?
+                if res.name in comps:
+                    devdisp = comps[res.name]
+                    if devdisp.mode == "power":
+                        res.setDisposition(devdisp.value)
+                    elif devdisp.mode == "reserve":
+                        if devdisp.param:
+                            res.setDisposition(devdisp.value,devdisp.param)
+                        else:
+                            print("{dev} has no param even though it's a reserve. i wonder why.".format(dev = res.name))
+                            res.setDisposition(devdisp.value,-.2)
                     else:
-                        print("{dev} has no param even though it's a reserve. i wonder why.".format(dev = res.name))
-                        res.setDisposition(devdisp.value,-.2)
+                        pass
+                #if not, we should make sure the device is disconnected
                 else:
-                    pass
-            #if not, we should make sure the device is disconnected
-            else:
-                res.setDisposition(0)
+                    res.setDisposition(0)
                 
         #keep track of simulated device states
         for app in self.Appliances:
@@ -1527,53 +1608,32 @@ class HomeAgent(Agent):
         return tagClient.readTags([self.currentTag])
     
     def measurePower(self):
-        return self.measureVoltage()*self.measureCurrent()
+        tagvals = tagClient.readTagsDict([self.voltageTag, self.currentTag])
+        return tagvals[self.voltageTag]*tagvals[self.currentTag]
     
     def measureNetPower(self):
-        net = self.measurePower()
+        #start the load and resource measurements together instead of one after another
+        loadreq = asyncTagClient.callAsync(self.measurePower)
+        sourcereqs = []
+        sinkreqs = []
         for res in self.Resources:
             #if resources are colocated, we have to account for their power contribution/consumption
             if res.location == self.location:
                 if res.issource:
-                    net += res.getOutputRegPower()
+                    sourcereqs.append(asyncTagClient.callAsync(res.getOutputRegPower))
                 if res.issink:
-                    net -= res.getInputUnregPower()
+                    sinkreqs.append(asyncTagClient.callAsync(res.getInputUnregPower))
+                    
+        net = loadreq.get(settings.TAG_READ_TIMEOUT)
+        for req in sourcereqs:
+            net += req.get(settings.TAG_READ_TIMEOUT)
+        for req in sinkreqs:
+            net -= req.get(settings.TAG_READ_TIMEOUT)
         return net
         
-    def dbnewappliance(self, newapp, dbconn, t0):
-        command = 'INSERT INTO appliances VALUES("{time}",{et},"{name}","{type}","{owner}",{pow})'.format(time = datetime.utcnow().isoformat(), et = time.time()-t0, name = newapp.name, type = newapp.__class__.__name__, owner = newapp.owner, pow = newapp.nominalpower)
-        self.dbwrite(command,dbconn)
-        
-        
-    def dbnewresource(self, newres, dbconn, t0):
-        command = 'INSERT INTO resources VALUES("{time}",{et},"{name}","{type}","{owner}","{loc}", {pow})'.format(time = datetime.utcnow().isoformat(), et = time.time()-t0, name = newres.name, type = newres.__class__.__name__,owner = newres.owner, loc = newres.location, pow = newres.maxDischargePower)
-        self.dbwrite(command,dbconn)
-        
-        
-    def dbupdateappliance(self, app, power, dbconn, t0):
-        command = 'INSERT INTO appstate VALUES ("{time}",{et},{per},"{name}",{state},{pow})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, name = app.name, state = app.getStateEng(), pow = power)
-        self.dbwrite(command,dbconn)
-        
-    def dbupdateresource(self,res,dbconn,t0):
-        ch = res.DischargeChannel
-        meas = tagClient.readTags([ch.unregVtag, ch.unregItag, ch.regVtag, ch.regItag])
-        command = 'INSERT INTO resstate (logtime, et, period, name, connected, reference_voltage, setpoint, inputV, inputI, outputV, outputI) VALUES ("{time}",{et},{per},"{name}",{conn},{refv},{setp},{inv},{ini},{outv},{outi})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, name = res.name, conn = int(res.connected), refv = ch.refVoltage, setp = ch.setpoint, inv = meas[ch.unregVtag], ini = meas[ch.unregItag] , outv = meas[ch.regVtag], outi = meas[ch.regItag])
-        self.dbwrite(command,dbconn)
+    def currentPeriodNumber(self):
+        return self.CurrentPeriod.periodNumber
     
-    def dbnewplan(self, action, plantime, dbconn, t0):
-        command = 'INSERT INTO plans VALUES ("{time}",{et},{per},{pt},"{planner}",{cost},"{action}")'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.NextPeriod.periodNumber, pt = plantime, planner = self.name, cost = action.pathcost, action = json.dumps(action.components).replace('"',' '))
-        self.dbwrite(command,dbconn)
-            
-               
-    def dbwrite(self,command,dbconn):
-        try:
-            cursor = dbconn.cursor()
-            cursor.execute(command)
-            dbconn.commit()
-            cursor.close()
-        except Exception as e:
-            print(e)
-            
     def printInfo(self,depth):
         print("\n________________________________________________________________")
         print("~~SUMMARY OF HOME STATE~~")
@@ -9,5 +9,25 @@ SIMSTEP_INTERVAL = 5
 
 ASSUMED_RATE = .1
 
+#offer prices are found by solving the planning window for this many prices at once,
+#then again over the narrower range around the zero crossing, up to OFFER_SWEEPS times
+OFFER_SWEEP_POINTS = 21
+OFFER_SWEEPS = 3
+
 #interval in seconds between resource current and voltage measurements
-RESOURCE_MEASUREMENT_INTERVAL = 10
\ No newline at end of file
+RESOURCE_MEASUREMENT_INTERVAL = 10
+#seconds to wait on tag reads that are in flight before giving up
+TAG_READ_TIMEOUT = 2.0
+
+#database rows are written from a background thread in batches of up to this many
+DB_BATCH_SIZE = 200
+#seconds a logged row may wait before its batch is written
+DB_FLUSH_INTERVAL = 1.0
+#rows allowed to wait on the writer before new ones are dropped
+DB_QUEUE_SIZE = 10000
+
+#telemetry older than ARCHIVE_AGE seconds is moved out of the database into a
+#columnar archive under ARCHIVE_DIRECTORY/<agent name> every ARCHIVE_INTERVAL seconds
+ARCHIVE_DIRECTORY = "~/dcmg_data/archive"
+ARCHIVE_INTERVAL = 3600
+ARCHIVE_AGE = 3600
@@ -44,6 +44,9 @@ INF_CURRENT_MEASUREMENT_INTERVAL = 5
 #interval between infrastructure efficiency measurements for database
 INF_EFF_MEASUREMENT_INTERVAL = 15
 
+#tag reads issued within this many seconds of each other are sent as one request
+TAG_COALESCE_WINDOW = .005
+
 ##OTHER STUFF
 #upper and lower limits for acceptable voltage band
 VOLTAGE_BAND_LOWER = 11.6
@@ -53,3 +56,34 @@ VOLTAGE_BAND_UPPER = 12.0
 VOLTAGE_LOW_EMERGENCY_THRESHOLD = 10.6
 
 UNACCOUNTED_CURRENT_THRESHOLD = 0.35
+
+#longest seconds between requests for subscribed infrastructure tags. a tag server
+#that can watch tags answers as soon as one changes, one that can't is read this often
+SUBSCRIPTION_POLL_INTERVAL = 5
+#seconds between reads of the currents fault detection uses, when the tag server can't
+#watch them
+SUBSCRIPTION_FAST_INTERVAL = .5
+#subscribers only hear about currents and voltages that move more than this
+CURRENT_DEADBAND = .05
+VOLTAGE_DEADBAND = .05
+
+#database rows are written from a background thread in batches of up to this many
+DB_BATCH_SIZE = 200
+#seconds a logged row may wait before its batch is written
+DB_FLUSH_INTERVAL = 1.0
+#rows allowed to wait on the writer before new ones are dropped
+DB_QUEUE_SIZE = 10000
+
+#telemetry older than ARCHIVE_AGE seconds is moved out of the database into a
+#columnar archive under ARCHIVE_DIRECTORY/<agent name> every ARCHIVE_INTERVAL seconds
+ARCHIVE_DIRECTORY = "~/dcmg_data/archive"
+ARCHIVE_INTERVAL = 3600
+ARCHIVE_AGE = 3600
+
+#infrastructure measurements are stored as min/max/mean/last over windows of these
+#lengths in seconds instead of one row per reading
+ROLLUP_WINDOWS = [60]
+#raw readings kept per signal, written out when a fault is suspected
+RAW_BUFFER_SIZE = 24
+#seconds after a suspected fault during which raw readings are written as well
+FAULT_RAW_SECONDS = 120
@@ -13,10 +13,11 @@ from volttron.platform.vip.agent import Agent, BasicCore, core, Core, PubSub, co
 from volttron.platform.agent import utils
 from volttron.platform.messaging import headers as headers_mod
 
-from DCMGClasses.CIP import tagClient
+from DCMGClasses.CIP import tagClient, subscriptions
 from DCMGClasses.resources.misc import listparse, schedule, faults
 from DCMGClasses.resources.mathtools import graph
-from DCMGClasses.resources import resource, groups, control, customer
+from DCMGClasses.resources import resource, groups, control, customer, stats, market
+from DCMGClasses.database import backends, schema, writer, telemetry, archive
 
 
 from . import settings
@@ -77,61 +78,35 @@ class UtilityAgent(Agent):
         self.supplyBidList = []
         self.demandBidList = []
         self.reserveBidList = []
+        #finds the group each bid belongs to as it arrives
+        self.groupIndex = market.GroupIndex()
         
         self.outstandingSupplyBids = []
         self.outstandingDemandBids = []
         
-        sys.path.append('/usr/lib/python2.7/dist-packages')
-        sys.path.append('/usr/local/lib/python2.7/dist-packages')
-        print(sys.path)
-        import mysql.connector
-        
         #DATABASE STUFF
-        self.dbconn = mysql.connector.connect(user='smartgrid',password='ugrid123',host='localhost',database='testdbase')
-
-        cursor = self.dbconn.cursor()
-        
-        #recreate database tables
-        cursor.execute('DROP TABLE IF EXISTS infmeas')
-        cursor.execute('DROP TABLE IF EXISTS faults')
-        cursor.execute('DROP TABLE IF EXISTS customers')
-        cursor.execute('DROP TABLE IF EXISTS bids')
-        cursor.execute('DROP TABLE IF EXISTS prices')
-        cursor.execute('DROP TABLE IF EXISTS drevents')
-        cursor.execute('DROP TABLE IF EXISTS transactions')
-        cursor.execute('DROP TABLE IF EXISTS resources')
-        cursor.execute('DROP TABLE IF EXISTS appliances')
-        cursor.execute('DROP TABLE IF EXISTS appstate')
-        cursor.execute('DROP TABLE IF EXISTS resstate')
-        cursor.execute('DROP TABLE IF EXISTS plans')
-        cursor.execute('DROP TABLE IF EXISTS efficiency')
-        cursor.execute('DROP TABLE IF EXISTS relayfaults')
-        cursor.execute('DROP TABLE IF EXISTS topology')
-        cursor.execute('DROP TABLE IF EXISTS consumption')
-        cursor.execute('DROP TABLE IF EXISTS periods')
-        
-        cursor.execute('CREATE TABLE IF NOT EXISTS infmeas (logtime TIMESTAMP, et DOUBLE, period INT, signame TEXT, value DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS faults (logtime TIMESTAMP, et DOUBLE, period INT, id BIGINT UNSIGNED, event TEXT, state TEXT, zone TEXT, current_sum DOUBLE, recloses INT, isolated_nodes TEXT, faulted_nodes TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS customers (logtime TIMESTAMP, et DOUBLE, customer_name TEXT, customer_location TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS bids (logtime TIMESTAMP, et DOUBLE, period INT, id BIGINT UNSIGNED, side TEXT, service TEXT, aux_service TEXT, resource_name TEXT, counterparty_name TEXT, accepted BOOLEAN, acc_for TEXT, orig_rate DOUBLE, settle_rate DOUBLE, orig_amount DOUBLE, settle_amount DOUBLE)') 
-        cursor.execute('CREATE TABLE IF NOT EXISTS prices (logtime TIMESTAMP, et DOUBLE, period INT, node TEXT, rate REAL)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS drevents (logtime TIMESTAMP, et DOUBLE, period INT, type TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS transactions (logtime TIMESTAMP, et DOUBLE, period INT, account_holder TEXT, transaction_type TEXT, amount DOUBLE, balance DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS resources (logtime TIMESTAMP, et DOUBLE, name TEXT, type TEXT, owner TEXT, location TEXT, max_power DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS appliances (logtime TIMESTAMP, et DOUBLE, name TEXT, type TEXT, owner TEXT, max_power DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS appstate (logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, state DOUBLE, power DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS resstate (logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, state DOUBLE, connected BOOLEAN, reference_voltage DOUBLE, setpoint DOUBLE, inputV DOUBLE, inputI DOUBLE, outputV DOUBLE, outputI DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS plans (logtime TIMESTAMP, et DOUBLE, period INT, planning_time DOUBLE, planner TEXT, cost DOUBLE, action TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS efficiency (logtime TIMESTAMP, et DOUBLE, period INT, generation DOUBLE, consumption DOUBLE, loss DOUBLE, unaccounted DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS relayfaults (logtime TIMESTAMP, et DOUBLE, period INT, location TEXT, measured TEXT, resistance DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS topology (logtime TIMESTAMP, et DOUBLE, period INT, topology TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS consumption (logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, power DOUBLE)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS periods (number INT, start TIMESTAMP)')
-        
-        cursor.close()
+        self.dbbackend = backends.makeBackend(self.config.get("database"),self.name)
+        print("UTILITY {me} logging to {db}".format(me = self.name, db = self.dbbackend.describe()))
+        
+        #bring the tables up to date, keeping whatever earlier runs logged
+        schema.migrate(self.dbbackend)
+        self.run = schema.startRun(self.dbbackend,self.name)
+        
+        #rows are written in batches from a background thread from here on
+        self.dbwriter = writer.BatchWriter(self.dbbackend,settings.DB_BATCH_SIZE,settings.DB_FLUSH_INTERVAL,settings.DB_QUEUE_SIZE)
+        self.dbwriter.start()
+        self.log = telemetry.TelemetryLog(self.dbwriter,self.t0,self.currentPeriodNumber,self.run)
+        
+        #old telemetry is moved into a columnar archive in the background
+        self.archive = archive.Archive("{dir}/{name}".format(dir = settings.ARCHIVE_DIRECTORY, name = self.name))
+        self.compactor = archive.Compactor(self.dbbackend,self.archive,self.name,settings.ARCHIVE_INTERVAL,settings.ARCHIVE_AGE)
+        self.compactor.start()
+        
+        #infrastructure readings are logged as rollups, raw only around faults
+        self.rollups = stats.RollupAggregator(settings.ROLLUP_WINDOWS,settings.RAW_BUFFER_SIZE)
         
         #register exit function
-        atexit.register(self.exit_handler,self.dbconn)
+        atexit.register(self.exit_handler)
         
         #build grid model objects from the agent's a priori knowledge of system
         #infrastructure relays
@@ -213,22 +188,25 @@ class UtilityAgent(Agent):
                     node.addResource(res)
                     
             #also add resource to database
-            self.dbnewresource(res,self.dbconn,self.t0)
+            self.log.resource(res)
             
         
         self.perceivedInsol = .75 #per unit
         self.customers = []
         self.DRparticipants = []
         
-        #local storage to ease load on tag server
-        self.tagCache = {}
+        #monitoring routines read overlapping tags at nearly the same time
+        tagClient.enableCoalescing(settings.TAG_COALESCE_WINDOW)
+        #infrastructure measurements are pushed to us when they change
+        self.tagPoller = subscriptions.TagPoller(settings.SUBSCRIPTION_POLL_INTERVAL,True,settings.SUBSCRIPTION_FAST_INTERVAL)
+        self.infSubscriptions = []
         
         now = datetime.now()
         end = datetime.now() + timedelta(seconds = settings.ST_PLAN_INTERVAL)
         self.CurrentPeriod = control.Period(0,now,end,self)
         
         #put period zero in database
-        self.dbnewperiod(0,now,self.dbconn,self.t0)
+        self.log.newperiod(0,now)
         
         self.NextPeriod = control.Period(1,end,end + timedelta(seconds = settings.ST_PLAN_INTERVAL),self)
         
@@ -246,22 +224,23 @@ class UtilityAgent(Agent):
 #             if relay.type == "infrastructure":
 #                 relay.closeRelay()
                 
-        self.relays[0].closeRelay()
-        self.relays[1].closeRelay()
-        self.relays[2].closeRelay()
-        self.relays[3].closeRelay()
-        self.relays[4].closeRelay()
-        self.relays[5].closeRelay()
-        self.relays[6].closeRelay()
-        self.relays[7].closeRelay()
-        self.relays[8].openRelay()
-        self.relays[9].openRelay()
-        
-        #self.Relays[8].closeRelay()
-        #self.Relays[9].closeRelay()
-        
+        #one message for all of the relays
+        with tagClient.WriteBatch(confirm = True):
+            self.relays[0].closeRelay()
+            self.relays[1].closeRelay()
+            self.relays[2].closeRelay()
+            self.relays[3].closeRelay()
+            self.relays[4].closeRelay()
+            self.relays[5].closeRelay()
+            self.relays[6].closeRelay()
+            self.relays[7].closeRelay()
+            self.relays[8].openRelay()
+            self.relays[9].openRelay()
+        
+            #self.Relays[8].closeRelay()
+            #self.Relays[9].closeRelay()
     
-    def exit_handler(self,dbconn):
+    def exit_handler(self):
         print('UTILITY {me} exit handler'.format(me = self.name))
         
         #disconnect any connected loads
@@ -272,8 +251,11 @@ class UtilityAgent(Agent):
         for res in self.Resources:
             res.disconnectSource()
         
-        #close database connection
-        dbconn.close()    
+        #write out queued rows and close database connection
+        for result in self.rollups.flush():
+            self.log.rollup(result)
+        self.compactor.stop()
+        self.dbwriter.close()    
         
     @Core.receiver('onstart')
     def setup(self,sender,**kwargs):
@@ -287,6 +269,9 @@ class UtilityAgent(Agent):
         self.vip.pubsub.subscribe('pubsub','weatherservice',callback = self.weatherfeed)
         
         #self.printInfo(2)
+        
+        self.subscribeInfrastructure()
+        self.tagPoller.start()
               
         self.discoverCustomers()
         #solicit bids for next period, this function schedules a delayed function call to process
@@ -381,7 +366,7 @@ class UtilityAgent(Agent):
                                 print("HOMEOWNER {me} doesn't recognize customer type".format(me = self.name))
                                 return
                             
-                        self.dbnewcustomer(cust,self.dbconn,self.t0)
+                        self.log.customer(cust)
                             
                         #add customer to Node object
                         for node in self.nodes:
@@ -395,6 +380,10 @@ class UtilityAgent(Agent):
                                 
                                 if node.group:
                                     node.group.customers.append(cust)
+                                    self.groupIndex.addCustomer(cust,node.group)
+                        
+                        #the new load's current has to be watched for fault detection
+                        self.subscribeInfrastructure()
                         
                         for resource in resources:
                             print("NEW RESOURCE: {res}".format(res = resource))
@@ -414,6 +403,7 @@ class UtilityAgent(Agent):
                                     cust.addResource(newres)
                                     if node.group:
                                         node.group.resources.append(newres)
+                                        self.groupIndex.addResource(newres,node.group)
                                     foundmatch = True
                             if not foundmatch:
                                 print("couldn't find a match for {loc}".format(loc = resource["location"]))
@@ -484,7 +474,7 @@ class UtilityAgent(Agent):
             for cust in group.customers:
                 power = cust.measurePower()
                 
-                self.dbconsumption(cust,power,self.dbconn,self.t0)
+                self.log.consumption(cust,power)
                 
                 energy = power*settings.ACCOUNTING_INTERVAL
                 balanceAdjustment = -energy*group.rate*cust.rateAdjustment
@@ -492,7 +482,7 @@ class UtilityAgent(Agent):
                     if abs(balanceAdjustment) < 450 and abs(balanceAdjustment) > .001:
                         cust.customerAccount.adjustBalance(balanceAdjustment)
                         #update database
-                        self.dbtransaction(cust,balanceAdjustment,"net home consumption",self.dbconn,self.t0)
+                        self.log.transaction(cust,balanceAdjustment,"net home consumption")
                         if settings.DEBUGGING_LEVEL >= 2:
                             print("The account of {holder} has been adjusted by {amt} units for net home consumption".format(holder = cust.name, amt = balanceAdjustment))
                 else:
@@ -517,7 +507,7 @@ class UtilityAgent(Agent):
                                     cust.customerAccount.adjustBalance(balanceAdjustment)
                             
                                     #update database
-                                    self.dbtransaction(cust,balanceAdjustment,"remote resource",self.dbconn,self.t0)
+                                    self.log.transaction(cust,balanceAdjustment,"remote resource")
                             
                         else:
                             print("resource {res} is co-located with {cust}".format(res = res.name, cust = cust.name))
@@ -540,25 +530,13 @@ class UtilityAgent(Agent):
                    }
         
         #record period in database
-        self.dbnewperiod(self.NextPeriod.periodNumber, self.NextPeriod.startTime.isoformat(), self.dbconn, self.t0)
+        self.log.newperiod(self.NextPeriod.periodNumber, self.NextPeriod.startTime.isoformat())
         
         if settings.DEBUGGING_LEVEL >= 2:
             print("UTILITY {me} ANNOUNCING period {pn} starting at {t}".format(me = self.name, pn = mesdict["period_number"], t = mesdict["start_time"]))
         message = json.dumps(mesdict)
         self.vip.pubsub.publish("pubsub","energymarket",{},message)
         
-    def announceRate(self, recipient, rate, period):
-        if settings.DEBUGGING_LEVEL >= 2:
-            print("UTILITY {me} ANNOUNCING RATE {rate} to {rec} for period {per}".format(me = self.name, rate = rate, rec = recipient.name, per = period.periodNumber))
-        mesdict = {"message_sender" : self.name,
-                   "message_subject" : "rate_announcement",
-                   "message_target" : recipient.name,
-                   "period_number" : period.periodNumber,
-                   "rate" : rate
-                   }
-        message = json.dumps(mesdict)
-        self.vip.pubsub.publish("pubsub","energymarket",{},message)
-    
     #solicit bids for the next period
     def solicitBids(self):
         
@@ -652,27 +630,29 @@ class UtilityAgent(Agent):
                         print("UTILITY {me} SOLICITING RESERVE POWER BIDS FROM {them}".format(me = self.name, them = cust.name))
         
         
-    #determines whether the bid belongs in the auction for the group
-    def bidforgroup(self,bid,group):
-        if bid.resourceName:
-            #if the bid is for a specific device, we are interested in the location of the device
-            name = bid.resourceName
-                        
-            for res in group.resources:
-                if name == res.name:
-                    return True
-        
+    #adds a bid to the agent's bid list for its side and to its group's order book
+    def routeBid(self,bid,side):
+        if side == "supply":
+            self.supplyBidList.append(bid)
+        elif side == "demand":
+            self.demandBidList.append(bid)
         else:
-            #otherwise, we are interested in the membership of the home
-            name = bid.counterparty
-            
-            for cust in group.customers:
-                if name == cust.name:
-                    return True
-                
-        return False
-        
-        
+            self.reserveBidList.append(bid)
+        group = self.groupIndex.groupForBid(bid)
+        if group:
+            group.book(bid.periodNumber).add(bid,side)
+    
+    #takes a bid out of the auction at its sender's request
+    def cancelBid(self,uid,resourcename,counterparty,period):
+        group = self.groupIndex.groupFor(resourcename,counterparty)
+        if group is None:
+            return None
+        bid = group.book(period).cancel(uid)
+        if bid:
+            for bidlist in [self.supplyBidList,self.demandBidList,self.reserveBidList]:
+                if bid in bidlist:
+                    bidlist.remove(bid)
+        return bid
         
     def planShortTerm(self):
         if settings.DEBUGGING_LEVEL >= 2:
@@ -699,55 +679,48 @@ class UtilityAgent(Agent):
             
             if newbid:
                 print("UTILITY {me} ADDING OWN BID {id} TO LIST".format(me = self.name, id = newbid.uid))
-                self.supplyBidList.append(newbid)
+                self.routeBid(newbid,"supply")
                 self.outstandingSupplyBids.append(newbid)
                 
                 #write to database
-                self.dbnewbid(newbid,self.dbconn,self.t0)
+                self.log.bid(newbid)
         
+        #groups' auctions are independent, so they are all cleared before any bids are settled
+        outcomes = market.MarketResults(self.NextPeriod.periodNumber)
+        auctiongroups = []
+        auctions = []
         for group in self.groupList:
             maxLoad = self.getMaxGroupLoad(group)    
             
-            for bid in self.supplyBidList:
-                if self.bidforgroup(bid,group):
-                    group.supplyBidList.append(bid)
-            
-            for bid in self.demandBidList:
-                if self.bidforgroup(bid,group):
-                    group.demandBidList.append(bid)
+            #the order book already has the bids in merit order
+            book = group.closeBook(self.NextPeriod.periodNumber)
+            group.supplyBidList = book.snapshot("supply")
+            group.demandBidList = book.snapshot("demand")
+            group.reserveBidList = book.snapshot("reserve")
             
-            for bid in self.reserveBidList:
-                if self.bidforgroup(bid,group):
-                    group.reserveBidList.append(bid)
-                    
             #don't hold auction for group with faulted node
             if group.hasGroundFault():
                 
                 #reject all bids
                 for bid in group.supplyBidList:
                     bid.accepted = False
-                    self.sendBidRejection(bid,0)
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    outcomes.add(bid,0,False)
+                    self.log.bidupdate(bid)
 
                 for bid in group.demandBidList:
                     bid.accepted = False
-                    self.sendBidRejection(bid,0)
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    outcomes.add(bid,0,False)
+                    self.log.bidupdate(bid)
                 
                 for bid in group.reserveBidList:
                     bid.accepted = False
-                    self.sendBidRejection(bid,0)                
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    outcomes.add(bid,0,False)                
+                    self.log.bidupdate(bid)
                 
                 #move on to next group
                 continue
             
                     
-            #sort array of supplier bids by rate from low to high
-            group.supplyBidList.sort(key = operator.attrgetter("rate"))
-            #sort array of consumer bids by rate from high to low
-            group.demandBidList.sort(key = operator.attrgetter("rate"),reverse = True)
-            
             if settings.DEBUGGING_LEVEL >= 2:
                 print("\n\nPLANNING for GROUP {group} for PERIOD {per}: worst case load is {max}".format(group = group.name, per = self.NextPeriod.periodNumber, max = maxLoad))
                 print(">>here are the supply bids:")
@@ -760,191 +733,30 @@ class UtilityAgent(Agent):
                 for bid in group.demandBidList:                    
                     bid.printInfo(0)
             
-            qrem = 0                #leftover part of bid
-            supplyindex = 0
-            demandindex = 0
-            partialsupply = False
-            partialdemand = False
-            sblen = len(group.supplyBidList)
-            rblen = len(group.reserveBidList)
-            dblen = len(group.demandBidList)
-            
-            while supplyindex < sblen and demandindex < dblen:
-                supbid = group.supplyBidList[supplyindex]
-                dembid = group.demandBidList[demandindex]
-                if settings.DEBUGGING_LEVEL >= 2:
-                    print("\ndemand index: {di}".format(di = demandindex))
-                    print("supply index: {si}".format(si = supplyindex))
-                    
-                if dembid.rate > supbid.rate:
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("demand rate {dr} > supply rate {sr}".format(dr = dembid.rate, sr = supbid.rate))
-                        
-                    group.rate = dembid.rate
-                    if partialsupply:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("partial supply bid: {qr} remaining".format(qr = qrem))
-                        
-                        if qrem > dembid.amount:                            
-                            qrem -= dembid.amount
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("still {qr} remaining in supply bid".format(qr = qrem))
-                            partialsupply = True
-                            partialdemand = False
-                            dembid.accepted = True
-                            demandindex += 1
-                        elif qrem < dembid.amount:        
-                            qrem = dembid.amount - qrem
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("exhausted supply bid, now {qr} left in demand bid".format(qr = qrem))
-                            partialsupply = False
-                            partialdemand = True
-                            supbid.accepted = True
-                            supplyindex += 1                            
-                        else:
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("exact match in bids")
-                            qrem = 0
-                            partialsupply = False
-                            partialdemand = False     
-                            supbid.accepted = True   
-                            dembid.accepted = True 
-                            supplyindex += 1
-                            demandindex += 1       
-                    elif partialdemand:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("partial demand bid: {qr} remaining".format(qr = qrem))
-                            
-                        if qrem > supbid.amount:
-                            qrem -= supbid.amount
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("still {qr} remaining in supply bid".format(qr = qrem))
-                            partialsupply = False
-                            partialdemand = True
-                            supbid.accepted = True
-                            supplyindex += 1
-                        elif qrem < supbid.amount:
-                            qrem = supbid.amount - qrem
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("exhausted demand bid, now {qr} left in supply bid".format(qr = qrem))
-                            partialsupply = True
-                            partialdemand = False
-                            dembid.accepted = True
-                            demandindex += 1
-                        else:
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("exact match in bids")
-                            qrem = 0
-                            partialsupply = False
-                            partialdemand = False
-                            supbid.accepted = True   
-                            dembid.accepted = True 
-                            supplyindex += 1
-                            demandindex += 1
-                    else:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                                print("no partial bids")
-                                
-                        if dembid.amount > supbid.amount:
-                            qrem = dembid.amount - supbid.amount
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("{qr} remaining in demand bid".format(qr = qrem))
-                            partialdemand = True
-                            partialsupply = False
-                            supbid.accepted = True
-                            dembid.accepted = True
-                            supplyindex += 1
-                        elif dembid.amount < supbid.amount:
-                            qrem = supbid.amount - dembid.amount
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("{qr} remaining in supply bid".format(qr = qrem))
-                            partialdemand = False
-                            partialsupply = True
-                            supbid.accepted = True
-                            dembid.accepted = True
-                            demandindex += 1
-                        else:
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("bids match exactly")
-                            qrem = 0
-                            partialsupply = False
-                            partialdeand = False
-                            supbid.accepted = True
-                            dembid.accepted = True
-                            supplyindex += 1
-                            demandindex += 1
-                        
-                else:
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("PAST EQ PRICE! demand rate {dr} < supply rate {sr}".format(dr = dembid.rate, sr = supbid.rate))
-                    if partialsupply:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("still partial supply bid to take care of")
-                        supbid.accepted = True
-                        supbid.modified = True
-                        supbid.amount -= qrem
-                        dembid.accepted = False
-                        partialsupply = False
-                        partialdemand = False
-                    elif partialdemand:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("still partial demand bid to take care of")
-                        dembid.accepted = True
-                        dembid.modified = True
-                        dembid.amount -= qrem
-                        supbid.accepted = False
-                        partialsupply = False
-                        partialdemand = False
-                    else:
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("reject and skip...")
-                        supbid.accepted = False
-                        dembid.accepted = False
-                    supplyindex += 1
-                    demandindex += 1
+            auctiongroups.append(group)
+            auctions.append(market.AuctionInput(group.supplyBidList,group.demandBidList,group.reserveBidList,maxLoad))
+        
+        results = market.clearAuctions(auctions)
+        
+        for group, (result, reserveaccepted) in zip(auctiongroups,results):
+            market.markAccepted(group.supplyBidList,result.supplyaccepted)
+            market.markAccepted(group.demandBidList,result.demandaccepted)
+            if result.price is not None:
+                group.rate = result.price
+            if settings.DEBUGGING_LEVEL >= 2:
+                result.printInfo(0)
             
-            while supplyindex < sblen:
-                supbid = group.supplyBidList[supplyindex]
-                if settings.DEBUGGING_LEVEL >= 2:
-                    print(" out of loop, still cleaning up supply bids {si}".format(si = supplyindex))
-                if partialsupply:
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("partial supply bid to finish up")
-                    supbid.accepted = True
-                    supbid.modified = True
-                    supbid.amount -= qrem
-                    partialsupply = False
-                    partialdemand = False
-                else:
-                    if supbid.auxilliaryService:
-                        if supbid.auxilliaryService == "reserve":
-                            if settings.DEBUGGING_LEVEL >= 2:
-                                print("UTILITY {me} placing rejected power bid {bid} in reserve list".format(me = self.name, bid = supbid.uid))
-                                
-                            
-                            group.supplyBidList.remove(supbid)
-                            sblen = len(group.supplyBidList)
-                            group.reserveBidList.append(supbid)
-                            supbid.service = "reserve"
-                    else:
-                        supbid.accepted = False
-                supplyindex += 1
-                
-            while demandindex < dblen:
-                dembid = group.demandBidList[demandindex]
-                if settings.DEBUGGING_LEVEL >= 2:
-                    print(" out of loop, still cleaning up demand bids {di}".format(di = demandindex))
-                if partialdemand:
+            #power bids that didn't clear can still be used as reserves
+            powerbids = []
+            for supbid in group.supplyBidList:
+                if not supbid.accepted and supbid.auxilliaryService == "reserve":
                     if settings.DEBUGGING_LEVEL >= 2:
-                        print("partial demand bid to finish up")
-                    dembid.accepted = True
-                    dembid.modified = True
-                    dembid.amount -= qrem
-                    partialsupply = False
-                    partialdemand = False
+                        print("UTILITY {me} placing rejected power bid {bid} in reserve list".format(me = self.name, bid = supbid.uid))
+                    group.reserveBidList.append(supbid)
+                    supbid.service = "reserve"
                 else:
-                    dembid.accepted = False
-                demandindex += 1
+                    powerbids.append(supbid)
+            group.supplyBidList = powerbids
             
             totalsupply = 0
             #notify the counterparties of the terms on which they will supply power
@@ -952,9 +764,9 @@ class UtilityAgent(Agent):
                 if bid.accepted:
                     totalsupply += bid.amount
                     bid.rate = group.rate
-                    self.sendBidAcceptance(bid, group.rate)
+                    outcomes.add(bid,group.rate,True)
                     #update bid's entry in database
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    self.log.bidupdate(bid)
                     
                     #self.NextPeriod.plan.addBid(bid)
                     self.NextPeriod.supplybidmanager.acceptedbids.append(bid)
@@ -967,9 +779,9 @@ class UtilityAgent(Agent):
                         if res.location == cust.location:
                             cust.permission = True   
                 else:
-                    self.sendBidRejection(bid, group.rate)   
+                    outcomes.add(bid,group.rate,False)   
                     #update bid's entry in database
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    self.log.bidupdate(bid)
                     
             totaldemand = 0        
             #notify the counterparties of the terms on which they will consume power
@@ -979,9 +791,9 @@ class UtilityAgent(Agent):
                 if bid.accepted:
                     totaldemand += bid.amount
                     bid.rate = group.rate
-                    self.sendBidAcceptance(bid, group.rate)
+                    outcomes.add(bid,group.rate,True)
                     #update bid's entry in database
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    self.log.bidupdate(bid)
                     
                     #self.NextPeriod.plan.addConsumption(bid)
                     self.NextPeriod.demandbidmanager.acceptedbids.append(bid)
@@ -990,48 +802,37 @@ class UtilityAgent(Agent):
                     cust.permission = True                    
                     
                 else:
-                    self.sendBidRejection(bid, group.rate)
+                    outcomes.add(bid,group.rate,False)
                     #update bid's entry in database
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    self.log.bidupdate(bid)
                     #customer does not have permission to connect
                     cust.permission = False
             
-            group.reserveBidList.sort(key = operator.attrgetter("rate"))
-            totalreserve = 0
-            for bid in group.reserveBidList:
-                if totalreserve < (maxLoad - totaldemand):
-                    totalreserve += bid.amount
-                    if totalreserve > (maxLoad - totaldemand):
-                        #we have enough reserves, accept partial
-                        bid.accepted = True
-                        bid.modified = True
-                        bid.amount = bid.amount - (maxLoad - totaldemand - totalreserve)
-                    else:
-                        bid.accepted = True
-                else: 
-                    bid.accepted = False
+            market.markAccepted(group.reserveBidList,reserveaccepted)
                     
             for bid in group.reserveBidList:
                 if bid.accepted:
-                    self.sendBidAcceptance(bid,group.rate)
+                    outcomes.add(bid,group.rate,True)
                     
                     #update bid's entry in database
-                    self.dbupdatebid(bid,self.dbconn,self.t0)
+                    self.log.bidupdate(bid)
                     
                     #self.NextPeriod.plan.addBid(bid)
                     #self.NextPeriod.supplybidmanager.readybids.append(bid)
                     self.NextPeriod.supplybidmanager.acceptedbids.append(bid)
                 else:
-                    self.sendBidRejection(bid,group.rate)
+                    outcomes.add(bid,group.rate,False)
                 #update bid's entry in database
-                self.dbupdatebid(bid,self.dbconn,self.t0)
+                self.log.bidupdate(bid)
                     
             self.bidstate.reserveonly()
             
                                    
             #announce rates for next period
             for cust in group.customers:
-                self.announceRate(cust,group.rate,self.NextPeriod)
+                outcomes.setRate(cust.name,group.rate)
+        
+        self.sendMarketResults(outcomes)
         
         for plan in self.NextPeriod.plans:
             self.NextPeriod.plan.printInfo(0)
@@ -1062,6 +863,10 @@ class UtilityAgent(Agent):
             print("UTILITY AGENT {me} moving into new period:".format(me = self.name))
             self.CurrentPeriod.printInfo(0)
         
+        #books for this period and earlier will never be auctioned
+        for group in self.groupList:
+            group.closeBooksThrough(self.CurrentPeriod.periodNumber)
+        
         #call enactPlan
         self.enactPlan()
         
@@ -1082,65 +887,70 @@ class UtilityAgent(Agent):
                     
     #responsible for enacting the plan which has been defined for a planning period
     def enactPlan(self):
-        #which resources are being used during this period? keep track with this list
-        involvedResources = []
-        #change setpoints
-        
-        #if self.CurrentPeriod.plans:
-        if self.CurrentPeriod.supplybidmanager.acceptedbids:
-            #plan = self.CurrentPeriod.plans[0]
-            if settings.DEBUGGING_LEVEL >= 2:
-                print("UTILITY {me} IS ENACTING ITS PLAN FOR PERIOD {per}".format(me = self.name, per = self.CurrentPeriod.periodNumber))
+        #send all of the setpoint and relay writes for this plan together
+        with tagClient.WriteBatch(confirm = True) as batch:
+            #which resources are being used during this period? keep track with this list
+            involvedResources = []
+            #change setpoints
+        
+            #if self.CurrentPeriod.plans:
+            if self.CurrentPeriod.supplybidmanager.acceptedbids:
+                #plan = self.CurrentPeriod.plans[0]
+                if settings.DEBUGGING_LEVEL >= 2:
+                    print("UTILITY {me} IS ENACTING ITS PLAN FOR PERIOD {per}".format(me = self.name, per = self.CurrentPeriod.periodNumber))
             
-            self.CurrentPeriod.supplybidmanager.printInfo()    
-            for bid in self.CurrentPeriod.supplybidmanager.acceptedbids:
-                if bid.counterparty == self.name:                    
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("UTILITY {me} IS ACTUATING BID {bid}".format(me = self.name, bid = bid.uid))
+                self.CurrentPeriod.supplybidmanager.printInfo()    
+                for bid in self.CurrentPeriod.supplybidmanager.acceptedbids:
+                    if bid.counterparty == self.name:                    
+                        if settings.DEBUGGING_LEVEL >= 2:
+                            print("UTILITY {me} IS ACTUATING BID {bid}".format(me = self.name, bid = bid.uid))
                     
-                    bid.printInfo(0)
-                    res = listparse.lookUpByName(bid.resourceName,self.Resources)
-                    if res is not None:
-                        involvedResources.append(res)
-                        #if the resource is already connected, change the setpoint
+                        bid.printInfo(0)
+                        res = listparse.lookUpByName(bid.resourceName,self.Resources)
+                        if res is not None:
+                            involvedResources.append(res)
+                            #if the resource is already connected, change the setpoint
+                            if res.connected == True:
+                                if settings.DEBUGGING_LEVEL >= 2:
+                                    print(" Resource {rname} is already connected".format(rname = res.name))
+                                if bid.service == "power":
+                                    #res.DischargeChannel.ramp(bid.amount)
+                                    #res.DischargeChannel.changeSetpoint(bid.amount)
+                                    res.setDisposition(bid.amount, 0)
+                                    if settings.DEBUGGING_LEVEL >= 2:
+                                        print("Power resource {rname} setpoint to {amt}".format(rname = res.name, amt = bid.amount))
+                                elif bid.service == "reserve":
+                                    #res.DischargeChannel.ramp(.1)            
+                                    #res.DischargeChannel.changeReserve(bid.amount,-.2)
+                                    res.setDisposition(bid.amount,-0.2)
+                                    if settings.DEBUGGING_LEVEL >= 2:
+                                        print("Reserve resource {rname} setpoint to {amt}".format(rname = res.name, amt = bid.amount))
+                            #if the resource isn't connected, connect it and ramp up power
+                            else:
+                                if bid.service == "power":
+                                    #res.connectSourceSoft("Preg",bid.amount)
+                                    #res.DischargeChannel.connectWithSet(bid.amount,0)
+                                    res.setDisposition(bid.amount,0)
+                                    if settings.DEBUGGING_LEVEL >= 2:
+                                        print("Connecting resource {rname} with setpoint: {amt}".format(rname = res.name, amt = bid.amount))
+                                elif bid.service == "reserve":
+                                    #res.connectSourceSoft("Preg",.1)
+                                    #res.DischargeChannel.connectWithSet(bid.amount, -.2)
+                                    res.setDisposition(bid.amount, -0.2)
+                                    if settings.DEBUGGING_LEVEL >= 2:
+                                        print("Committed resource {rname} as a reserve with setpoint: {amt}".format(rname = res.name, amt = bid.amount))
+                #disconnect resources that aren't being used anymore
+                for res in self.Resources:
+                    if res not in involvedResources:
                         if res.connected == True:
+                            #res.disconnectSourceSoft() -- deprecated
+                            #res.DischargeChannel.disconnect() -- doesn't propagate .connected state to resource
+                            res.setDisposition(0)
                             if settings.DEBUGGING_LEVEL >= 2:
-                                print(" Resource {rname} is already connected".format(rname = res.name))
-                            if bid.service == "power":
-                                #res.DischargeChannel.ramp(bid.amount)
-                                #res.DischargeChannel.changeSetpoint(bid.amount)
-                                res.setDisposition(bid.amount, 0)
-                                if settings.DEBUGGING_LEVEL >= 2:
-                                    print("Power resource {rname} setpoint to {amt}".format(rname = res.name, amt = bid.amount))
-                            elif bid.service == "reserve":
-                                #res.DischargeChannel.ramp(.1)            
-                                #res.DischargeChannel.changeReserve(bid.amount,-.2)
-                                res.setDisposition(bid.amount,-0.2)
-                                if settings.DEBUGGING_LEVEL >= 2:
-                                    print("Reserve resource {rname} setpoint to {amt}".format(rname = res.name, amt = bid.amount))
-                        #if the resource isn't connected, connect it and ramp up power
-                        else:
-                            if bid.service == "power":
-                                #res.connectSourceSoft("Preg",bid.amount)
-                                #res.DischargeChannel.connectWithSet(bid.amount,0)
-                                res.setDisposition(bid.amount,0)
-                                if settings.DEBUGGING_LEVEL >= 2:
-                                    print("Connecting resource {rname} with setpoint: {amt}".format(rname = res.name, amt = bid.amount))
-                            elif bid.service == "reserve":
-                                #res.connectSourceSoft("Preg",.1)
-                                #res.DischargeChannel.connectWithSet(bid.amount, -.2)
-                                res.setDisposition(bid.amount, -0.2)
-                                if settings.DEBUGGING_LEVEL >= 2:
-                                    print("Committed resource {rname} as a reserve with setpoint: {amt}".format(rname = res.name, amt = bid.amount))
-            #disconnect resources that aren't being used anymore
-            for res in self.Resources:
-                if res not in involvedResources:
-                    if res.connected == True:
-                        #res.disconnectSourceSoft() -- deprecated
-                        #res.DischargeChannel.disconnect() -- doesn't propagate .connected state to resource
-                        res.setDisposition(0)
-                        if settings.DEBUGGING_LEVEL >= 2:
-                            print("Resource {rname} no longer required and is being disconnected".format(rname = res.name))
+                                print("Resource {rname} no longer required and is being disconnected".format(rname = res.name))
+                                
+        if batch.mismatches:
+            print("UTILITY {me} COULD NOT CONFIRM ALL WRITES FOR PERIOD {per}: {mis}".format(me = self.name, per = self.CurrentPeriod.periodNumber, mis = batch.mismatches.keys()))
     
     def repairgrid(self):
         print("Utility {nam} attempting to merge as many groups as possible".format(nam = self.name))
@@ -1212,7 +1022,11 @@ class UtilityAgent(Agent):
         if fault is None:
             fault = zone.newGroundFault()
             
-            self.dbgroundfaultevent(fault,"newly suspected fault",self.dbconn,self.t0)
+            self.log.fault(fault,"newly suspected fault")
+            
+            #keep the raw readings from before and after the fault
+            for signal, t, value in self.rollups.capture(settings.FAULT_RAW_SECONDS):
+                self.log.infmeas(signal,value,t)
             
                             
             #is an existing node in the zone already persistently faulted?
@@ -1255,7 +1069,7 @@ class UtilityAgent(Agent):
                 #reschedule ground fault handler
                 schedule.msfromnow(self,1000,self.groundFaultHandler,fault,zone)
                 
-                self.dbgroundfaultevent(fault,"suspected fault confirmed",self.dbconn,self.t0,iunaccounted)
+                self.log.fault(fault,"suspected fault confirmed",iunaccounted)
             else:
                 #no problem
                  
@@ -1264,7 +1078,7 @@ class UtilityAgent(Agent):
                 
                 fault.cleared()
                 
-                self.dbgroundfaultevent(fault,"suspected fault resolved",self.dbconn,self.t0,iunaccounted)
+                self.log.fault(fault,"suspected fault resolved",iunaccounted)
                
                             
         elif fault.state == "unlocated":
@@ -1289,14 +1103,14 @@ class UtilityAgent(Agent):
                     #reschedule ground fault handler
                     schedule.msfromnow(self,1000,self.groundFaultHandler,fault,zone)
                     
-                    self.dbgroundfaultevent(fault,"attempting to locate",self.dbconn,self.t0,iunaccounted)
+                    self.log.fault(fault,"attempting to locate",iunaccounted)
                     
                 else:
                     print("FAULT {id}: unaccounted current of {cur} and we are out of nodes.".format(cur=iunaccounted, id= fault.uid))
                     fault.state == "unlocatable"
                     schedule.msfromnow(self,5000,self.groundFaultHandler,fault,zone)
                     
-                    self.dbgroundfaultevent(fault,"unable to locate",self.dbconn,self.t0,iunaccounted)
+                    self.log.fault(fault,"unable to locate",iunaccounted)
                     
             else:
                 #the previously isolated node probably contained the fault
@@ -1318,7 +1132,7 @@ class UtilityAgent(Agent):
                 #reschedule
                 schedule.msfromnow(self,1000,self.groundFaultHandler,fault,zone)
                 
-                self.dbgroundfaultevent(fault,"fault located",self.dbconn,self.t0,iunaccounted)
+                self.log.fault(fault,"fault located",iunaccounted)
                 
         elif fault.state == "located":
             #at least one faulted node has been located and isolated but there may be others
@@ -1332,7 +1146,7 @@ class UtilityAgent(Agent):
                     if settings.DEBUGGING_LEVEL >= 2:
                         fault.printInfo()
                 
-                self.dbgroundfaultevent(fault,"suspect multiple faults",self.dbconn,self.t0,iunaccounted)
+                self.log.fault(fault,"suspect multiple faults",iunaccounted)
                 
                 self.groundFaultHandler(fault,zone)
                 
@@ -1348,7 +1162,7 @@ class UtilityAgent(Agent):
                     if settings.DEBUGGING_LEVEL >= 1:
                         print("FAULT: going to reclose. count: {rec}".format(rec = fault.reclosecounter))
                         
-                    self.dbgroundfaultevent(fault,"no other faults",self.dbconn,self.t0,iunaccounted)
+                    self.log.fault(fault,"no other faults",iunaccounted)
                     
                 else:
                     #our reclose limit has been met
@@ -1372,7 +1186,7 @@ class UtilityAgent(Agent):
                 
             fault.state = "suspected"
             schedule.msfromnow(self,1200,self.groundFaultHandler,fault,zone)
-            self.dbgroundfaultevent(fault,"reclosing",self.dbconn,self.t0)
+            self.log.fault(fault,"reclosing")
             
         elif fault.state == "unlocatable":
             #fault can't be located because the current imbalance can't be eliminated for whatever reason
@@ -1386,11 +1200,11 @@ class UtilityAgent(Agent):
                 fault.state = "located"
                 schedule.msfromnow(self,1000,self.groundFaultHandler,fault,zone)
                 
-                self.dbgroundfaultevent(fault,"unlocatable fault now isolated",self.dbconn,self.t0,iunaccounted)
+                self.log.fault(fault,"unlocatable fault now isolated",iunaccounted)
                 
         elif fault.state == "persistent":
             #fault hasn't resolved on its own, need to send a crew to clear fault
-            self.dbgroundfaultevent(fault,"fault deemed persistent",self.dbconn,self.t0)
+            self.log.fault(fault,"fault deemed persistent")
             
             #revoke permission for customers on faulted nodes to connect
             for node in fault.faultednodes:
@@ -1409,7 +1223,7 @@ class UtilityAgent(Agent):
         elif fault.state == "cleared":
             fault.cleared()
             
-            self.dbgroundfaultevent(fault,"fault cleared",self.dbconn,self.t0)
+            self.log.fault(fault,"fault cleared")
             
             if settings.DEBUGGING_LEVEL >= 2:
                 print("GROUND FAULT {id} has been cleared".format(id = fault.uid))
@@ -1436,7 +1250,7 @@ class UtilityAgent(Agent):
 #         if retdict["reliable"]:
 #             if retdict["discrepancy"]:
 #                 print("UTILITY {me} REPORTS DISCREPANCY BETWEEN MEASURED RELAY STATE {sta} and MODEL STATE {msta} ON {nam}".format(me = self.name, sta = measurement, msta = not measurement, nam = edge.name))
-#                 self.dbrelayfault(edge.name,measurement,resistance,self.dbconn,self.t0)
+#                 self.log.relayfault(edge.name,measurement,resistance)
 #             else:
 #                 print("UTILITY {me} REPORTS MEASURED RELAY STATE {sta} ON {nam} IS CONSISTENT WITH MODEL".format(me = self.name, sta = measurement, nam = edge.name))        
 #         else:
@@ -1450,11 +1264,21 @@ class UtilityAgent(Agent):
         if settings.DEBUGGING_LEVEL >= 2:
             print("running fault detection subroutine")
             
-        nominal = True        
+        nominal = True
+        
+        #the tag poller keeps node voltages and zone currents in the cache, so these only
+        #go to the server if it has stopped getting answers
+        currenttags = []
+        for zone in self.zones:
+            currenttags.extend(zone.getCurrentTags())
+        voltagetags = [node.voltageTag for node in self.nodes if hasattr(node,"voltageTag")]
+        voltages = tagClient.readTagsDictCached(voltagetags,2*settings.SUBSCRIPTION_POLL_INTERVAL)
+        currents = tagClient.readTagsDictCached(currenttags,2*settings.SUBSCRIPTION_POLL_INTERVAL)
+        
         #look for brownouts
         for node in self.nodes:
             try:
-                voltage = node.getVoltage()
+                voltage = voltages[node.voltageTag]
                 if voltage < settings.VOLTAGE_LOW_EMERGENCY_THRESHOLD:
                     node.voltageLow = True
                     node.group.voltageLow = True
@@ -1464,54 +1288,115 @@ class UtilityAgent(Agent):
                 else:
                     node.voltageLow = False
                     
-                self.dbinfmeas(node.voltageTag,voltage,self.dbconn,self.t0)
-            except AttributeError:
+                self.recordMeasurement(node.voltageTag,voltage)
+            except (AttributeError, KeyError, TypeError):
                 #can't do anything but we don't really care
                 pass
                 
                 
         for zone in self.zones:
-            skip = False
-            if zone.faults:
-                for fault in zone.faults:
-                    if fault.__class__.__name__ == "GroundFault":
-                        print("zone {nam} already has a ground fault".format(nam=zone.name))
-                        if fault.state != "persistent":
-                            print("fault is still in process")
-                            skip = True
-            
-            if skip:
-                print("Not checking zone {nam} because it is already known to be faulted".format(nam = zone.name))
-                continue
-            
-            currentsum = zone.sumCurrents()
-            if abs(currentsum) > settings.UNACCOUNTED_CURRENT_THRESHOLD:
-                zonenominal = False
-                #there is a mismatch and probably a line-ground fault
+            if not self.checkZone(zone,currents):
                 nominal = False
-                                
-                self.groundFaultHandler(None,zone)
-                
-                if settings.DEBUGGING_LEVEL >= 1:
-                    if settings.DEBUGGING_LEVEL >= 2:
-                        print("unaccounted current of {tot}".format(tot = currentsum))
-                    print("Probable line-ground Fault in {zon}.  Isolating node.".format(zon = zone.name))
-            else:
-                if settings.DEBUGGING_LEVEL >=2:
-                    print("unaccounted current of {tot} in {zon}. Probably nothing wrong".format(tot = currentsum, zon = zone.name))
                 
         if nominal:
             if settings.DEBUGGING_LEVEL >= 2:
                 print("No faults detected by {me}!".format(me = self.name))
             
+    '''looks for unaccounted current in a zone, using currents that have already been
+    read if they are given. returns False if a ground fault is suspected'''
+    def checkZone(self,zone,currents = None):
+        skip = False
+        if zone.faults:
+            for fault in zone.faults:
+                if fault.__class__.__name__ == "GroundFault":
+                    print("zone {nam} already has a ground fault".format(nam=zone.name))
+                    if fault.state != "persistent":
+                        print("fault is still in process")
+                        skip = True
+        
+        if skip:
+            print("Not checking zone {nam} because it is already known to be faulted".format(nam = zone.name))
+            return True
+        
+        currentsum = zone.sumCurrents(currents)
+        if abs(currentsum) > settings.UNACCOUNTED_CURRENT_THRESHOLD:
+            #there is a mismatch and probably a line-ground fault
+            self.groundFaultHandler(None,zone)
+            
+            if settings.DEBUGGING_LEVEL >= 1:
+                if settings.DEBUGGING_LEVEL >= 2:
+                    print("unaccounted current of {tot}".format(tot = currentsum))
+                print("Probable line-ground Fault in {zon}.  Isolating node.".format(zon = zone.name))
+            return False
+        else:
+            if settings.DEBUGGING_LEVEL >=2:
+                print("unaccounted current of {tot} in {zon}. Probably nothing wrong".format(tot = currentsum, zon = zone.name))
+            return True
+    
+    '''(re)subscribes to every current that goes into fault detection and to the node
+    voltages. needs to be called again whenever an edge is added to the grid model'''
+    def subscribeInfrastructure(self):
+        currenttags = []
+        for zone in self.zones:
+            currenttags.extend(zone.getCurrentTags())
+        for edge in self.Edges:
+            if edge.currentTag and edge.currentTag not in currenttags:
+                currenttags.append(edge.currentTag)
+        voltagetags = [node.voltageTag for node in self.nodes if hasattr(node,"voltageTag")]
+        
+        if self.infSubscriptions:
+            #keep what the subscribers have been told so only real changes are reported
+            currentsub, voltagesub = self.infSubscriptions
+            self.tagPoller.setNames(currentsub,currenttags)
+            self.tagPoller.setNames(voltagesub,voltagetags)
+        else:
+            self.infSubscriptions = [self.tagPoller.subscribe(currenttags,self.currentsChanged,settings.CURRENT_DEADBAND,urgent = True),
+                                     self.tagPoller.subscribe(voltagetags,self.voltagesChanged,settings.VOLTAGE_DEADBAND)]
+    
+    '''called by the tag poller when currents move past their deadband. zones that
+    own a changed current are checked right away instead of at the next
+    faultDetector run'''
+    def currentsChanged(self,changed,currents):
+        for zone in self.zones:
+            for tag in zone.getCurrentTags():
+                if tag in changed:
+                    self.checkZone(zone,currents)
+                    break
+    
+    '''called by the tag poller when node voltages move past their deadband'''
+    def voltagesChanged(self,changed,voltages):
+        for node in self.nodes:
+            voltage = changed.get(getattr(node,"voltageTag",None))
+            if voltage is None:
+                continue
+            group = getattr(node,"group",None)
+            if voltage < settings.VOLTAGE_LOW_EMERGENCY_THRESHOLD:
+                if not getattr(node,"voltageLow",False) and settings.DEBUGGING_LEVEL >= 1:
+                    print("!{me} detected emergency low voltage at node {nod} belonging to {grp}".format(me = self.name, nod = node.name, grp = getattr(group,"name",None)))
+                node.voltageLow = True
+                if group is not None:
+                    group.voltageLow = True
+            else:
+                node.voltageLow = False
+                #the group stays low while any of its other nodes is
+                if group is not None:
+                    group.voltageLow = any([getattr(other,"voltageLow",False) for other in group.nodes])
+    
     @Core.periodic(settings.SECONDARY_VOLTAGE_INTERVAL)
     def voltageMonitor(self):
+        #the tag poller keeps these fresh in the cache, so this rarely goes to the server
+        voltagetags = []
         for group in self.groupList:
             for node in group.nodes:
-                voltage = node.getVoltage()
-                print("measuring a voltage")
-                
-                self.dbinfmeas(node.voltageTag,voltage,self.dbconn,self.t0)
+                voltagetags.append(node.voltageTag)
+        if not voltagetags:
+            return
+        voltages = tagClient.readTagsDictCached(voltagetags,settings.SECONDARY_VOLTAGE_INTERVAL)
+        if voltages is None:
+            return
+        
+        for tag in voltagetags:
+            self.recordMeasurement(tag,voltages[tag])
     
     @Core.periodic(settings.INF_CURRENT_MEASUREMENT_INTERVAL)
     def currentMonitor(self):
@@ -1522,11 +1407,21 @@ class UtilityAgent(Agent):
                 
         retdict = {}
         if taglist:
-            retdict = tagClient.readTags(taglist)
+            #answered from the cache the tag poller keeps fresh
+            retdict = tagClient.readTagsDictCached(taglist,settings.INF_CURRENT_MEASUREMENT_INTERVAL)
             
         if retdict:
             for key in retdict:
-                self.dbinfmeas(key,retdict[key],self.dbconn,self.t0)
+                self.recordMeasurement(key,retdict[key])
+    
+    '''adds an infrastructure reading to its rollups and logs the rollups it
+    finishes. the reading itself is only logged around a suspected fault'''
+    def recordMeasurement(self,signal,value):
+        done, raw = self.rollups.addPoint(signal,value)
+        for result in done:
+            self.log.rollup(result)
+        if raw:
+            self.log.infmeas(signal,value)
     
     def groupEfficiencyAssessment(self,group):            
         loads = 0
@@ -1583,60 +1478,20 @@ class UtilityAgent(Agent):
         unaccounted = waste - losses
         
         #write to database
-        self.dbnewefficiency(sources,loads,losses,unaccounted,self.dbconn,self.t0)
+        self.log.efficiency(sources,loads,losses,unaccounted)
         
                 
             
-    def sendBidAcceptance(self,bid,rate):
-        mesdict = {}
-        mesdict["message_subject"] = "bid_acceptance"
-        mesdict["message_target"] = bid.counterparty
-        mesdict["message_sender"] = self.name
-        
-        mesdict["amount"] = bid.amount
-        
-        if bid.__class__.__name__ == "SupplyBid":
-            mesdict["side"] = bid.side
-            mesdict["service"] = bid.service
-        elif bid.__class__.__name__ == "DemandBid":
-            mesdict["side"] = bid.side
-        else:
-            mesdict["side"] = "unspecified"
-            
-            
-        mesdict["rate"] = rate        
-        mesdict["period_number"] = bid.periodNumber
-        mesdict["uid"] = bid.uid
-        
-        if settings.DEBUGGING_LEVEL >= 2:
-            print("UTILITY AGENT {me} sending bid acceptance to {them} for {uid}".format(me = self.name, them = bid.counterparty, uid = bid.uid))
-        
-        mess = json.dumps(mesdict)
-        self.vip.pubsub.publish(peer = "pubsub",topic = "energymarket",headers = {}, message = mess)
-        
-    def sendBidRejection(self,bid,rate):
-        mesdict = {}
-        mesdict["message_subject"] = "bid_rejection"
-        mesdict["message_target"] = bid.counterparty
-        mesdict["message_sender"] = self.name
-        
-        mesdict["amount"] = bid.amount
-        mesdict["rate"] = rate        
-        if bid.__class__.__name__ == "SupplyBid":
-            mesdict["side"] = "supply"
-            mesdict["service"] = bid.service
-        elif bid.__class__.__name__ == "DemandBid":
-            mesdict["side"] = "demand"
-        else:
-            mesdict["side"] = "unspecified"
-        mesdict["period_number"] = bid.periodNumber
-        mesdict["uid"] = bid.uid
-        
-        if settings.DEBUGGING_LEVEL >= 2:
-            print("UTILITY AGENT {me} sending bid rejection to {them} for {uid}".format(me = self.name, them = bid.counterparty, uid = bid.uid))
-        
-        mess = json.dumps(mesdict)
-        self.vip.pubsub.publish(peer = "pubsub",topic = "energymarket",headers = {}, message = mess)
+    #tells every counterparty how its bids did and what it will pay, one message each
+    def sendMarketResults(self,outcomes):
+        for mesdict in outcomes.messages(self.name):
+            #our own bids need no notification
+            if mesdict["message_target"] == self.name:
+                continue
+            if settings.DEBUGGING_LEVEL >= 2:
+                print("UTILITY AGENT {me} sending results of {n} bids to {them} for period {per}".format(me = self.name, n = len(mesdict["results"]), them = mesdict["message_target"], per = outcomes.period))
+            mess = json.dumps(mesdict)
+            self.vip.pubsub.publish(peer = "pubsub",topic = "energymarket",headers = {}, message = mess)
     
     '''solicit participation in DR scheme from all customers who are not
     currently participants'''
@@ -1717,10 +1572,17 @@ class UtilityAgent(Agent):
                 for node in sub:
                     cNode = self.infnodes[node]
                     cGroup.addNode(cNode)
+            self.groupIndex.rebuild(self.groupList)
+            #the new groups need the bids that have already come in
+            for side, bidlist in [("supply",self.supplyBidList),("demand",self.demandBidList),("reserve",self.reserveBidList)]:
+                for bid in bidlist:
+                    group = self.groupIndex.groupForBid(bid)
+                    if group:
+                        group.book(bid.periodNumber).add(bid,side)
         else:
             print("got a weird number of disjoint subgraphs in utilityagent.getTopology()")
             
-        self.dbtopo(str(subs),self.dbconn,self.t0)
+        self.log.topology(str(subs))
         
         return subs
     
@@ -1799,21 +1661,38 @@ class UtilityAgent(Agent):
                     auxilliaryService = mesdict.get("auxilliary_service",None)
                     newbid = control.SupplyBid(**mesdict)
                     if service == "power":
-                        self.supplyBidList.append(newbid)
+                        self.routeBid(newbid,"supply")
                     elif service == "reserve":                  
-                        self.reserveBidList.append(newbid)
+                        self.routeBid(newbid,"reserve")
                     #write to database
-                    self.dbnewbid(newbid,self.dbconn,self.t0)
+                    self.log.bid(newbid)
                 elif side == "demand":
                     newbid = control.DemandBid(**mesdict)
-                    self.demandBidList.append(newbid)
+                    self.routeBid(newbid,"demand")
                     #write to database
-                    self.dbnewbid(newbid,self.dbconn,self.t0)
+                    self.log.bid(newbid)
                 
                 if settings.DEBUGGING_LEVEL >= 1:
                     print("UTILITY {me} RECEIVED A {side} BID#{id} FROM {them}".format(me = self.name, side = side,id = uid, them = messageSender ))
                     if settings.DEBUGGING_LEVEL >= 2:
                         newbid.printInfo(0)
+            elif messageSubject == "bid_cancellation":
+                bid = self.cancelBid(mesdict.get("uid",None),mesdict.get("resource_name",None),messageSender,mesdict.get("period_number",None))
+                if bid:
+                    #a cancelled bid is recorded as rejected
+                    bid.accepted = False
+                    self.log.bidupdate(bid)
+                if settings.DEBUGGING_LEVEL >= 1:
+                    print("UTILITY {me} RECEIVED A CANCELLATION OF BID#{id} FROM {them}".format(me = self.name, id = mesdict.get("uid",None), them = messageSender))
+            elif messageSubject == "bid_amendment":
+                group = self.groupIndex.groupFor(mesdict.get("resource_name",None),messageSender)
+                if group:
+                    bid = group.book(mesdict.get("period_number",None)).amend(mesdict.get("uid",None),mesdict.get("rate",None),mesdict.get("amount",None))
+                    if bid:
+                        #write to database
+                        self.log.bidamendment(bid)
+                if settings.DEBUGGING_LEVEL >= 1:
+                    print("UTILITY {me} RECEIVED AN AMENDMENT TO BID#{id} FROM {them}".format(me = self.name, id = mesdict.get("uid",None), them = messageSender))
             elif messageSubject == "bid_acceptance":
                 pass
                 #dbupdatebid()
@@ -1848,103 +1727,21 @@ class UtilityAgent(Agent):
     
     @Core.periodic(settings.RESOURCE_MEASUREMENT_INTERVAL)
     def resourceMeasurement(self):
+        #read every resource's channel in one request
+        taglist = []
         for res in self.Resources:
-            self.dbupdateresource(res,self.dbconn,self.t0)
-            
-    def dbgroundfaultevent(self,fault,event,dbconn,t0,currentsum=None):
-        isostring = " "
-        for node in fault.isolatednodes:
-            if node:
-                isostring += "{nam}, ".format(nam = node.name)     
-                
-        fstring = " "
-        for node in fault.faultednodes:
-            if node:
-                fstring += "{nam}, ".format(nam = node.name)    
-        
-        if currentsum:
-            command = 'INSERT INTO faults (logtime, et, period, id, event, state, zone, current_sum, recloses, isolated_nodes, faulted_nodes) VALUES ("{time}",{et},{per},{uid},"{eve}","{sta}","{zon}",{sum},{rec},"{iso}","{fnod}")'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, uid = fault.uid, eve = event, sta=fault.state, zon=fault.zone.name, sum=currentsum, rec=fault.reclosecounter, iso=isostring, fnod = fstring)
-        else:
-            command = 'INSERT INTO faults (logtime, et, period, id, event, state, zone, recloses, isolated_nodes, faulted_nodes) VALUES ("{time}",{et},{per},{uid},"{eve}","{sta}","{zon}",{rec},"{iso}","{fnod}")'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, uid = fault.uid, eve = event, sta=fault.state, zon=fault.zone.name, rec=fault.reclosecounter, iso=isostring, fnod = fstring)
-            
-        self.dbwrite(command,dbconn)
+            ch = res.DischargeChannel
+            taglist.extend([ch.unregVtag, ch.unregItag, ch.regVtag, ch.regItag])
+        if not taglist:
+            return
+        meas = tagClient.readTagsDict(taglist)
+        if meas is None:
+            return
+        for res in self.Resources:
+            self.log.resstate(res,meas)
             
-    def dbconsumption(self,cust,pow,dbconn,t0):
-        command = 'INSERT INTO consumption (logtime, et, period, name, power) VALUES ("{time}",{et},{per},"{name}",{pow})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, name = cust.name, pow = pow)
-        self.dbwrite(command,dbconn)
-                
-    def dbupdateresource(self,res,dbconn,t0):
-        ch = res.DischargeChannel
-        meas = tagClient.readTags([ch.unregVtag, ch.unregItag, ch.regVtag, ch.regItag])
-        command = 'INSERT INTO resstate (logtime, et, period, name, connected, reference_voltage, setpoint, inputV, inputI, outputV, outputI) VALUES ("{time}",{et},{per},"{name}",{conn},{refv},{setp},{inv},{ini},{outv},{outi})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, name = res.name, conn = int(res.connected), refv = ch.refVoltage, setp = ch.setpoint, inv = meas[ch.unregVtag], ini = meas[ch.unregItag] , outv = meas[ch.regVtag], outi = meas[ch.regItag])
-        self.dbwrite(command,dbconn)
-    
-    def dbnewcustomer(self,newcust,dbconn,t0):
-        command = 'INSERT INTO customers VALUES ("{time}",{et},"{name}","{location}")'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, name = newcust.name, location = newcust.location)
-        self.dbwrite(command,dbconn)
-        
-    def dbinfmeas(self,signal,value,dbconn,t0):
-        command = 'INSERT INTO infmeas (logtime, et, period, signame, value) VALUES ("{time}",{et},{per},"{sig}",{val})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0,per = self.CurrentPeriod.periodNumber,sig = signal,val = value)
-        self.dbwrite(command,dbconn)
-        
-    def dbtopo(self,topo,dbconn,t0):
-        command = 'INSERT INTO topology (logtime, et, period, topology) VALUES("{time}",{et},{per},"{top}")'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0,per = self.CurrentPeriod.periodNumber, top = topo)
-        self.dbwrite(command,dbconn)
-        
-    def dbnewprice(self,location,rate,dbconn,t0):
-        command = 'INSERT INTO prices (logtime, et, period, node, rate) VALUES {"{time}",{et},{per},"{loc}",{rat})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0,per = self.CurrentPeriod.periodNumber, loc = location, rat = rate)
-        self.dbwrite(command,dbconn)
-        
-    def dbnewbid(self,newbid,dbconn,t0):
-        if hasattr(newbid,"service"):
-            if hasattr(newbid,"auxilliary_service"):
-                command = 'INSERT INTO bids (logtime, et, period, id, side, service, aux_service, resource_name, counterparty_name, orig_rate, orig_amount) VALUES ("{time}",{et},{per},{id},"{side}","{serv}","{aux}","{resname}","{cntrname}",{rate},{amt})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = newbid.periodNumber,id = newbid.uid, side = newbid.side, serv = newbid.service, aux = newbid.auxilliary_service, resname = newbid.resourceName, cntrname = newbid.counterparty, rate = newbid.rate, amt = newbid.amount) 
-            else:
-                command = 'INSERT INTO bids (logtime, et, period, id, side, service, resource_name, counterparty_name, orig_rate, orig_amount) VALUES ("{time}",{et},{per},{id},"{side}","{serv}","{resname}","{cntrname}",{rate},{amt})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = newbid.periodNumber,id = newbid.uid, side = newbid.side, serv = newbid.service, resname = newbid.resourceName, cntrname = newbid.counterparty, rate = newbid.rate, amt = newbid.amount) 
-        else:
-            command = 'INSERT INTO bids (logtime, et, period, id, side, resource_name, counterparty_name, orig_rate, orig_amount) VALUES ("{time}",{et},{per},{id},"{side}","{resname}","{cntrname}",{rate},{amt})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = newbid.periodNumber,id = newbid.uid, side = newbid.side, resname = newbid.resourceName, cntrname = newbid.counterparty, rate = newbid.rate, amt = newbid.amount) 
-        self.dbwrite(command,dbconn)
-        
-    def dbupdatebid(self,bid,dbconn,t0):
-        if bid.accepted:
-            if hasattr(bid,"service"):
-                command = 'UPDATE bids SET accepted="{acc}",acc_for="{accfor}",settle_rate={rate},settle_amount={amt} WHERE id={id}'.format(acc = int(bid.accepted), accfor = bid.service, rate = bid.rate, amt = bid.amount, id = bid.uid)
-            else:
-                command = 'UPDATE bids SET accepted="{acc}",settle_rate={rate},settle_amount={amt} WHERE id={id}'.format(acc = int(bid.accepted), rate = bid.rate, amt = bid.amount, id = bid.uid)
-        else:
-            command = 'UPDATE bids SET accepted={acc} WHERE id={id}'.format(acc = int(bid.accepted), id = bid.uid)
-        self.dbwrite(command,dbconn)
-        
-    def dbtransaction(self,cust,amt,type,dbconn,t0):
-        command = 'INSERT INTO transactions VALUES("{time}",{et},{per},"{name}","{type}",{amt},{bal})'.format(time = datetime.utcnow().isoformat(),et = time.time()-t0,per = self.CurrentPeriod.periodNumber,name = cust.name,type = type, amt = amt, bal = cust.customerAccount.accountBalance )
-        self.dbwrite(command,dbconn)
-       
-    def dbnewresource(self, newres, dbconn, t0):
-        command = 'INSERT INTO resources VALUES("{time}",{et},"{name}","{type}","{owner}","{loc}", {pow})'.format(time = datetime.utcnow().isoformat(), et = time.time()-t0, name = newres.name, type = newres.__class__.__name__,owner = newres.owner, loc = newres.location, pow = newres.maxDischargePower)
-        self.dbwrite(command,dbconn)
-         
-    def dbnewefficiency(self,generation,consumption,losses,unaccounted,dbconn, t0):
-        command = 'INSERT INTO efficiency VALUES("{time}",{et},{per},{gen},{con},{loss},{unacc})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, gen = generation, con = consumption, loss = losses, unacc = unaccounted)
-        self.dbwrite(command,dbconn)
-        
-    def dbrelayfault(self,location,measurement,dbconn,t0):
-        command = 'INSERT INTO relayfaults VALUES("{time}",{et},{per},{loc},{meas},{res})'.format(time = datetime.utcnow().isoformat(), et = time.time() - t0, per = self.CurrentPeriod.periodNumber, loc = location, meas = measurement, res = resistance)
-        self.dbwrite(command,dbconn)
-        
-    def dbnewperiod(self,number,start,dbconn,t0):
-        command = 'INSERT INTO periods VALUES({per},"{time}")'.format(per = number, time = start )
-        self.dbwrite(command,dbconn)
-            
-    def dbwrite(self,command,dbconn):
-        try:
-            cursor = dbconn.cursor()
-            cursor.execute(command)
-            dbconn.commit()
-            cursor.close()
-        except Exception as e:
-            print("dbase error")
-            print(command)
-            print(e)
+    def currentPeriodNumber(self):
+        return self.CurrentPeriod.periodNumber
     
     '''prints information about the utility and its assets'''
     def printInfo(self,verbosity):
@@ -1991,49 +1788,10 @@ class UtilityAgent(Agent):
         return None
     
     
-    '''get tag value by name, but use the tag client only if the locally cached
-    value is too old, as defined in seconds by threshold'''
+    '''get tag value by name, but use the tag client only if the cached value
+    is too old, as defined in seconds by threshold'''
     def getLocalPreferred(self,tags,threshold, plc = "user"):
-        reqlist = []
-        outdict = {}
-        indict = {}
-        
-        for tag in tags:
-            try:
-                #check cache to see if the tag is fresher than the threshold
-                val, time = self.tagCache.get(tag,[None,None])
-                #how much time has passed since the tag was last read from the server?
-                diff = datetime.now()-time
-                #convert to seconds
-                et = diff.total_seconds()                
-            except Exception:
-                val = None
-                et = threshold
-                
-            #if it's too old, add it to the list to be requested from the server    
-            if et > threshold or val is None:
-                reqlist.append(tag)
-            #otherwise, add it to the output
-            else:
-                outdict[tag] = val
-                
-        #if there are any tags to be read from the server get them all at once
-        if reqlist:
-            indict = tagClient.readTags(reqlist,plc)
-            if len(indict) == 1:
-                outdict[reqlist[0]] = indict[reqlist[0]]
-            else:
-                for updtag in indict:
-                    #then update the cache
-                    self.tagCache[updtag] = (indict[updtag], datetime.now())
-                    #then add to the output
-                    outdict[updtag] = indict[updtag]
-            
-            #output should be an atom if possible (i.e. the request was for 1 tag
-            if len(outdict) == 1:
-                return outdict[tag]
-            else:
-                return outdict
+        return tagClient.readTagsCached(tags,threshold,plc)
     
     '''get tag by name from tag server'''
     def getTag(self,tag, plc = "user"):
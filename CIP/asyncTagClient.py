@@ -0,0 +1,95 @@
+import time
+
+from DCMGClasses.CIP import tagClient, concurrency
+
+#seconds to wait on a future before giving up on it
+DEFAULT_TIMEOUT = 5.0
+
+class TagTimeout(Exception):
+    pass
+
+'''result of a tag request that is still in flight. get() waits for it, but only
+blocks the calling greenlet, so the agent keeps handling messages in the meantime'''
+class TagFuture(object):
+    def __init__(self,description = ""):
+        self.description = description
+        self.value = None
+        self.error = None
+        self.done = concurrency.Event()
+        self.callbacks = []
+
+    def ready(self):
+        return self.done.is_set()
+
+    def setResult(self,value):
+        self.value = value
+        self.finish()
+
+    def setError(self,error):
+        self.error = error
+        self.finish()
+
+    def finish(self):
+        self.done.set()
+        for callback in self.callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print("tag future callback failed: {err}".format(err = e))
+
+    '''calls callback(future) once the request completes, right away if it already has'''
+    def addCallback(self,callback):
+        if self.ready():
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    '''waits up to timeout seconds for the result. raises TagTimeout if it doesn't
+    arrive in time and reraises anything the request itself raised'''
+    def get(self,timeout = DEFAULT_TIMEOUT):
+        self.done.wait(timeout)
+        if not self.ready():
+            raise TagTimeout("no reply to {req} after {t} s".format(req = self.description, t = timeout))
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+def runRequest(future,fn,*args):
+    try:
+        future.setResult(fn(*args))
+    except Exception as e:
+        future.setError(e)
+
+'''starts reading tags and returns a TagFuture right away. the result is a dictionary
+of values, or None if the tag server couldn't be reached'''
+def readTagsAsync(names, plc = "user"):
+    future = TagFuture("read {plc} {names}".format(plc = plc, names = " ".join(names)))
+    concurrency.spawn(runRequest,future,tagClient.readTagsDict,names,plc)
+    return future
+
+'''starts writing tags and returns a TagFuture that completes when the write does'''
+def writeTagsAsync(names, values, plc = "user"):
+    future = TagFuture("write {plc} {names}".format(plc = plc, names = " ".join(names)))
+    concurrency.spawn(runRequest,future,tagClient.writeTags,names,values,plc)
+    return future
+
+'''runs any blocking tag client function, e.g. a resource's power measurement, in the
+background and returns a TagFuture for its return value'''
+def callAsync(fn,*args):
+    future = TagFuture(getattr(fn,"__name__","call"))
+    concurrency.spawn(runRequest,future,fn,*args)
+    return future
+
+'''waits for several futures sharing one deadline and returns their results in
+order. a future that times out or fails gives None in its place'''
+def gather(futures,timeout = DEFAULT_TIMEOUT):
+    deadline = time.time() + timeout
+    results = []
+    for future in futures:
+        try:
+            results.append(future.get(max(0,deadline - time.time())))
+        except Exception as e:
+            print("tag client experiencing problem")
+            print(e)
+            results.append(None)
+    return results
@@ -0,0 +1,71 @@
+import threading
+
+from DCMGClasses.CIP import concurrency
+
+
+'''tags requested by every caller that arrived during one coalescing window'''
+class ReadBatch(object):
+    def __init__(self):
+        self.names = set()
+        self.callers = 0
+        self.values = None
+        self.done = concurrency.Event()
+
+
+'''merges tag reads that are issued within a short window of each other into a single
+request. the first caller to arrive waits out the window, sends one read for the union
+of everything requested in the meantime and hands each caller back the tags it asked
+for. reads on different PLCs are batched separately'''
+class ReadCoalescer(object):
+    def __init__(self,reader,window = .005,timeout = 10):
+        #reader takes (names, plc) and returns a dictionary of values
+        self.reader = reader
+        self.window = window
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.pending = {}
+
+        self.requests = 0
+        self.roundtrips = 0
+        self.tagsrequested = 0
+        self.tagsread = 0
+
+    def read(self,names,plc = "user"):
+        with self.lock:
+            batch = self.pending.get(plc)
+            leader = batch is None
+            if leader:
+                batch = ReadBatch()
+                self.pending[plc] = batch
+            batch.names.update(names)
+            batch.callers += 1
+            self.requests += 1
+            self.tagsrequested += len(names)
+
+        if leader:
+            concurrency.sleep(self.window)
+            #close the batch so late arrivals start a new one
+            with self.lock:
+                del self.pending[plc]
+            try:
+                batch.values = self.reader(list(batch.names),plc)
+            finally:
+                self.roundtrips += 1
+                self.tagsread += len(batch.names)
+                batch.done.set()
+        else:
+            batch.done.wait(self.timeout)
+
+        if batch.values is None:
+            return None
+        outdict = {}
+        for name in names:
+            outdict[name] = batch.values.get(name)
+        return outdict
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "TAG READ COALESCER ({win} s window)".format(win = self.window))
+        print(spaces*(depth+1) + "{req} reads served by {rt} round trips".format(req = self.requests, rt = self.roundtrips))
+        print(spaces*(depth+1) + "{req} tags requested, {read} read".format(req = self.tagsrequested, read = self.tagsread))
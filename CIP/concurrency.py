@@ -0,0 +1,51 @@
+'''picks the blocking primitives the tag client should use. VOLTTRON agents run on
+gevent, and if the standard library hasn't been monkey patched a threading.Event or
+a plain socket would block the whole hub instead of just the waiting greenlet'''
+import time
+import socket
+import select
+import threading
+
+try:
+    import gevent
+    import gevent.event
+    import gevent.lock
+    import gevent.local
+    import gevent.socket
+    import gevent.select
+    from gevent import monkey
+    GREENLETS = not monkey.is_module_patched("threading")
+    GREENSOCKETS = not monkey.is_module_patched("socket")
+except ImportError:
+    GREENLETS = False
+    GREENSOCKETS = False
+
+if GREENLETS:
+    Event = gevent.event.Event
+    BoundedSemaphore = gevent.lock.BoundedSemaphore
+    #without monkey patching every greenlet would share one threading.local
+    local = gevent.local.local
+    sleep = gevent.sleep
+else:
+    Event = threading.Event
+    BoundedSemaphore = threading.BoundedSemaphore
+    local = threading.local
+    sleep = time.sleep
+
+#socket and select modules that only block the calling greenlet
+if GREENSOCKETS:
+    sockets = gevent.socket
+    selector = gevent.select
+else:
+    sockets = socket
+    selector = select
+
+'''runs fn(*args) in the background, in a greenlet if we are running under gevent
+or in a daemon thread otherwise'''
+def spawn(fn,*args):
+    if GREENLETS:
+        return gevent.spawn(fn,*args)
+    thread = threading.Thread(target = fn, args = args)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,200 @@
+'''change notification for tag values. the tag server only answers requests, so a
+local poller asks for every subscribed tag in one request per PLC and calls each
+subscriber back only with the values that moved past its deadband. where the tag
+server can watch tags (see SG.gridsim) the request is held on the server until a tag
+moves past the smallest deadband or the poll interval runs out, so changes come back
+within milliseconds while a quiet grid costs one request per PLC per interval.
+otherwise the tags of urgent subscriptions are read every fast interval and the rest
+once per interval. the values it reads also land in the shared tag cache, so ordinary
+readers can be answered from there'''
+import time
+
+from DCMGClasses.CIP import tagClient, concurrency
+
+#longest seconds between requests for the subscribed tags. this is as often as the
+#utility's monitoring loops used to read them
+POLL_INTERVAL = 5
+#seconds between reads of urgent subscriptions' tags where the tag server can't watch
+#them, so e.g. fault detection doesn't wait on the slow interval
+FAST_INTERVAL = .5
+
+'''a set of tags and the callback that wants to hear about them. numeric values are
+reported when they differ from the last reported value by more than the deadband,
+booleans whenever they flip. the first poll reports everything'''
+class TagSubscription(object):
+    def __init__(self,names,callback,deadband = 0,plc = "user",urgent = False):
+        self.names = list(names)
+        self.callback = callback
+        self.deadband = deadband
+        self.plc = plc
+        self.urgent = urgent
+        self.reported = {}
+        self.active = True
+
+    def changes(self,values):
+        changed = {}
+        for name in self.names:
+            if name not in values:
+                continue
+            value = values[name]
+            last = self.reported.get(name)
+            if last is None:
+                changed[name] = value
+            elif type(value) is bool or type(last) is bool:
+                if value != last:
+                    changed[name] = value
+            elif abs(value - last) > self.deadband:
+                changed[name] = value
+        self.reported.update(changed)
+        return changed
+
+    def cancel(self):
+        self.active = False
+
+
+'''asks for the union of all subscribed tags, one request at a time per PLC'''
+class TagPoller(object):
+    def __init__(self,interval = POLL_INTERVAL,watch = True,fastinterval = FAST_INTERVAL):
+        self.interval = interval
+        self.fastinterval = fastinterval
+        #turned off if the tag server turns out not to support watching tags
+        self.watch = watch
+        self.subscriptions = []
+        self.running = False
+        #PLCs with a loop running
+        self.loops = set()
+        #the connection each PLC's watches are held on
+        self.conns = {}
+        #PLCs whose held watch was cut short on purpose
+        self.interrupted = set()
+        self.polls = 0
+        self.notifications = 0
+
+    '''calls callback(changed,values) whenever tags in names move by more than
+    deadband. changed holds the values that moved and values every subscribed tag
+    as of this poll. if the tag server can't watch tags, the tags of an urgent
+    subscription are read every fastinterval seconds instead of every interval'''
+    def subscribe(self,names,callback,deadband = 0,plc = "user",urgent = False):
+        sub = TagSubscription(names,callback,deadband,plc,urgent)
+        self.subscriptions.append(sub)
+        if self.running:
+            self.startLoop(plc)
+        return sub
+
+    '''changes the tags of a subscription without forgetting what its subscriber has
+    already been told. a watch the server is holding was asked with the old tags, so
+    it is cut short and asked again'''
+    def setNames(self,sub,names):
+        sub.names = list(names)
+        conn = self.conns.get(sub.plc)
+        if conn is not None and conn.sock is not None:
+            self.interrupted.add(sub.plc)
+            conn.interrupt()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            for sub in self.subscriptions:
+                self.startLoop(sub.plc)
+
+    '''each PLC gets its own loop so a request held by the server for one PLC doesn't
+    hold up the others'''
+    def startLoop(self,plc):
+        if plc not in self.loops:
+            self.loops.add(plc)
+            concurrency.spawn(self.run,plc)
+
+    def stop(self):
+        self.running = False
+
+    def run(self,plc):
+        #whether a watch has been answered on this PLC yet
+        watched = False
+        #when every subscribed tag is read next, if they can't be watched
+        nextfull = 0
+        while self.running:
+            self.subscriptions = [sub for sub in self.subscriptions if sub.active]
+            subs = [sub for sub in self.subscriptions if sub.plc == plc]
+            if not subs:
+                break
+
+            if self.watch:
+                try:
+                    values = self.watchOnce(plc,subs)
+                except Exception as e:
+                    self.closeConnection(plc)
+                    if plc in self.interrupted:
+                        #ask again with the new tags right away
+                        self.interrupted.discard(plc)
+                        continue
+                    print("tag poller experiencing problem")
+                    print(e)
+                    if watched:
+                        concurrency.sleep(self.interval)
+                    else:
+                        #a tag server that doesn't know the request might just hang up
+                        self.stopWatching(plc)
+                    continue
+                self.polls += 1
+                if values is None:
+                    self.stopWatching(plc)
+                    continue
+                watched = True
+                self.notify(subs,values)
+            else:
+                #urgent tags are read every fastinterval and the rest every interval
+                urgent = [sub for sub in subs if sub.urgent]
+                if urgent and time.time() < nextfull:
+                    subs = urgent
+                else:
+                    nextfull = time.time() + self.interval
+                values = tagClient.fetchTags(self.names(subs),plc)
+                self.polls += 1
+                if values is not None:
+                    self.notify(subs,values)
+                if urgent:
+                    concurrency.sleep(self.fastinterval)
+                else:
+                    concurrency.sleep(self.interval)
+        self.closeConnection(plc)
+        self.loops.discard(plc)
+
+    '''asks the tag server to answer once the subscribed tags have changed. the answer
+    comes after interval seconds at the latest'''
+    def watchOnce(self,plc,subs):
+        conn = self.conns.get(plc)
+        if conn is None:
+            conn = tagClient.TagConnection(tagClient.TSERVER_ADDR,self.interval + tagClient.SOCKET_TIMEOUT)
+            self.conns[plc] = conn
+        deadband = min([sub.deadband for sub in subs])
+        return tagClient.watchTags(conn,self.names(subs),self.interval,deadband,plc)
+
+    def names(self,subs):
+        names = set()
+        for sub in subs:
+            names.update(sub.names)
+        return list(names)
+
+    def closeConnection(self,plc):
+        conn = self.conns.pop(plc,None)
+        if conn is not None:
+            conn.close()
+
+    def stopWatching(self,plc):
+        self.closeConnection(plc)
+        if self.watch:
+            print("tag server can't watch tags, reading urgent ones every {f} s and the rest every {t} s instead".format(f = self.fastinterval, t = self.interval))
+        self.watch = False
+
+    def notify(self,subs,values):
+        for sub in subs:
+            changed = sub.changes(values)
+            if changed:
+                self.notifications += 1
+                current = {}
+                for name in sub.names:
+                    current[name] = values.get(name)
+                try:
+                    sub.callback(changed,current)
+                except Exception as e:
+                    print("tag subscriber failed: {err}".format(err = e))
@@ -1,97 +1,495 @@
 import socket
 import sys
 import subprocess
+import threading
+from collections import OrderedDict
 from datetime import datetime
-    
+
+from DCMGClasses.CIP import concurrency
+from DCMGClasses.CIP.tagcache import TagCache
+
+#address of the tag server and size of the persistent connection pool
+TSERVER_ADDR = ('localhost',12897)
+POOL_SIZE = 4
+#seconds to wait on a connect or a reply before giving up on a connection
+SOCKET_TIMEOUT = 2.0
+#when False every request opens and closes its own socket like it used to
+POOLING = True
+#relay tags end with this. writing one changes currents and voltages all over the grid
+RELAY_SUFFIX = "_User"
+#replies are newline terminated. this is how much we ask the socket for at a time
+RECV_SIZE = 65536
+
+'''incremental parser for tag server replies. name:value pairs are parsed as soon as
+the chunk containing their trailing comma arrives, so a large reply is never held
+and split as one big string'''
+class ReplyParser(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.partial = ""
+
+    def feed(self,chunk):
+        pairs = (self.partial + chunk).split(",")
+        #the last piece may be cut off in the middle of a pair
+        self.partial = pairs.pop()
+        for pair in pairs:
+            self.addPair(pair)
+
+    def finish(self):
+        if self.partial.strip():
+            self.addPair(self.partial)
+        self.partial = ""
+        return self.values
+
+    def addPair(self,pair):
+        name,value = pair.strip().split(":")
+        self.values[name] = parseValue(value)
+
+'''converts a value string from the tag server to a float or a boolean'''
+def parseValue(value):
+    try:
+        value = float(value)
+    except Exception:
+        #string isn't a number so it should be a boolean
+        #make string lowercase
+        value = value.lower()
+        if value.find("true") >= 0:
+            value = True
+        elif value.find("false") >= 0:
+            value = False
+        else:
+            print("can't process properly")
+    return value
+
+'''reads a whole reply off of a socket. a reply ends at a newline, or when a server
+that only handles one request per connection hangs up. if a parser is given it is fed
+each chunk as it comes in'''
+def receiveReply(sock,parser = None):
+    chunks = []
+    while True:
+        chunk = sock.recv(RECV_SIZE)
+        if not chunk:
+            if not chunks:
+                #server closed the connection without answering
+                raise socket.error("tag server closed connection")
+            break
+        end = chunk.find("\n")
+        if end >= 0:
+            chunk = chunk[:end]
+        chunks.append(chunk)
+        if parser is not None:
+            parser.feed(chunk)
+        if end >= 0:
+            break
+    return "".join(chunks)
+
+'''a single persistent connection to the tag server. the socket is opened lazily and
+reopened whenever the server hangs up on us'''
+class TagConnection(object):
+    def __init__(self,addr,timeout = SOCKET_TIMEOUT):
+        self.addr = addr
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        self.close()
+        self.sock = concurrency.sockets.create_connection(self.addr,self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+    '''an idle connection should never have anything waiting to be read. if the socket
+    is readable the server has either closed it or left junk from an earlier request'''
+    def isHealthy(self):
+        if self.sock is None:
+            return False
+        try:
+            readable, writable, errored = concurrency.selector.select([self.sock],[],[self.sock],0)
+        except Exception:
+            return False
+        if readable or errored:
+            return False
+        return True
+
+    '''cuts short a request another greenlet or thread is waiting on. the request fails
+and the connection has to be opened again'''
+    def interrupt(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+
+    def transact(self,message,parser = None):
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(message)
+        return receiveReply(self.sock,parser)
+
+
+'''keeps a handful of persistent connections to the tag server so that measurements
+don't pay for a TCP connect and teardown every time. connections are checked before
+they are handed out and replaced if the server has dropped them'''
+class ConnectionPool(object):
+    def __init__(self,addr = TSERVER_ADDR,size = POOL_SIZE,timeout = SOCKET_TIMEOUT):
+        self.addr = addr
+        self.size = size
+        self.timeout = timeout
+
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = concurrency.BoundedSemaphore(size)
+
+        self.connects = 0
+        self.requests = 0
+        self.failures = 0
+
+    def acquire(self):
+        self.slots.acquire()
+        conn = None
+        with self.lock:
+            while self.idle:
+                conn = self.idle.pop()
+                if conn.isHealthy():
+                    break
+                conn.close()
+                conn = None
+        if conn is None:
+            conn = TagConnection(self.addr,self.timeout)
+            try:
+                conn.connect()
+            except Exception:
+                self.slots.release()
+                raise
+            self.connects += 1
+        return conn
+
+    def release(self,conn):
+        if conn.sock is not None:
+            with self.lock:
+                self.idle.append(conn)
+        self.slots.release()
+
+    '''sends a request and returns the reply. a request that fails on a connection
+    which had been sitting in the pool is retried once on a fresh connection'''
+    def request(self,message,parser = None):
+        self.requests += 1
+        for attempt in range(2):
+            conn = self.acquire()
+            if parser is not None:
+                parser.reset()
+            try:
+                data = conn.transact(message,parser)
+            except Exception:
+                conn.close()
+                self.release(conn)
+                self.failures += 1
+                if attempt > 0:
+                    raise
+                continue
+            self.release(conn)
+            return data
+
+    def closeAll(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+
+
+pool = None
+poollock = threading.Lock()
+
+def getPool():
+    global pool
+    if pool is None:
+        with poollock:
+            if pool is None:
+                pool = ConnectionPool(TSERVER_ADDR,POOL_SIZE,SOCKET_TIMEOUT)
+    return pool
+
+'''changes the tag server address or pooling behavior. any pooled connections to the
+old address are dropped'''
+def configure(addr = None, pooling = None, poolsize = None, timeout = None):
+    global pool, TSERVER_ADDR, POOLING, POOL_SIZE, SOCKET_TIMEOUT
+    if addr is not None:
+        TSERVER_ADDR = addr
+    if pooling is not None:
+        POOLING = pooling
+    if poolsize is not None:
+        POOL_SIZE = poolsize
+    if timeout is not None:
+        SOCKET_TIMEOUT = timeout
+    with poollock:
+        if pool is not None:
+            pool.closeAll()
+        pool = None
+
+coalescer = None
+#every value read from the tag server ends up in here
+cache = TagCache()
+
+'''merges reads issued within window seconds of each other into one request to the
+tag server. a window of 0 or None turns coalescing back off'''
+def enableCoalescing(window = .005):
+    global coalescer
+    if window:
+        from DCMGClasses.CIP.coalescer import ReadCoalescer
+        coalescer = ReadCoalescer(fetchTags,window)
+    else:
+        coalescer = None
+
+'''opens a socket for a single request and closes it afterward'''
+def oneShotRequest(message,parser = None):
+    sock = concurrency.sockets.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(SOCKET_TIMEOUT)
+    try:
+        sock.connect(TSERVER_ADDR)
+        sock.sendall(message)
+        data = receiveReply(sock,parser)
+    finally:
+        sock.close()
+    return data
+
+def sendRequest(message,parser = None):
+    if POOLING:
+        return getPool().request(message,parser)
+    else:
+        return oneShotRequest(message,parser)
+
 
 '''writes multiple tags to a tag server. tag names and values must be provided as lists
-even if only a single tag value pair is being written'''
+even if only a single tag value pair is being written. inside a WriteBatch the write
+is held until the batch is flushed'''
 def writeTags(names,values,plc = "user"):
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tserver_addr = ('localhost',12897)
-    #print("tag client attempting to connect and write to {host}:{port}".format(host = tserver_addr[0], port = tserver_addr[1]))
-    
+    batch = activeBatch()
+    if batch is not None:
+        batch.add(names,values,plc)
+        return
+    sendWrite(names,values,plc)
+
+'''sends one write request straight to the tag server'''
+def sendWrite(names,values,plc = "user"):
+    message = "write {plc}".format(plc = plc)
+    for index,name in enumerate(names):
+        message = message + " {name}:{value}".format(name = name, value = str(values[index]))
+    message = message + "\n"
+
     try:
-        sock.connect(tserver_addr)
-        
-        message = "write {plc}".format(plc = plc)
-        for index,name in enumerate(names):
-            message = message + " {name}:{value}".format(name = name, value = str(values[index]))
-                
-        message = message + "\n"
-        
-        sock.sendall(message)
-        
-        data = sock.recv(1024)
-        #print("\nWRITE @ {dt} \nMESSAGE: {mes}  REC: {dat}".format(dt = datetime.isoformat(datetime.now()), mes = message, dat = data))
-        
-        #flog = open("~/volttron/taglog","a+")
+        data = sendRequest(message)
         print("WRITE @ {dt} \nMESSAGE: {mes}REC: {dat}".format(dt = datetime.isoformat(datetime.now()), mes = message, dat = data))
-    except Exception:
+    except Exception as e:
         print("tag client experiencing problem")
+        print(e)
     finally:
-        #print("closing tag client socket")
-        sock.close()
+        invalidateAfterWrite(names,plc)
+
+'''cached values of written tags are no longer good. if a relay was written none of
+the measurements on that PLC can be trusted either'''
+def invalidateAfterWrite(names,plc = "user"):
+    for name in names:
+        if name.endswith(RELAY_SUFFIX):
+            cache.invalidate(None,plc)
+            return
+    cache.invalidate(names,plc)
+
 
-    
 '''reads multiple tags from a tag server. tag names must be provided as a list even
 if there is only a single tag being read'''
 def readTags(names, plc = "user"):
-    outdict = {}
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tserver_addr = ('localhost',12897)
-    #print("tag client attempting to connect to  and read from {host}:{port}".format(host = tserver_addr[0], port = tserver_addr[1]))
-    
-    try:
-        sock.connect(tserver_addr)
-        
-        message = "read {plc}".format(plc = plc)
-        for index,name in enumerate(names):
-            message = message + " " + name
-        message = message + "\n"
-        sock.sendall(message)
-        
-        data = sock.recv(1024)
-        
-        #print("\nREAD @ {dt} \nMESSAGE: {mes}  REC: {dat}".format(dt = datetime.isoformat(datetime.now()), mes = message, dat = data))
-            
-    except Exception:
-        print("tag client experiencing problem")
-        print(Exception)
-    finally:
-        #print("closing tag client socket")
-        sock.close()
-        if "flog" in globals():
-            flog.close()
-    
-    #print("tag client received: {info}".format(info = data))
-    pairs = data.split(",")
-    for pair in pairs:
-        name,value = pair.split(":")
-        #print(" name = {n}\n value = {v}".format(n = name, v = value))
-        try:
-            value = float(value)
-            #print("float: {v}".format(v = value))
-        except Exception:
-            #string isn't a number so it should be a boolean
-            #make string lowercase
-            value.lower()
-            #print("val to lower: {v}".format(v = value))
-            if value.find("true") >= 0:
-                #print("val is true")
-                value = True
-            elif value.find("false") >= 0:
-                #print("val is false")
-                value = False
-            else:
-                print("can't process properly")
-                                    
-            
-        outdict[name] = value
-        
+    outdict = readTagsDict(names,plc)
+    if outdict is None:
+        return None
+
     #return an atom if we can
     if len(outdict) == 1:
         return outdict[names[0]]
     else:
         return outdict
-    
+
+'''same as readTags but always returns a dictionary, even for a single tag. the reply
+is read in full however large it is, so hundreds of tags can be read in one request'''
+def readTagsDict(names, plc = "user"):
+    batch = activeBatch()
+    if batch is not None and batch.holds(names,plc):
+        return batch.readThrough(names,plc)
+    if coalescer is not None:
+        return coalescer.read(names,plc)
+    return fetchTags(names,plc)
+
+'''sends one read request straight to the tag server'''
+def fetchTags(names, plc = "user"):
+    message = "read {plc} {names}\n".format(plc = plc, names = " ".join(names))
+    parser = ReplyParser()
+    try:
+        sendRequest(message,parser)
+    except Exception as e:
+        print("tag client experiencing problem")
+        print(e)
+        return None
+
+    values = parser.finish()
+    cache.store(values,plc)
+    return values
+
+'''reads tags over a connection of the caller's own, but the tag server holds the reply
+until one of them has moved by more than deadband since the last watch on the same
+connection, or until wait seconds have passed. the first watch on a connection is
+answered right away. the connection's timeout has to be longer than wait. returns
+None if the tag server can't watch tags'''
+def watchTags(conn,names,wait,deadband = 0,plc = "user"):
+    message = "watch {plc} {wait} {db} {names}\n".format(plc = plc, wait = wait, db = deadband, names = " ".join(names))
+    data = conn.transact(message)
+    if data.strip() == "error":
+        return None
+    parser = ReplyParser()
+    parser.feed(data)
+    values = parser.finish()
+    cache.store(values,plc)
+    return values
+
+'''reads tags but answers from the cache when it holds a value no older than maxage
+seconds. without maxage each tag's own TTL is used. returns an atom for a single tag
+like readTags does'''
+def readTagsCached(names, maxage = None, plc = "user"):
+    outdict = readTagsDictCached(names,maxage,plc)
+    if outdict is None:
+        return None
+
+    if len(names) == 1:
+        return outdict[names[0]]
+    else:
+        return outdict
+
+'''same as readTagsCached but always returns a dictionary'''
+def readTagsDictCached(names, maxage = None, plc = "user"):
+    outdict, stale = cache.lookup(names,plc,maxage)
+    if stale:
+        values = readTagsDict(stale,plc)
+        if values is None:
+            return None
+        outdict.update(values)
+    return outdict
+
+#open batches of each greenlet or thread
+batches = concurrency.local()
+
+def activeBatch():
+    stack = getattr(batches,"stack",None)
+    if stack:
+        return stack[-1]
+    return None
+
+'''collects the tag writes made during one control action and sends them as one
+message per PLC when the batch is closed. only the last value written to each tag is
+kept, and relay tags are written after everything else. reads of tags with a pending
+write are answered with the pending value, and if confirm is set the written tags are
+read back once after the flush. batches can be nested, in which case the outermost
+one does the flushing
+
+    with tagClient.WriteBatch(confirm = True) as batch:
+        relay.closeRelay()
+        channel.connectWithSet(setpoint)
+'''
+class WriteBatch(object):
+    def __init__(self,confirm = False):
+        self.confirm = confirm
+        self.pending = OrderedDict()
+        self.mismatches = {}
+        self.writes = 0
+        self.outer = None
+        self.stack = None
+
+    def __enter__(self):
+        stack = getattr(batches,"stack",None)
+        if stack is None:
+            stack = []
+            batches.stack = stack
+        if stack:
+            self.outer = stack[-1]
+        stack.append(self)
+        self.stack = stack
+        return self
+
+    def __exit__(self,exctype,excval,tb):
+        self.stack.remove(self)
+        if self.outer is not None:
+            #let the outer batch send these along with its own writes
+            for plc in self.pending:
+                tags = self.pending[plc]
+                self.outer.add(tags.keys(),tags.values(),plc)
+            self.outer.confirm = self.outer.confirm or self.confirm
+        else:
+            self.flush()
+        return False
+
+    def add(self,names,values,plc = "user"):
+        tags = self.pending.setdefault(plc,OrderedDict())
+        for index,name in enumerate(names):
+            tags[name] = values[index]
+        self.writes += 1
+
+    def holds(self,names,plc = "user"):
+        tags = self.pending.get(plc)
+        if not tags:
+            return False
+        for name in names:
+            if name in tags:
+                return True
+        return False
+
+    '''answers a read with pending values where there are any and reads the rest'''
+    def readThrough(self,names,plc = "user"):
+        tags = self.pending[plc]
+        outdict = {}
+        remaining = []
+        for name in names:
+            if name in tags:
+                outdict[name] = parseValue(str(tags[name]))
+            else:
+                remaining.append(name)
+        if remaining:
+            values = fetchTags(remaining,plc)
+            if values is None:
+                return None
+            outdict.update(values)
+        return outdict
+
+    def flush(self):
+        for plc in self.pending:
+            tags = self.pending[plc]
+            if not tags:
+                continue
+            #setpoints go ahead of relays so nothing connects with stale settings
+            names = [name for name in tags if not name.endswith(RELAY_SUFFIX)]
+            names.extend([name for name in tags if name.endswith(RELAY_SUFFIX)])
+            sendWrite(names,[tags[name] for name in names],plc)
+            if self.confirm:
+                self.checkWrites(tags,plc)
+        self.pending = OrderedDict()
+        return self.mismatches
+
+    def checkWrites(self,tags,plc = "user"):
+        readback = fetchTags(tags.keys(),plc)
+        if readback is None:
+            print("tag client could not confirm batched write")
+            return
+        for name in tags:
+            expected = parseValue(str(tags[name]))
+            actual = readback.get(name)
+            if type(expected) is bool or type(actual) is bool:
+                matched = expected == actual
+            else:
+                matched = actual is not None and abs(actual - expected) <= 1e-6*max(1,abs(expected))
+            if not matched:
+                self.mismatches[name] = (expected,actual)
+                print("tag {name} reads {act} after writing {exp}".format(name = name, act = actual, exp = expected))
@@ -0,0 +1,90 @@
+import time
+import threading
+
+#seconds a cached tag value is considered fresh unless told otherwise
+DEFAULT_TTL = 5.0
+
+'''process wide cache of tag values. every read that goes to the tag server is stored
+here, and readers that can live with a value up to a certain age are answered
+without going to the network. each tag can have its own time to live, and callers
+can ask for something fresher than that on a per read basis'''
+class TagCache(object):
+    def __init__(self,defaultttl = DEFAULT_TTL):
+        self.defaultttl = defaultttl
+        self.ttls = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    '''sets how long values of the named tags stay fresh'''
+    def setTTL(self,names,ttl):
+        for name in names:
+            self.ttls[name] = ttl
+
+    def getTTL(self,name):
+        return self.ttls.get(name,self.defaultttl)
+
+    '''stores a dictionary of values that were just read from the tag server'''
+    def store(self,values,plc = "user",stamp = None):
+        if stamp is None:
+            stamp = time.time()
+        with self.lock:
+            for name in values:
+                self.entries[(plc,name)] = (values[name],stamp)
+
+    '''splits names into a dictionary of values that are fresh enough and a list of
+    names that have to be read. maxage in seconds overrides the per tag TTL'''
+    def lookup(self,names,plc = "user",maxage = None):
+        now = time.time()
+        fresh = {}
+        stale = []
+        with self.lock:
+            for name in names:
+                entry = self.entries.get((plc,name))
+                if maxage is None:
+                    limit = self.ttls.get(name,self.defaultttl)
+                else:
+                    limit = maxage
+                if entry is not None and now - entry[1] <= limit:
+                    fresh[name] = entry[0]
+                    self.hits += 1
+                else:
+                    stale.append(name)
+                    self.misses += 1
+        return fresh, stale
+
+    '''drops the named tags from the cache. with no names every tag on the PLC is
+    dropped, and with no PLC either the whole cache is emptied'''
+    def invalidate(self,names = None,plc = None):
+        with self.lock:
+            if names is None:
+                if plc is None:
+                    self.entries = {}
+                else:
+                    for key in self.entries.keys():
+                        if key[0] == plc:
+                            del self.entries[key]
+            else:
+                for name in names:
+                    if plc is None:
+                        for key in self.entries.keys():
+                            if key[1] == name:
+                                del self.entries[key]
+                    else:
+                        self.entries.pop((plc,name),None)
+            self.invalidations += 1
+
+    def hitRate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0
+        return float(self.hits)/total
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "TAG CACHE: {n} entries, default TTL {ttl} s".format(n = len(self.entries), ttl = self.defaultttl))
+        print(spaces*(depth+1) + "HITS: {h}  MISSES: {m}  HIT RATE: {r:.2f}".format(h = self.hits, m = self.misses, r = self.hitRate()))
+        print(spaces*(depth+1) + "INVALIDATIONS: {i}".format(i = self.invalidations))
@@ -24,7 +24,7 @@ def cleanup():
     tags = ["BRANCH_1_BUS_1_FAULT","BRANCH_1_BUS_2_FAULT","BRANCH_2_BUS_1_FAULT","BRANCH_2_BUS_2_FAULT",
             "CROSSTIE_1_FAULT_1","CROSSTIE_1_FAULT_2","CROSSTIE_2_FAULT_1","CROSSTIE_2_FAULT_2", "MAIN_BUS_FAULT"]
     vals = [False]*9
-    tagClient.writeTags(tags,vals)
+    tagClient.writeTags(tags,vals,"SG")
     
 def shortfaultscen():
     timed_fault("BRANCH_2_BUS_1_FAULT",0.5)
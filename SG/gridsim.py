@@ -0,0 +1,377 @@
+'''in memory stand-in for the tag server and the DC microgrid behind it. speaks the
+same text protocol as the real tag server
+
+    read <plc> a b c        ->  a:1.0,b:true,c:12.0
+    write <plc> a:1 b:true  ->  ok
+
+plus one request the real tag server doesn't have
+
+    watch <plc> <wait> <deadband> a b c  ->  a:1.0,b:true,c:12.0
+
+which answers like read, but not before one of the tags has moved by more than
+deadband, or a boolean has flipped, since the last watch on the same connection, or
+wait seconds have passed. the first watch on a connection is answered right away.
+connections are kept open between requests, so it can be used to load test the
+agents on one machine without a PLC. relay, droop and fault tags that are written
+change the simulated bus voltages, branch currents and source currents that are
+read back
+
+usage: python -m DCMGClasses.SG.gridsim [port]'''
+import sys
+import time
+import threading
+import SocketServer
+
+#infrastructure nodes, numbered like UtilityAgent.infnodes
+NODES = ["DC.MAIN.MAIN",
+         "DC.BRANCH1.BUS1",
+         "DC.BRANCH1.BUS2",
+         "DC.BRANCH2.BUS1",
+         "DC.BRANCH2.BUS2",
+         "DC.BRANCH1.INT1",
+         "DC.BRANCH1.INT2",
+         "DC.BRANCH2.INT1",
+         "DC.BRANCH2.INT2"]
+
+#start node, end node, current tag, relay tag. same layout as UtilityAgent.Edges
+EDGES = [(0, 1, "BRANCH_1_BUS_1_Current", "BRANCH_1_BUS_1_PROXIMAL_User"),
+         (0, 3, "BRANCH_2_BUS_1_Current", "BRANCH_2_BUS_1_PROXIMAL_User"),
+         (1, 5, None, "BRANCH_1_BUS_1_DISTAL_User"),
+         (5, 2, "BRANCH_1_BUS_2_Current", "BRANCH_1_BUS_2_PROXIMAL_User"),
+         (5, 7, "CROSSTIE_1_Current", "CROSSTIE_1_User"),
+         (2, 6, None, "BRANCH_1_BUS_2_DISTAL_User"),
+         (6, 8, "CROSSTIE_2_Current", "CROSSTIE_2_User"),
+         (3, 7, None, "BRANCH_2_BUS_1_DISTAL_User"),
+         (7, 4, "BRANCH_2_BUS_2_Current", "BRANCH_2_BUS_2_PROXIMAL_User"),
+         (4, 8, None, "BRANCH_2_BUS_2_DISTAL_User")]
+
+#fault tags on the SG PLC and the node each one shorts to ground
+FAULTS = {"MAIN_BUS_FAULT": 0,
+          "BRANCH_1_BUS_1_FAULT": 1,
+          "BRANCH_1_BUS_2_FAULT": 2,
+          "BRANCH_2_BUS_1_FAULT": 3,
+          "BRANCH_2_BUS_2_FAULT": 4,
+          "CROSSTIE_1_FAULT_1": 5,
+          "CROSSTIE_1_FAULT_2": 7,
+          "CROSSTIE_2_FAULT_1": 6,
+          "CROSSTIE_2_FAULT_2": 8}
+
+#which node each source channel feeds
+SOURCE_NODES = {1: 0, 2: 1, 3: 2, 4: 3, 5: 4}
+LOADS_PER_BUS = 5
+
+NOMINAL_VOLTAGE = 12.0
+#voltage on the unregulated side of every source converter
+UNREG_VOLTAGE = 24.0
+CONVERTER_EFFICIENCY = .95
+#conductance in siemens of a connected load and of a ground fault
+LOAD_CONDUCTANCE = .01
+FAULT_CONDUCTANCE = 2.0
+
+'''the electrical state of the grid. sources are droop controlled, so a source
+connected to a group of nodes at voltage V puts out power droopCoeff*(noLoadVoltage - V)
+and never sinks current. loads and faults are fixed conductances. nodes joined by
+closed relays are treated as one bus, and the branch currents are found by pushing
+each node's net injection up a spanning tree of the closed edges'''
+class GridModel(object):
+    def __init__(self,sourcenodes = SOURCE_NODES):
+        self.sourcenodes = sourcenodes
+        self.tags = {"user": {}, "SG": {}}
+        self.measured = {}
+        self.dirty = True
+        self.lock = threading.Lock()
+        #notified whenever tags are written, which is the only way anything changes
+        self.written = threading.Condition(self.lock)
+
+        self.loads = []
+        for index, name in enumerate(NODES):
+            grid, branch, bus = name.split(".")
+            if bus.startswith("BUS"):
+                for load in range(1,LOADS_PER_BUS + 1):
+                    prefix = "BRANCH_{b}_BUS_{n}_LOAD_{l}".format(b = branch[-1], n = bus[-1], l = load)
+                    self.loads.append((index, prefix + "_User", prefix + "_Current"))
+
+        #infrastructure relays are wired normally closed, so False means closed
+        for edge in EDGES:
+            self.tags["user"][edge[3]] = False
+        for tag in FAULTS:
+            self.tags["SG"][tag] = False
+        #channel 1 starts out connected so the grid isn't dead until a source is dispatched
+        self.tags["user"]["SOURCE_1_User"] = True
+        self.tags["user"]["SOURCE_1_noLoadVoltage"] = 12.2
+        self.tags["user"]["SOURCE_1_droopCoeff"] = 50.0
+
+    def voltageTag(self,index):
+        grid, branch, bus = NODES[index].split(".")
+        if branch == "MAIN":
+            return "MAIN_BUS_Voltage"
+        if bus.startswith("BUS"):
+            return "BRANCH_{b}_BUS_{n}_Voltage".format(b = branch[-1], n = bus[-1])
+        return None
+
+    def write(self,plc,values):
+        with self.lock:
+            self.tags.setdefault(plc,{}).update(values)
+            self.dirty = True
+            self.written.notify_all()
+
+    def read(self,plc,names):
+        with self.lock:
+            return self.values(plc,names)
+
+    '''waits until one of the tags has moved past deadband from the value in reported, or
+    wait seconds have passed, then reads them. reported is updated with what was read'''
+    def watch(self,plc,names,reported,wait,deadband):
+        deadline = time.time() + wait
+        with self.lock:
+            while True:
+                out = self.values(plc,names)
+                if not reported or [pair for pair in out if moved(pair[1],reported.get(pair[0]),deadband)]:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.written.wait(remaining)
+        reported.update(out)
+        return out
+
+    '''current values of the tags. the lock must be held'''
+    def values(self,plc,names):
+        if self.dirty:
+            self.solve()
+        stored = self.tags.get(plc,{})
+        out = []
+        for name in names:
+            if plc == "user" and name in self.measured:
+                out.append((name,self.measured[name]))
+            else:
+                out.append((name,stored.get(name,0.0)))
+        return out
+
+    def flag(self,plc,name):
+        value = self.tags[plc].get(name,False)
+        if type(value) is bool:
+            return value
+        return str(value).lower().find("true") >= 0
+
+    def number(self,name,default = 0.0):
+        try:
+            return float(self.tags["user"].get(name,default))
+        except ValueError:
+            return default
+
+    '''groups nodes that are joined by closed infrastructure relays'''
+    def findGroups(self):
+        parent = range(len(NODES))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        closed = []
+        for edge in EDGES:
+            if not self.flag("user",edge[3]):
+                closed.append(edge)
+                parent[find(edge[0])] = find(edge[1])
+        groups = {}
+        for i in range(len(NODES)):
+            groups.setdefault(find(i),[]).append(i)
+        return groups.values(), closed
+
+    def solve(self):
+        measured = {}
+        nodevoltage = [0.0]*len(NODES)
+        injection = [0.0]*len(NODES)
+
+        #conductance to ground at each node from loads and faults
+        conductance = [0.0]*len(NODES)
+        for node, relaytag, currenttag in self.loads:
+            if self.flag("user",relaytag):
+                conductance[node] += LOAD_CONDUCTANCE
+        for tag in FAULTS:
+            if self.flag("SG",tag):
+                conductance[FAULTS[tag]] += FAULT_CONDUCTANCE
+
+        sources = []
+        for channel in self.sourcenodes:
+            if self.flag("user","SOURCE_{d}_User".format(d = channel)):
+                gain = self.number("SOURCE_{d}_droopCoeff".format(d = channel))/NOMINAL_VOLTAGE
+                vnl = self.number("SOURCE_{d}_noLoadVoltage".format(d = channel),NOMINAL_VOLTAGE)
+                sources.append((channel, self.sourcenodes[channel], gain, vnl))
+
+        groups, closed = self.findGroups()
+        sourcecurrent = {}
+        for group in groups:
+            active = [src for src in sources if src[1] in group and src[2] > 0]
+            load = sum([conductance[node] for node in group])
+            voltage = 0.0
+            #sources that would have to sink current drop out, so repeat until none do
+            while active:
+                voltage = sum([src[2]*src[3] for src in active])/(sum([src[2] for src in active]) + load)
+                stillactive = [src for src in active if src[3] > voltage]
+                if len(stillactive) == len(active):
+                    break
+                active = stillactive
+            if not active:
+                voltage = 0.0
+            for src in active:
+                current = src[2]*(src[3] - voltage)
+                sourcecurrent[src[0]] = current
+                injection[src[1]] += current
+            for node in group:
+                nodevoltage[node] = voltage
+                injection[node] -= conductance[node]*voltage
+
+        #branch currents from subtree injections on a spanning tree of each group
+        flows = self.treeFlows(groups,closed,injection)
+        for index, edge in enumerate(EDGES):
+            if edge[2] is not None:
+                measured[edge[2]] = flows.get(index,0.0)
+        for index in range(len(NODES)):
+            tag = self.voltageTag(index)
+            if tag is not None:
+                measured[tag] = nodevoltage[index]
+        for node, relaytag, currenttag in self.loads:
+            if self.flag("user",relaytag):
+                measured[currenttag] = LOAD_CONDUCTANCE*nodevoltage[node]
+            else:
+                measured[currenttag] = 0.0
+        for channel in self.sourcenodes:
+            current = sourcecurrent.get(channel,0.0)
+            regv = nodevoltage[self.sourcenodes[channel]] if current > 0 else 0.0
+            measured["SOURCE_{d}_RegCurrent".format(d = channel)] = current
+            measured["SOURCE_{d}_RegVoltage".format(d = channel)] = regv
+            measured["SOURCE_{d}_UnregVoltage".format(d = channel)] = UNREG_VOLTAGE
+            measured["SOURCE_{d}_UnregCurrent".format(d = channel)] = current*regv/(UNREG_VOLTAGE*CONVERTER_EFFICIENCY)
+
+        self.measured = measured
+        self.dirty = False
+
+    '''current through each closed edge, positive from start node to end node. edges
+    that close a loop are left out of the tree and carry nothing'''
+    def treeFlows(self,groups,closed,injection):
+        adjacent = {}
+        for index, edge in enumerate(EDGES):
+            if edge in closed:
+                adjacent.setdefault(edge[0],[]).append((edge[1],index))
+                adjacent.setdefault(edge[1],[]).append((edge[0],index))
+        flows = {}
+        for group in groups:
+            root = group[0]
+            order = [root]
+            parentedge = {root: None}
+            for node in order:
+                for other, index in adjacent.get(node,[]):
+                    if other not in parentedge:
+                        parentedge[other] = (node,index)
+                        order.append(other)
+            subtree = dict((node,injection[node]) for node in order)
+            for node in reversed(order):
+                if parentedge[node] is None:
+                    continue
+                up, index = parentedge[node]
+                #current leaving this subtree toward its parent
+                if EDGES[index][1] == node:
+                    flows[index] = -subtree[node]
+                else:
+                    flows[index] = subtree[node]
+                subtree[up] += subtree[node]
+        return flows
+
+
+'''whether a tag that was last reported as last has changed enough to report value'''
+def moved(value,last,deadband):
+    if last is None:
+        return True
+    if type(value) is bool or type(last) is bool:
+        return value != last
+    try:
+        return abs(float(value) - float(last)) > deadband
+    except ValueError:
+        return value != last
+
+def formatPairs(pairs):
+    out = []
+    for name, value in pairs:
+        if type(value) is bool:
+            value = str(value).lower()
+        out.append("{name}:{value}".format(name = name, value = value))
+    return ",".join(out)
+
+
+class TagRequestHandler(SocketServer.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        model = self.server.model
+        #what the last watch on this connection answered with
+        reported = {}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            self.server.countRequest()
+            words = line.split()
+            if len(words) < 2:
+                self.wfile.write("error\n")
+                continue
+            if words[0] == "read":
+                self.wfile.write(formatPairs(model.read(words[1],words[2:])) + "\n")
+            elif words[0] == "watch" and len(words) > 4:
+                try:
+                    wait = float(words[2])
+                    deadband = float(words[3])
+                except ValueError:
+                    self.wfile.write("error\n")
+                    continue
+                self.wfile.write(formatPairs(model.watch(words[1],words[4:],reported,wait,deadband)) + "\n")
+            elif words[0] == "write":
+                values = {}
+                for pair in words[2:]:
+                    name, value = pair.split(":")
+                    values[name] = value
+                model.write(words[1],values)
+                self.wfile.write("ok\n")
+            else:
+                self.wfile.write("error\n")
+
+
+class TagServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self,addr = ('localhost',12897),model = None):
+        SocketServer.TCPServer.__init__(self,addr,TagRequestHandler)
+        if model is None:
+            model = GridModel()
+        self.model = model
+        #requests of every kind answered so far
+        self.requests = 0
+        self.countlock = threading.Lock()
+
+    def countRequest(self):
+        with self.countlock:
+            self.requests += 1
+
+'''starts a simulated tag server in a background thread and returns it. port 0 picks
+any free port, which can then be found in server.server_address'''
+def startServer(port = 12897, model = None):
+    server = TagServer(('localhost',port),model)
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def main(argv = sys.argv):
+    port = int(argv[1]) if len(argv) > 1 else 12897
+    server = TagServer(('localhost',port))
+    print("simulated tag server listening on {host}:{port}".format(host = server.server_address[0], port = server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+'''times the utility's auction on synthetic bid books, without a VOLTTRON bus or a
+database. a book has homes and resources spread over a number of groups, demand bids
+from the homes, power bids from the resources (some of which can also provide
+reserves) and reserve bids, all with random rates and amounts. each stage of the path
+planShortTerm takes through a period's bids is timed separately
+
+    route    indexing the groups and adding every bid to its group's order book, which
+             the agent does in marketfeed as the bids come in
+    prepare  taking each group's bids out of its order book
+    clear    clearing every group's power auction and picking its reserves
+    settle   marking the bids accepted or rejected
+    notify   encoding one market_results message per counterparty
+
+usage: python -m DCMGClasses.benchmarks.marketbench [bids] [groups] [repeats]
+with no arguments a range of book sizes from 10 to 100000 bids is run'''
+import gc
+import sys
+import json
+import time
+import random
+import resource as rusage
+
+from DCMGClasses.resources import control, groups, market
+
+#book sizes run when none is given, as (bids, groups)
+DEFAULT_SIZES = [(10,1), (100,1), (1000,1), (1000,10), (10000,10), (10000,100), (100000,10)]
+#share of the bids that are demand, power supply and reserve bids
+DEMAND_SHARE = .6
+RESERVE_SHARE = .1
+#a group's worst case load, as a multiple of its demand
+MAX_LOAD_FACTOR = 1.5
+
+'''a home or a resource, as far as bid routing is concerned'''
+class Member(object):
+    def __init__(self,name):
+        self.name = name
+
+'''makes ngroups groups and nbids bids spread evenly over them. returns the groups
+and the demand, supply and reserve bid lists'''
+def makeBook(nbids,ngroups,seed = 0):
+    rng = random.Random(seed)
+    perGroup = max(1,nbids/ngroups)
+    grouplist = []
+    demand = []
+    supply = []
+    reserve = []
+    for g in range(ngroups):
+        homes = [Member("HOME{g}_{k}".format(g = g, k = k)) for k in range(max(1,int(perGroup*DEMAND_SHARE)))]
+        sources = [Member("RES{g}_{k}".format(g = g, k = k)) for k in range(max(1,int(perGroup*(1 - DEMAND_SHARE))))]
+        grouplist.append(groups.Group("GROUP{g}".format(g = g),sources,[],homes))
+
+    for i in range(nbids):
+        group = grouplist[i % ngroups]
+        roll = rng.random()
+        if roll < DEMAND_SHARE:
+            home = rng.choice(group.customers)
+            demand.append(control.DemandBid(**{"side": "demand", "amount": rng.uniform(.1,2), "rate": rng.uniform(.05,.5), "counterparty": home.name, "period_number": 1}))
+        else:
+            source = rng.choice(group.resources)
+            biddict = {"side": "supply", "resource_name": source.name, "amount": rng.uniform(.5,5), "rate": rng.uniform(.02,.4), "counterparty": "UTILITY", "period_number": 1}
+            if roll < DEMAND_SHARE + RESERVE_SHARE:
+                biddict["service"] = "reserve"
+                reserve.append(control.SupplyBid(**biddict))
+            else:
+                biddict["service"] = "power"
+                if rng.random() < .3:
+                    biddict["auxilliary_service"] = "reserve"
+                supply.append(control.SupplyBid(**biddict))
+    return grouplist, demand, supply, reserve
+
+'''runs the auction over one book and returns the seconds spent in each stage'''
+def runAuction(grouplist,demand,supply,reserve):
+    timings = {}
+
+    start = time.time()
+    index = market.GroupIndex(grouplist)
+    for bids, side in [(supply,"supply"), (demand,"demand"), (reserve,"reserve")]:
+        for bid in bids:
+            group = index.groupForBid(bid)
+            if group:
+                group.book(bid.periodNumber).add(bid,side)
+    timings["route"] = time.time() - start
+
+    start = time.time()
+    auctions = []
+    for group in grouplist:
+        book = group.closeBook(1)
+        group.supplyBidList = book.snapshot("supply")
+        group.demandBidList = book.snapshot("demand")
+        group.reserveBidList = book.snapshot("reserve")
+        maxload = MAX_LOAD_FACTOR*sum([bid.amount for bid in group.demandBidList])
+        auctions.append(market.AuctionInput(group.supplyBidList,group.demandBidList,group.reserveBidList,maxload))
+    timings["prepare"] = time.time() - start
+
+    start = time.time()
+    results = market.clearAuctions(auctions)
+    timings["clear"] = time.time() - start
+
+    start = time.time()
+    for group, (result, reserveaccepted) in zip(grouplist,results):
+        market.markAccepted(group.supplyBidList,result.supplyaccepted)
+        market.markAccepted(group.demandBidList,result.demandaccepted)
+        if result.price is not None:
+            group.rate = result.price
+        powerbids = []
+        for bid in group.supplyBidList:
+            if not bid.accepted and bid.auxilliaryService == "reserve":
+                bid.service = "reserve"
+                group.reserveBidList.append(bid)
+            else:
+                powerbids.append(bid)
+        group.supplyBidList = powerbids
+        market.markAccepted(group.reserveBidList,reserveaccepted)
+    timings["settle"] = time.time() - start
+
+    start = time.time()
+    outcomes = market.MarketResults(1)
+    for group in grouplist:
+        for bidlist in [group.supplyBidList, group.demandBidList, group.reserveBidList]:
+            for bid in bidlist:
+                outcomes.add(bid,group.rate,bid.accepted)
+        for cust in group.customers:
+            outcomes.setRate(cust.name,group.rate)
+    messages = [json.dumps(mesdict) for mesdict in outcomes.messages("UTILITY")]
+    timings["notify"] = time.time() - start
+    return timings
+
+def peakMemory():
+    #kilobytes on linux
+    return rusage.getrusage(rusage.RUSAGE_SELF).ru_maxrss
+
+def bench(nbids,ngroups,repeats = 3):
+    best = None
+    objects = 0
+    for repeat in range(repeats):
+        book = makeBook(nbids,ngroups,repeat)
+        gc.collect()
+        before = len(gc.get_objects())
+        start = time.time()
+        timings = runAuction(*book)
+        timings["total"] = time.time() - start
+        objects = len(gc.get_objects()) - before
+        if best is None or timings["total"] < best["total"]:
+            best = timings
+    return best, objects
+
+def main(argv = sys.argv):
+    if len(argv) > 1:
+        ngroups = int(argv[2]) if len(argv) > 2 else 1
+        sizes = [(int(argv[1]), ngroups)]
+    else:
+        sizes = DEFAULT_SIZES
+    repeats = int(argv[3]) if len(argv) > 3 else 3
+
+    stages = ["route", "prepare", "clear", "settle", "notify", "total"]
+    print("auction timings in ms, best of {r}".format(r = repeats))
+    print("{b:>8} {g:>7} ".format(b = "bids", g = "groups") + " ".join(["{s:>9}".format(s = stage) for stage in stages]) + " {obj:>9}".format(obj = "new objs"))
+    for nbids, ngroups in sizes:
+        timings, objects = bench(nbids,ngroups,repeats)
+        print("{b:>8} {g:>7} ".format(b = nbids, g = ngroups) + " ".join(["{t:>9.2f}".format(t = timings[stage]*1000) for stage in stages]) + " {obj:>9}".format(obj = objects))
+    print("peak resident memory {m} kB".format(m = peakMemory()))
+
+if __name__ == "__main__":
+    main()
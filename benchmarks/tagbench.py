@@ -0,0 +1,116 @@
+'''compares tag read throughput of pooled persistent connections against the old
+behavior of opening a socket for every request, and the traffic and reaction time of
+tag subscriptions that poll against ones the tag server watches. runs against the
+simulated tag server in SG.gridsim on a local port so no PLC or real tag server is
+needed
+
+usage: python -m DCMGClasses.benchmarks.tagbench [seconds] [tags per read] [poll interval]'''
+import sys
+import time
+import threading
+
+from DCMGClasses.CIP import tagClient, subscriptions, concurrency
+from DCMGClasses.SG import gridsim
+
+#load relays toggled to see how long subscribers take to hear about it
+TOGGLES = 4
+
+
+def readRate(names,duration):
+    count = 0
+    start = time.time()
+    end = start + duration
+    while time.time() < end:
+        tagClient.readTags(names)
+        count += 1
+    return count/(time.time() - start)
+
+'''imitates one utility cycle: several monitoring routines reading overlapping
+tag sets at the same time. returns the number of requests the tag server saw'''
+def cycleRoundTrips(namesets):
+    before = tagClient.getPool().requests
+    threads = []
+    for names in namesets:
+        thread = threading.Thread(target = tagClient.readTags, args = (names,))
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return tagClient.getPool().requests - before
+
+'''subscribes to every current on the grid as urgent and to every voltage, like the
+utility does, and returns the requests per second the tag server sees while nothing
+changes, and the mean seconds from a load being switched to the current subscriber
+hearing about it'''
+def subscriptionTraffic(server,interval,fastinterval,watch,duration):
+    model = server.model
+    currents = [load[2] for load in model.loads]
+    currents.extend([edge[2] for edge in gridsim.EDGES if edge[2] is not None])
+    voltages = [model.voltageTag(index) for index in range(len(gridsim.NODES)) if model.voltageTag(index)]
+    heard = threading.Event()
+    poller = subscriptions.TagPoller(interval,watch,fastinterval)
+    poller.subscribe(currents,lambda changed, values: heard.set(),.05,urgent = True)
+    poller.subscribe(voltages,lambda changed, values: None,.05)
+    poller.start()
+    #the first answer reports everything
+    heard.wait(interval + 1)
+
+    before = server.requests
+    start = time.time()
+    concurrency.sleep(duration)
+    quiet = (server.requests - before)/(time.time() - start)
+
+    delays = []
+    relay = model.loads[0][1]
+    for toggle in range(TOGGLES):
+        heard.clear()
+        switched = time.time()
+        model.write("user",{relay: toggle % 2 == 0})
+        heard.wait(2*interval + 1)
+        delays.append(time.time() - switched)
+    poller.stop()
+    #let a held request run out before the next measurement
+    concurrency.sleep(interval + .5)
+    return quiet, sum(delays)/len(delays)
+
+def main(argv = sys.argv):
+    duration = float(argv[1]) if len(argv) > 1 else 3.0
+    ntags = int(argv[2]) if len(argv) > 2 else 8
+    interval = float(argv[3]) if len(argv) > 3 else subscriptions.POLL_INTERVAL
+
+    server = gridsim.startServer(0)
+    names = [load[2] for load in server.model.loads]
+    names = (names*(ntags/len(names) + 1))[:ntags]
+
+    tagClient.configure(addr = server.server_address, pooling = False)
+    oneshot = readRate(names,duration)
+
+    tagClient.configure(addr = server.server_address, pooling = True)
+    pooled = readRate(names,duration)
+
+    print("tag reads of {n} tags over {t} s".format(n = ntags, t = duration))
+    print("    per-call sockets: {r:.0f} reads/s".format(r = oneshot))
+    print("    pooled:           {r:.0f} reads/s ({c} connects)".format(r = pooled, c = tagClient.getPool().connects))
+    print("    speedup:          {s:.1f}x".format(s = pooled/oneshot))
+
+    namesets = [names[i:] + names[:i] for i in range(len(names))]
+    plain = cycleRoundTrips(namesets)
+    tagClient.enableCoalescing(.005)
+    coalesced = cycleRoundTrips(namesets)
+    tagClient.enableCoalescing(None)
+    print("{n} concurrent overlapping reads".format(n = len(namesets)))
+    print("    uncoalesced:      {r} round trips".format(r = plain))
+    print("    coalesced:        {r} round trips".format(r = coalesced))
+
+    print("subscriptions to every current and voltage, over {t} s".format(t = max(duration,4*interval)))
+    fast = subscriptions.FAST_INTERVAL
+    for label, every, fastevery, watch in [("polled every .1 s", .1, .1, False), ("polled, currents {f:g} s".format(f = fast), interval, fast, False), ("watched, {i:g} s hold".format(i = interval), interval, fast, True)]:
+        quiet, delay = subscriptionTraffic(server,every,fastevery,watch,max(duration,4*interval))
+        print("    {l:<24} {q:7.2f} requests/s while quiet, {d:.3f} s to hear about a switched load".format(l = label + ":", q = quiet, d = delay))
+
+    tagClient.getPool().closeAll()
+    server.shutdown()
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+'''checks the exponential thermal models of the heating element and the refrigerator
+against the Euler integration they replaced, and times both. for every grid point,
+input and duration the next temperature is worked out three ways
+
+    fine     0.05 s Euler steps, close to the true solution of the model
+    euler    5 s Euler steps, as the devices used to do
+    exact    the device's applySimulatedInput
+
+and the largest differences of euler and exact from fine are reported. the run fails
+if exact is further from fine than euler, or further than the device's tolerance, or if
+the device's model gives different answers on arrays than one state at a time. the
+heating element's model is linear, so its exponential solution is exact. the
+refrigerator's efficiency depends on its temperature and is only held constant over
+each step of up to HEATPUMP_STEP seconds
+
+usage: python -m DCMGClasses.benchmarks.thermalbench [repeats]'''
+import sys
+import time
+
+import numpy
+
+from DCMGClasses.resources.demand import appliances
+
+DURATIONS = [5, 45, 300, 3600]
+EULER_STEP = 5
+FINE_STEP = .05
+
+HEATER = {"name": "HEATER1", "owner": "HOME1", "nominalpower": 1000, "specificheatcapacity": 4186, "mass": 50, "thermalresistance": .05, "inittemp": 30}
+REFRIGERATOR = {"name": "FRIDGE1", "owner": "HOME1", "nominalpower": 150, "volume": .5, "thermalresistance": .5, "relativeefficiency": .5, "inittemp": 4}
+#largest difference in degrees allowed between the device's model and the fine solution
+TOLERANCES = {"HEATER1": 1e-3, "FRIDGE1": 1.0}
+
+'''the heating element's old model, with temperatures in degrees'''
+def eulerHeater(dev,state,input,duration,defstep = EULER_STEP):
+    pin = dev.nominalpower
+    if input != 0:
+        input = 1
+    et = 0
+    while et < duration:
+        step = min(defstep,duration - et)
+        et += step
+        state = (((pin*input)-((state - dev.tamb)/dev.thermR))/(dev.mass*dev.shc))*step + state
+    return state
+
+'''the heat pump's old model, with temperatures in degrees'''
+def eulerHeatPump(dev,state,input,duration,defstep = EULER_STEP):
+    pin = dev.nominalpower
+    if input != 0:
+        input = 1
+    et = 0
+    while et < duration:
+        step = min(defstep,duration - et)
+        et += step
+        tc = state - 6 + 273
+        th = dev.tamb + 4 + 273
+        efficiency = dev.carnotrelativeefficiency/((float(th)/float(tc))-1.0)
+        peff = pin*efficiency
+        state = ((-peff*input-((state - dev.tamb)/dev.thermR))/(dev.heatcap))*step + state
+    return state
+
+'''largest differences in degrees of the 5 s Euler integration and of the device's
+model from the fine Euler integration, over the device's grid points and inputs'''
+def accuracy(dev,euler,duration):
+    worst = {"euler": 0, "exact": 0}
+    for state in dev.gridpoints:
+        for input in dev.actionpoints:
+            start = dev.statePUToEng(state)
+            fine = euler(dev,start,input,duration,FINE_STEP)
+            exact = dev.statePUToEng(dev.applySimulatedInput(state,input,duration))
+            worst["euler"] = max(worst["euler"],abs(euler(dev,start,input,duration) - fine))
+            worst["exact"] = max(worst["exact"],abs(exact - fine))
+    return worst
+
+'''raises an AssertionError if the device's model is less accurate than it should be, or
+if working on arrays changes its answers'''
+def check(dev,duration,worst):
+    assert worst["exact"] <= worst["euler"], "{d} at {dur} s is {x} degrees off, the Euler model {e}".format(d = dev.name, dur = duration, x = worst["exact"], e = worst["euler"])
+    assert worst["exact"] <= TOLERANCES[dev.name], "{d} at {dur} s is {x} degrees off".format(d = dev.name, dur = duration, x = worst["exact"])
+    
+    stateinputs = numpy.array([(state,input) for state in dev.gridpoints for input in dev.actionpoints])
+    arrays = dev.applySimulatedInput(stateinputs[:,0],stateinputs[:,1],duration)
+    single = numpy.array([dev.applySimulatedInput(state,input,duration) for state, input in stateinputs])
+    assert numpy.allclose(arrays,single,rtol = 0,atol = 1e-12), "{d} at {dur} s differs on arrays".format(d = dev.name, dur = duration)
+
+'''microseconds per transition for the Euler model, the exact model one state at a
+time and the exact model on arrays of every grid point and input'''
+def timing(dev,euler,duration,repeats):
+    states = [(state,input) for state in dev.gridpoints for input in dev.actionpoints]
+    stateinputs = numpy.array(states)
+
+    start = time.time()
+    for r in range(repeats):
+        for state, input in states:
+            dev.stateEngToPU(euler(dev,dev.statePUToEng(state),input,duration))
+    eulertime = (time.time() - start)/(repeats*len(states))
+
+    start = time.time()
+    for r in range(repeats):
+        for state, input in states:
+            dev.applySimulatedInput(state,input,duration)
+    exacttime = (time.time() - start)/(repeats*len(states))
+
+    start = time.time()
+    for r in range(repeats):
+        dev.applySimulatedInput(stateinputs[:,0],stateinputs[:,1],duration)
+    arraytime = (time.time() - start)/(repeats*len(states))
+    return eulertime*1e6, exacttime*1e6, arraytime*1e6
+
+def main(argv = sys.argv):
+    repeats = int(argv[1]) if len(argv) > 1 else 200
+    devices = [(appliances.HeatingElement(**HEATER),eulerHeater), (appliances.Refrigerator(**REFRIGERATOR),eulerHeatPump)]
+
+    print("largest difference from the fine solution in degrees, and us per transition")
+    print("{d:>8} {dur:>6} {e:>10} {x:>10} {te:>9} {tx:>9} {ta:>9}".format(d = "device", dur = "secs", e = "euler", x = "exact", te = "euler", tx = "exact", ta = "arrays"))
+    for dev, euler in devices:
+        for duration in DURATIONS:
+            worst = accuracy(dev,euler,duration)
+            check(dev,duration,worst)
+            eulertime, exacttime, arraytime = timing(dev,euler,duration,repeats)
+            print("{d:>8} {dur:>6} {e:>10.2e} {x:>10.2e} {te:>9.2f} {tx:>9.2f} {ta:>9.2f}".format(d = dev.name, dur = duration, e = worst["euler"], x = worst["exact"], te = eulertime, tx = exacttime, ta = arraytime))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+'''columnar archive for the long telemetry tables. in the relational store every
+reading is a row that repeats the signal name, which makes weeks of 5 second samples
+slow to query and big to keep. the compactor moves rows older than a cutoff out of
+those tables into one pair of NumPy arrays per signal per day
+
+    <directory>/signals.json              signal name -> integer id
+    <directory>/20261018/<id>.time.npy    UTC epoch seconds, ascending
+    <directory>/20261018/<id>.value.npy   matching values
+
+and the archive reads them back memory mapped, so a time slice of a signal only
+touches the days it spans'''
+import os
+import json
+import calendar
+import threading
+from datetime import datetime, timedelta
+
+import numpy
+
+#tables that get archived, the column naming each row's signal and the value columns.
+#a signal is named <table>.<column>:<name>, e.g. resstate.outputV:Phaeton
+ARCHIVED = [("infmeas", "signame", ["value"]),
+            ("consumption", "name", ["power"]),
+            ("appstate", "name", ["state", "power"]),
+            ("resstate", "name", ["connected", "reference_voltage", "setpoint", "inputV", "inputI", "outputV", "outputI"])]
+
+#seconds between compactions and how old a row has to be before it is archived
+COMPACT_INTERVAL = 3600
+ARCHIVE_AGE = 3600
+
+def signalName(table,column,name):
+    return "{table}.{col}:{name}".format(table = table, col = column, name = name)
+
+'''UTC epoch seconds from a logged timestamp, which comes back from MySQL as a
+datetime and from SQLite as text'''
+def toEpoch(value):
+    if isinstance(value,datetime):
+        dt = value
+    else:
+        text = str(value).replace("T"," ")
+        if "." in text:
+            dt = datetime.strptime(text,"%Y-%m-%d %H:%M:%S.%f")
+        else:
+            dt = datetime.strptime(text,"%Y-%m-%d %H:%M:%S")
+    return calendar.timegm(dt.timetuple()) + dt.microsecond/1e6
+
+def dayOf(epoch):
+    return datetime.utcfromtimestamp(epoch).strftime("%Y%m%d")
+
+class Archive(object):
+    def __init__(self,directory):
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.lock = threading.Lock()
+        self.signals = {}
+        path = os.path.join(self.directory,"signals.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                self.signals = json.load(f)
+
+    def saveSignals(self):
+        path = os.path.join(self.directory,"signals.json")
+        with open(path + ".tmp","w") as f:
+            json.dump(self.signals,f,indent = 1,sort_keys = True)
+        os.rename(path + ".tmp",path)
+
+    '''integer id of a signal, giving it one if it is new'''
+    def signalId(self,signal,create = True):
+        sid = self.signals.get(signal)
+        if sid is None and create:
+            sid = len(self.signals)
+            self.signals[signal] = sid
+            self.saveSignals()
+        return sid
+
+    def paths(self,day,sid):
+        base = os.path.join(self.directory,day,str(sid))
+        return base + ".time.npy", base + ".value.npy"
+
+    '''adds samples of one signal on one day. samples at or before the last one
+    already archived for that day are taken to be archived already, so a compaction
+    that is repeated after failing part way doesn't duplicate anything'''
+    def append(self,signal,day,times,values):
+        times = numpy.asarray(times,dtype = numpy.float64)
+        values = numpy.asarray(values,dtype = numpy.float64)
+        with self.lock:
+            sid = self.signalId(signal)
+            tpath, vpath = self.paths(day,sid)
+            if os.path.exists(tpath):
+                oldtimes = numpy.load(tpath)
+                oldvalues = numpy.load(vpath)
+                if len(oldtimes):
+                    keep = times > oldtimes[-1]
+                    times = times[keep]
+                    values = values[keep]
+                times = numpy.concatenate((oldtimes,times))
+                values = numpy.concatenate((oldvalues,values))
+            elif not os.path.isdir(os.path.dirname(tpath)):
+                os.makedirs(os.path.dirname(tpath))
+            order = numpy.argsort(times,kind = "mergesort")
+            self.save(tpath,times[order])
+            self.save(vpath,values[order])
+
+    def save(self,path,array):
+        with open(path + ".tmp","wb") as f:
+            numpy.save(f,array)
+        os.rename(path + ".tmp",path)
+
+    '''times and values of a signal from start up to but not including end, both UTC
+    epoch seconds. returns two empty arrays for an unknown signal'''
+    def query(self,signal,start,end):
+        sid = self.signalId(signal,False)
+        if sid is None or end <= start:
+            return numpy.zeros(0), numpy.zeros(0)
+        tparts = []
+        vparts = []
+        day = datetime.utcfromtimestamp(start).date()
+        last = datetime.utcfromtimestamp(end).date()
+        while day <= last:
+            tpath, vpath = self.paths(day.strftime("%Y%m%d"),sid)
+            if os.path.exists(tpath):
+                times = numpy.load(tpath,mmap_mode = "r")
+                lo = numpy.searchsorted(times,start,"left")
+                hi = numpy.searchsorted(times,end,"left")
+                if hi > lo:
+                    tparts.append(numpy.array(times[lo:hi]))
+                    vparts.append(numpy.array(numpy.load(vpath,mmap_mode = "r")[lo:hi]))
+            day += timedelta(days = 1)
+        if not tparts:
+            return numpy.zeros(0), numpy.zeros(0)
+        return numpy.concatenate(tparts), numpy.concatenate(vparts)
+
+    def signalNames(self):
+        return sorted(self.signals.keys())
+
+
+'''moves old rows of the ARCHIVED tables from a backend into an archive, in a thread
+of its own so the agent never waits on it. only rows logged by runs of the named
+agent are moved, so agents sharing one database each archive their own'''
+class Compactor(object):
+    def __init__(self,backend,archive,agentname,interval = COMPACT_INTERVAL,age = ARCHIVE_AGE):
+        self.backend = backend
+        self.archive = archive
+        self.agentname = agentname
+        self.interval = interval
+        self.age = age
+        self.running = False
+        self.wake = threading.Event()
+
+        self.compactions = 0
+        self.archived = 0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            thread = threading.Thread(target = self.run)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    def run(self):
+        while self.running:
+            try:
+                self.compact()
+            except Exception as e:
+                print("archive compaction failed")
+                print(e)
+            self.wake.wait(self.interval)
+
+    '''archives every row logged more than age seconds ago and removes it from the
+    relational store. returns the number of rows moved'''
+    def compact(self,cutoff = None):
+        if cutoff is None:
+            cutoff = datetime.utcnow() - timedelta(seconds = self.age)
+        mine = 'logtime < %s AND run IN (SELECT id FROM runs WHERE agent = %s)'
+        params = (cutoff, self.agentname)
+        moved = 0
+        dbconn = self.backend.connect()
+        try:
+            cursor = dbconn.cursor()
+            for table, namecol, valuecols in ARCHIVED:
+                try:
+                    cursor.execute(self.backend.convert('SELECT logtime, {name}, {vals} FROM {table} WHERE {mine} ORDER BY logtime'.format(name = namecol, vals = ", ".join(valuecols), table = table, mine = mine)),params)
+                except Exception:
+                    #this agent doesn't log to that table
+                    dbconn.rollback()
+                    continue
+                samples = {}
+                rows = 0
+                while True:
+                    chunk = cursor.fetchmany(10000)
+                    if not chunk:
+                        break
+                    for row in chunk:
+                        t = toEpoch(row[0])
+                        day = dayOf(t)
+                        for index, column in enumerate(valuecols):
+                            value = row[index + 2]
+                            if value is None:
+                                continue
+                            key = (signalName(table,column,row[1]), day)
+                            entry = samples.get(key)
+                            if entry is None:
+                                entry = ([],[])
+                                samples[key] = entry
+                            entry[0].append(t)
+                            entry[1].append(float(value))
+                    rows += len(chunk)
+                for (signal, day), (times, values) in samples.items():
+                    self.archive.append(signal,day,times,values)
+                if rows:
+                    cursor.execute(self.backend.convert('DELETE FROM {table} WHERE {mine}'.format(table = table, mine = mine)),params)
+                    dbconn.commit()
+                moved += rows
+            cursor.close()
+        finally:
+            dbconn.close()
+        self.compactions += 1
+        self.archived += moved
+        return moved
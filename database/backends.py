@@ -0,0 +1,157 @@
+'''where agent telemetry is stored. an agent picks its backend with the "database"
+entry of its configuration file, e.g.
+
+    "database": {"backend": "sqlite", "directory": "~/dcmg_data"}
+
+and without one logs to the shared MySQL server like it always has. the SQLite
+backend keeps one file per agent, so many agents can be run and benchmarked on one
+machine without a database server'''
+import os
+import sys
+import fcntl
+import sqlite3
+
+MYSQL_DEFAULTS = {"user": "smartgrid",
+                  "password": "ugrid123",
+                  "host": "localhost",
+                  "database": "testdbase"}
+
+SQLITE_DIRECTORY = "~/dcmg_data"
+#seconds to wait for another agent to finish with a database lock
+LOCK_TIMEOUT = 60
+
+class Backend(object):
+    #placeholder the backend's driver expects for parameters
+    marker = "%s"
+
+    def connect(self):
+        raise NotImplementedError
+
+    '''rewrites a statement written with %s placeholders for this backend'''
+    def convert(self,command):
+        if self.marker == "%s":
+            return command
+        return command.replace("%s",self.marker)
+
+    '''how to name a column in an index. MySQL can only index the first few
+    characters of a TEXT column'''
+    def indexColumn(self,column,length = None):
+        return column
+
+    '''waits for and takes a lock shared by every agent using this database, e.g. so
+    only one of them migrates the schema at a time. returns what unlock needs'''
+    def lock(self,dbconn,name):
+        raise NotImplementedError
+
+    def unlock(self,dbconn,token):
+        raise NotImplementedError
+
+    '''names of a table's columns'''
+    def columns(self,cursor,table):
+        raise NotImplementedError
+
+    '''names of a table's indexes'''
+    def indexes(self,cursor,table):
+        raise NotImplementedError
+
+class MySQLBackend(Backend):
+    def __init__(self,**kwargs):
+        self.params = dict(MYSQL_DEFAULTS)
+        self.params.update(kwargs)
+
+    def connect(self):
+        #add dist-packages to python path for mysql module
+        sys.path.append('/usr/lib/python2.7/dist-packages')
+        sys.path.append('/usr/local/lib/python2.7/dist-packages')
+        import mysql.connector
+        return mysql.connector.connect(**self.params)
+
+    def indexColumn(self,column,length = None):
+        if length is None:
+            return column
+        return "{col}({n})".format(col = column, n = length)
+
+    def lock(self,dbconn,name):
+        cursor = dbconn.cursor()
+        cursor.execute('SELECT GET_LOCK(%s,%s)',(name, LOCK_TIMEOUT))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None or row[0] != 1:
+            raise RuntimeError("couldn't get database lock {name}".format(name = name))
+        return name
+
+    def unlock(self,dbconn,token):
+        cursor = dbconn.cursor()
+        cursor.execute('SELECT RELEASE_LOCK(%s)',(token,))
+        cursor.fetchone()
+        cursor.close()
+
+    def columns(self,cursor,table):
+        cursor.execute('SHOW COLUMNS FROM {table}'.format(table = table))
+        return [row[0] for row in cursor.fetchall()]
+
+    def indexes(self,cursor,table):
+        cursor.execute('SHOW INDEX FROM {table}'.format(table = table))
+        return set([row[2] for row in cursor.fetchall()])
+
+    def describe(self):
+        return "mysql {user}@{host}/{db}".format(user = self.params["user"], host = self.params["host"], db = self.params["database"])
+
+'''an embedded database file in write ahead log mode. readers don't block the
+writer, and with synchronous=NORMAL a commit doesn't wait for the disk, so a batch
+of rows costs one transaction and no network round trip'''
+class SQLiteBackend(Backend):
+    marker = "?"
+
+    def __init__(self,path,timeout = 30):
+        self.path = os.path.expanduser(path)
+        self.timeout = timeout
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        dbconn = sqlite3.connect(self.path,timeout = self.timeout,check_same_thread = False)
+        dbconn.execute('PRAGMA journal_mode=WAL')
+        dbconn.execute('PRAGMA synchronous=NORMAL')
+        return dbconn
+
+    #the sqlite module commits on its own before DDL statements, which would let go of
+    #a lock taken with BEGIN IMMEDIATE, so a lock file next to the database is used
+    def lock(self,dbconn,name):
+        lockfile = open("{path}.{name}.lock".format(path = self.path, name = name),"a")
+        fcntl.flock(lockfile,fcntl.LOCK_EX)
+        return lockfile
+
+    def unlock(self,dbconn,token):
+        fcntl.flock(token,fcntl.LOCK_UN)
+        token.close()
+
+    def columns(self,cursor,table):
+        cursor.execute('PRAGMA table_info({table})'.format(table = table))
+        return [row[1] for row in cursor.fetchall()]
+
+    def indexes(self,cursor,table):
+        cursor.execute('PRAGMA index_list({table})'.format(table = table))
+        return set([row[1] for row in cursor.fetchall()])
+
+    def describe(self):
+        return "sqlite {path}".format(path = self.path)
+
+'''makes the backend described by an agent's "database" configuration entry. a
+SQLite backend without an explicit path gets a file named after the agent'''
+def makeBackend(config,agentname):
+    if config is None:
+        config = {}
+    config = dict(config)
+    kind = config.pop("backend","mysql").lower()
+    if kind == "mysql":
+        return MySQLBackend(**config)
+    elif kind == "sqlite":
+        path = config.get("path")
+        if path is None:
+            directory = config.get("directory",SQLITE_DIRECTORY)
+            path = os.path.join(directory,"{name}.db".format(name = agentname))
+        return SQLiteBackend(path,config.get("timeout",30))
+    else:
+        raise ValueError("unknown database backend {kind}".format(kind = kind))
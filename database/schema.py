@@ -0,0 +1,121 @@
+'''versioned schema for the telemetry tables. the agents used to drop and recreate
+every table when the utility started, losing all history. now each change to the
+schema is a numbered migration, the schema_version table records which ones a
+database has had, and startup only applies the ones it is missing. every agent
+start is also recorded as a run, and the run id is logged with each row so rows
+from different runs can be told apart'''
+import time
+from datetime import datetime
+
+#every table the agents log to and its columns, in the order they are created
+TABLES = [
+    ("infmeas", 'logtime TIMESTAMP, et DOUBLE, period INT, signame TEXT, value DOUBLE'),
+    ("faults", 'logtime TIMESTAMP, et DOUBLE, period INT, id BIGINT UNSIGNED, event TEXT, state TEXT, zone TEXT, current_sum DOUBLE, recloses INT, isolated_nodes TEXT, faulted_nodes TEXT'),
+    ("customers", 'logtime TIMESTAMP, et DOUBLE, customer_name TEXT, customer_location TEXT'),
+    ("bids", 'logtime TIMESTAMP, et DOUBLE, period INT, id BIGINT UNSIGNED, side TEXT, service TEXT, aux_service TEXT, resource_name TEXT, counterparty_name TEXT, accepted BOOLEAN, acc_for TEXT, orig_rate DOUBLE, settle_rate DOUBLE, orig_amount DOUBLE, settle_amount DOUBLE'),
+    ("prices", 'logtime TIMESTAMP, et DOUBLE, period INT, node TEXT, rate REAL'),
+    ("drevents", 'logtime TIMESTAMP, et DOUBLE, period INT, type TEXT'),
+    ("transactions", 'logtime TIMESTAMP, et DOUBLE, period INT, account_holder TEXT, transaction_type TEXT, amount DOUBLE, balance DOUBLE'),
+    ("resources", 'logtime TIMESTAMP, et DOUBLE, name TEXT, type TEXT, owner TEXT, location TEXT, max_power DOUBLE'),
+    ("appliances", 'logtime TIMESTAMP, et DOUBLE, name TEXT, type TEXT, owner TEXT, max_power DOUBLE'),
+    ("appstate", 'logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, state DOUBLE, power DOUBLE'),
+    ("resstate", 'logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, state DOUBLE, connected BOOLEAN, reference_voltage DOUBLE, setpoint DOUBLE, inputV DOUBLE, inputI DOUBLE, outputV DOUBLE, outputI DOUBLE'),
+    ("plans", 'logtime TIMESTAMP, et DOUBLE, period INT, planning_time DOUBLE, planner TEXT, cost DOUBLE, action TEXT'),
+    ("efficiency", 'logtime TIMESTAMP, et DOUBLE, period INT, generation DOUBLE, consumption DOUBLE, loss DOUBLE, unaccounted DOUBLE'),
+    ("relayfaults", 'logtime TIMESTAMP, et DOUBLE, period INT, location TEXT, measured TEXT, resistance DOUBLE'),
+    ("topology", 'logtime TIMESTAMP, et DOUBLE, period INT, topology TEXT'),
+    ("consumption", 'logtime TIMESTAMP, et DOUBLE, period INT, name TEXT, power DOUBLE'),
+    ("periods", 'number INT, start TIMESTAMP'),
+]
+
+#columns added to every table and indexes added by later migrations
+RUN_COLUMN = "run"
+INDEXES = [("bids_period_id", "bids", [("period",None), ("id",None)]),
+           ("infmeas_signame_logtime", "infmeas", [("signame",64), ("logtime",None)])]
+
+ROLLUP_TABLE = ("infrollup", 'logtime TIMESTAMP, et DOUBLE, period INT, signame TEXT, window_length DOUBLE, window_start TIMESTAMP, min_value DOUBLE, max_value DOUBLE, mean_value DOUBLE, last_value DOUBLE, samples INT, run BIGINT')
+
+#name of the database lock held while migrating
+MIGRATION_LOCK = "dcmg_schema_migration"
+
+#every migration checks for what it adds before adding it. MySQL can't roll back DDL,
+#so a migration that failed partway through has to be able to run again
+
+def createBaseTables(backend,cursor):
+    for name, columns in TABLES:
+        cursor.execute('CREATE TABLE IF NOT EXISTS {name} ({cols})'.format(name = name, cols = columns))
+
+def addRunColumns(backend,cursor):
+    cursor.execute('CREATE TABLE IF NOT EXISTS runs (id BIGINT, agent TEXT, started TIMESTAMP)')
+    for name, columns in TABLES:
+        if RUN_COLUMN not in backend.columns(cursor,name):
+            cursor.execute('ALTER TABLE {name} ADD COLUMN {col} BIGINT'.format(name = name, col = RUN_COLUMN))
+
+def createIndex(backend,cursor,index,table,columns):
+    if index not in backend.indexes(cursor,table):
+        cols = ", ".join([backend.indexColumn(col,length) for col, length in columns])
+        cursor.execute('CREATE INDEX {index} ON {table} ({cols})'.format(index = index, table = table, cols = cols))
+
+def addIndexes(backend,cursor):
+    for index, table, columns in INDEXES:
+        createIndex(backend,cursor,index,table,columns)
+
+def addRollupTable(backend,cursor):
+    name, columns = ROLLUP_TABLE
+    cursor.execute('CREATE TABLE IF NOT EXISTS {name} ({cols})'.format(name = name, cols = columns))
+    createIndex(backend,cursor,"infrollup_signame_start",name,[("signame",64), ("window_start",None)])
+
+#version, description and a function that makes the change.
+#never change what a released migration does, add a new one instead
+MIGRATIONS = [(1, "base telemetry tables", createBaseTables),
+              (2, "run id on every row", addRunColumns),
+              (3, "indexes for bid settlement and signal history", addIndexes),
+              (4, "rollups of infrastructure measurements", addRollupTable)]
+
+def currentVersion(cursor):
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return 0
+    return int(row[0])
+
+'''brings the backend's schema up to date and returns its version. does nothing but
+read the version when there is nothing to do. agents sharing a database all migrate
+when they start, so the migrations are done holding a database lock and the version
+is only read once the lock is held'''
+def migrate(backend):
+    dbconn = backend.connect()
+    token = None
+    try:
+        token = backend.lock(dbconn,MIGRATION_LOCK)
+        cursor = dbconn.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INT, applied TIMESTAMP, description TEXT)')
+        dbconn.commit()
+        version = currentVersion(cursor)
+        for number, description, migration in MIGRATIONS:
+            if number <= version:
+                continue
+            print("applying schema migration {n}: {desc}".format(n = number, desc = description))
+            migration(backend,cursor)
+            cursor.execute(backend.convert('INSERT INTO schema_version VALUES (%s,%s,%s)'),(number, datetime.utcnow(), description))
+            dbconn.commit()
+            version = number
+        cursor.close()
+    finally:
+        if token is not None:
+            backend.unlock(dbconn,token)
+        dbconn.close()
+    return version
+
+'''records the start of a run of an agent and returns its id'''
+def startRun(backend,agentname):
+    run = int(time.time()*1000)
+    dbconn = backend.connect()
+    try:
+        cursor = dbconn.cursor()
+        cursor.execute(backend.convert('INSERT INTO runs VALUES (%s,%s,%s)'),(run, agentname, datetime.utcnow()))
+        dbconn.commit()
+        cursor.close()
+    finally:
+        dbconn.close()
+    return run
@@ -0,0 +1,41 @@
+'''every statement the agents log telemetry with, defined once. values are always
+passed as parameters, never formatted into the text, so the text of a statement
+never changes and the database only has to parse it once. every statement takes
+the id of the run that logs it as its last parameter'''
+
+def insert(table,columns):
+    columns = columns + ["run"]
+    marks = ",".join(["%s"]*len(columns))
+    return 'INSERT INTO {table} ({cols}) VALUES ({marks})'.format(table = table, cols = ", ".join(columns), marks = marks)
+
+def update(table,columns,keys):
+    keys = keys + ["run"]
+    sets = ",".join(["{col}=%s".format(col = col) for col in columns])
+    where = " AND ".join(["{key}=%s".format(key = key) for key in keys])
+    return 'UPDATE {table} SET {sets} WHERE {where}'.format(table = table, sets = sets, where = where)
+
+STATEMENTS = {
+    #utility
+    "infmeas": insert("infmeas",["logtime","et","period","signame","value"]),
+    "fault": insert("faults",["logtime","et","period","id","event","state","zone","current_sum","recloses","isolated_nodes","faulted_nodes"]),
+    "customer": insert("customers",["logtime","et","customer_name","customer_location"]),
+    "bid": insert("bids",["logtime","et","period","id","side","service","aux_service","resource_name","counterparty_name","orig_rate","orig_amount"]),
+    "bid_accepted": update("bids",["accepted","acc_for","settle_rate","settle_amount"],["id","period"]),
+    "bid_rejected": update("bids",["accepted"],["id","period"]),
+    "bid_amended": update("bids",["orig_rate","orig_amount"],["id","period"]),
+    "price": insert("prices",["logtime","et","period","node","rate"]),
+    "transaction": insert("transactions",["logtime","et","period","account_holder","transaction_type","amount","balance"]),
+    "efficiency": insert("efficiency",["logtime","et","period","generation","consumption","loss","unaccounted"]),
+    "relayfault": insert("relayfaults",["logtime","et","period","location","measured","resistance"]),
+    "rollup": insert("infrollup",["logtime","et","period","signame","window_length","window_start","min_value","max_value","mean_value","last_value","samples"]),
+    "topology": insert("topology",["logtime","et","period","topology"]),
+    "consumption": insert("consumption",["logtime","et","period","name","power"]),
+    "period": insert("periods",["number","start"]),
+    #both
+    "resource": insert("resources",["logtime","et","name","type","owner","location","max_power"]),
+    "resstate": insert("resstate",["logtime","et","period","name","connected","reference_voltage","setpoint","inputV","inputI","outputV","outputI"]),
+    #home
+    "appliance": insert("appliances",["logtime","et","name","type","owner","max_power"]),
+    "appstate": insert("appstate",["logtime","et","period","name","state","power"]),
+    "plan": insert("plans",["logtime","et","period","planning_time","planner","cost","action"]),
+}
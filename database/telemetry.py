@@ -0,0 +1,122 @@
+'''typed interface for the rows the agents log. each method fills in the log time,
+the elapsed time and usually the period, and queues one registered statement on a
+BatchWriter, so logging from the hot path costs a tuple and a queue put'''
+import time
+import json
+from datetime import datetime
+
+from DCMGClasses.database.statements import STATEMENTS
+
+class TelemetryLog(object):
+    '''period is called to find the number of the current period when a row that
+    has one is logged. run is the id schema.startRun gave this run of the agent'''
+    def __init__(self,writer,t0,period = None,run = None):
+        self.writer = writer
+        self.t0 = t0
+        self.period = period
+        self.run = run
+
+    def row(self,name,params):
+        self.writer.write(STATEMENTS[name],params + (self.run,))
+
+    def stamp(self):
+        return datetime.utcnow(), time.time() - self.t0
+
+    def currentPeriod(self):
+        if self.period is None:
+            return None
+        return self.period()
+
+    '''t is the epoch time the value was measured at, if it wasn't just now'''
+    def infmeas(self,signal,value,t = None):
+        logtime, et = self.stamp()
+        if t is not None:
+            logtime = datetime.utcfromtimestamp(t)
+            et = t - self.t0
+        self.row("infmeas",(logtime, et, self.currentPeriod(), signal, value))
+
+    '''a finished stats.RollupResult'''
+    def rollup(self,result):
+        logtime, et = self.stamp()
+        self.row("rollup",(logtime, et, self.currentPeriod(), result.signalname, result.window, datetime.utcfromtimestamp(result.start), result.min, result.max, result.mean, result.last, result.count))
+
+    def fault(self,fault,event,currentsum = None):
+        isostring = " "
+        for node in fault.isolatednodes:
+            if node:
+                isostring += "{nam}, ".format(nam = node.name)
+        fstring = " "
+        for node in fault.faultednodes:
+            if node:
+                fstring += "{nam}, ".format(nam = node.name)
+        logtime, et = self.stamp()
+        self.row("fault",(logtime, et, self.currentPeriod(), fault.uid, event, fault.state, fault.zone.name, currentsum or None, fault.reclosecounter, isostring, fstring))
+
+    def customer(self,cust):
+        logtime, et = self.stamp()
+        self.row("customer",(logtime, et, cust.name, cust.location))
+
+    def bid(self,bid):
+        logtime, et = self.stamp()
+        self.row("bid",(logtime, et, bid.periodNumber, bid.uid, bid.side, getattr(bid,"service",None), getattr(bid,"auxilliary_service",None), bid.resourceName, bid.counterparty, bid.rate, bid.amount))
+
+    '''records how a bid was settled'''
+    def bidupdate(self,bid):
+        if bid.accepted:
+            self.row("bid_accepted",(1, getattr(bid,"service",None), bid.rate, bid.amount, bid.uid, bid.periodNumber))
+        else:
+            self.row("bid_rejected",(0, bid.uid, bid.periodNumber))
+
+    '''records the rate and amount a bid was changed to before its auction'''
+    def bidamendment(self,bid):
+        self.row("bid_amended",(bid.rate, bid.amount, bid.uid, bid.periodNumber))
+
+    def price(self,location,rate):
+        logtime, et = self.stamp()
+        self.row("price",(logtime, et, self.currentPeriod(), location, rate))
+
+    def transaction(self,cust,amount,type):
+        logtime, et = self.stamp()
+        self.row("transaction",(logtime, et, self.currentPeriod(), cust.name, type, amount, cust.customerAccount.accountBalance))
+
+    def efficiency(self,generation,consumption,losses,unaccounted):
+        logtime, et = self.stamp()
+        self.row("efficiency",(logtime, et, self.currentPeriod(), generation, consumption, losses, unaccounted))
+
+    def relayfault(self,location,measurement,resistance):
+        logtime, et = self.stamp()
+        self.row("relayfault",(logtime, et, self.currentPeriod(), location, measurement, resistance))
+
+    def topology(self,topo):
+        logtime, et = self.stamp()
+        self.row("topology",(logtime, et, self.currentPeriod(), topo))
+
+    def consumption(self,cust,power):
+        logtime, et = self.stamp()
+        self.row("consumption",(logtime, et, self.currentPeriod(), cust.name, power))
+
+    def newperiod(self,number,start):
+        self.row("period",(number, start))
+
+    def resource(self,res):
+        logtime, et = self.stamp()
+        self.row("resource",(logtime, et, res.name, res.__class__.__name__, res.owner, res.location, res.maxDischargePower))
+
+    '''meas is a dictionary of tag values holding the resource's discharge channel
+    voltages and currents'''
+    def resstate(self,res,meas):
+        ch = res.DischargeChannel
+        logtime, et = self.stamp()
+        self.row("resstate",(logtime, et, self.currentPeriod(), res.name, int(res.connected), ch.refVoltage, ch.setpoint, meas[ch.unregVtag], meas[ch.unregItag], meas[ch.regVtag], meas[ch.regItag]))
+
+    def appliance(self,app):
+        logtime, et = self.stamp()
+        self.row("appliance",(logtime, et, app.name, app.__class__.__name__, app.owner, app.nominalpower))
+
+    def appstate(self,app,power):
+        logtime, et = self.stamp()
+        self.row("appstate",(logtime, et, self.currentPeriod(), app.name, app.getStateEng(), power))
+
+    def plan(self,action,plantime,period,planner):
+        logtime, et = self.stamp()
+        self.row("plan",(logtime, et, period, plantime, planner, action.pathcost, json.dumps(action.components)))
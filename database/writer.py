@@ -0,0 +1,214 @@
+'''writes agent telemetry to the database from a background thread. the agents used
+to execute and commit one statement per row on the thread that handles market and
+fault events, so every logged sample waited on a database round trip. now rows are
+put on a bounded queue and written a batch at a time: rows that share a statement
+go out in one executemany and each batch is committed once'''
+import time
+import threading
+import Queue
+
+#rows written per batch
+BATCH_SIZE = 200
+#seconds a row may wait on the queue before its batch is written anyway
+FLUSH_INTERVAL = 1.0
+#rows that may be waiting before new ones are dropped
+QUEUE_SIZE = 10000
+
+'''a batch of rows to write. inserts go first so that an update in the same batch
+finds the row it is updating, and otherwise statements keep the order in which they
+were first seen'''
+def groupRows(rows):
+    inserts = []
+    others = []
+    groups = {}
+    for command, params in rows:
+        if command not in groups:
+            groups[command] = []
+            if command.lstrip().upper().startswith("INSERT"):
+                inserts.append(command)
+            else:
+                others.append(command)
+        groups[command].append(params)
+    return [(command, groups[command]) for command in inserts + others]
+
+class BatchWriter(object):
+    '''backend is one of the backends in database.backends. the writer opens its own
+    connection to it and is the only user of that connection'''
+    def __init__(self,backend,batchsize = BATCH_SIZE,interval = FLUSH_INTERVAL,queuesize = QUEUE_SIZE):
+        self.backend = backend
+        self.dbconn = None
+        self.converted = {}
+        self.batchsize = batchsize
+        self.interval = interval
+        self.queue = Queue.Queue(queuesize)
+        self.cursors = {}
+        self.running = False
+        self.thread = None
+
+        self.rows = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target = self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    '''queues one parameterized statement. never blocks: if the writer has fallen so
+    far behind that the queue is full the row is dropped and counted'''
+    def write(self,command,params = ()):
+        try:
+            self.queue.put_nowait((command,tuple(params)))
+        except Queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print("dbase writer queue full, {n} rows dropped".format(n = self.dropped))
+
+    '''waits until everything queued so far has been written'''
+    def flush(self,timeout = None):
+        done = threading.Event()
+        try:
+            self.queue.put((None,done),timeout = timeout)
+        except Queue.Full:
+            return False
+        if not self.running:
+            #no writer thread, so write the rows ahead of the marker here, a batch at a time
+            while not done.is_set() and not self.queue.empty():
+                self.drain()
+        done.wait(timeout)
+        return done.is_set()
+
+    '''writes whatever is still queued and stops the writer thread'''
+    def close(self,timeout = 10):
+        self.flush(timeout)
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.disconnect()
+
+    def run(self):
+        while self.running:
+            self.drain(self.interval)
+
+    '''collects up to batchsize rows, waiting at most interval seconds after the first
+    one for the batch to fill, and writes them. flush markers are released once the
+    rows in front of them are written'''
+    def drain(self,interval = 0):
+        rows = []
+        markers = []
+        try:
+            rows.append(self.queue.get(timeout = interval) if interval else self.queue.get_nowait())
+        except Queue.Empty:
+            return
+        deadline = time.time() + interval
+        while len(rows) < self.batchsize:
+            try:
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    rows.append(self.queue.get(timeout = remaining))
+                else:
+                    rows.append(self.queue.get_nowait())
+            except Queue.Empty:
+                break
+            if rows[-1][0] is None:
+                break
+
+        for row in rows:
+            if row[0] is None:
+                markers.append(row[1])
+        rows = [row for row in rows if row[0] is not None]
+        if rows:
+            self.writeBatch(rows)
+        for marker in markers:
+            marker.set()
+
+    '''cursor to run a statement with. inserts share a plain cursor, since MySQL
+    Connector sends an executemany insert as one multirow statement. anything else
+    gets a server side prepared statement of its own that is kept for later batches,
+    where the connection supports them'''
+    def cursorFor(self,command):
+        if self.dbconn is None:
+            self.dbconn = self.backend.connect()
+        if command.lstrip().upper().startswith("INSERT"):
+            command = None
+        cursor = self.cursors.get(command)
+        if cursor is None:
+            if command is not None:
+                try:
+                    cursor = self.dbconn.cursor(prepared = True)
+                except TypeError:
+                    pass
+            if cursor is None:
+                cursor = self.dbconn.cursor()
+            self.cursors[command] = cursor
+        return cursor
+
+    def closeCursors(self):
+        for cursor in self.cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.cursors = {}
+
+    def convert(self,command):
+        converted = self.converted.get(command)
+        if converted is None:
+            converted = self.backend.convert(command)
+            self.converted[command] = converted
+        return converted
+
+    def disconnect(self):
+        self.closeCursors()
+        if self.dbconn is not None:
+            try:
+                self.dbconn.close()
+            except Exception:
+                pass
+            self.dbconn = None
+
+    def writeBatch(self,rows):
+        try:
+            for command, paramlist in groupRows(rows):
+                self.cursorFor(command).executemany(self.convert(command),paramlist)
+            self.dbconn.commit()
+            self.rows += len(rows)
+            self.batches += 1
+        except Exception as e:
+            print("dbase error writing batch of {n} rows".format(n = len(rows)))
+            print(e)
+            self.closeCursors()
+            try:
+                self.dbconn.rollback()
+            except Exception:
+                #the connection is gone, open a new one for the retries
+                self.disconnect()
+            self.writeRows(rows)
+
+    '''falls back to one row at a time so a single bad row only loses itself'''
+    def writeRows(self,rows):
+        for command, params in rows:
+            try:
+                self.cursorFor(command).execute(self.convert(command),params)
+                self.dbconn.commit()
+                self.rows += 1
+            except Exception as e:
+                self.closeCursors()
+                try:
+                    self.dbconn.rollback()
+                except Exception:
+                    self.disconnect()
+                self.errors += 1
+                print("dbase error")
+                print(command)
+                print(params)
+                print(e)
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "DATABASE WRITER: {q} rows queued".format(q = self.queue.qsize()))
+        print(spaces*(depth+1) + "ROWS: {r}  BATCHES: {b}  DROPPED: {d}  ERRORS: {e}".format(r = self.rows, b = self.batches, d = self.dropped, e = self.errors))
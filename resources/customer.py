@@ -9,7 +9,6 @@ class CustomerProfile(object):
         self.location = location
         self.resources = resources
         self.Resources = []
-        self.tagCache = {}
         #permission to connect to grid
         self.permission = False
         
@@ -55,60 +54,28 @@ class CustomerProfile(object):
         tagClient.writeTags([self.relayTag],[True])
         
     def measureVoltage(self):
-        tag = self.voltageTag
-        tagval = tagClient.readTags([tag])
-        self.tagCache[tag] = (tagval, datetime.now())
-        return tagval
+        return tagClient.readTags([self.voltageTag])
     
     def measureCurrent(self):
-        tag = self.currentTag
-        tagval = tagClient.readTags([tag])
-        self.tagCache[tag] = (tagval, datetime.now())
-        return tagval
+        return tagClient.readTags([self.currentTag])
     
     def measurePower(self):
-        tagvals = tagClient.readTags([self.currentTag, self.voltageTag])
-        power = tagvals[self.currentTag]*tagvals[self.voltageTag]
-        self.tagCache[self.powerTag] = (power, datetime.now())
-        return power
+        tagvals = tagClient.readTagsDict([self.currentTag, self.voltageTag])
+        return tagvals[self.currentTag]*tagvals[self.voltageTag]
             
     
-    '''calls measureCurrent only if cached value isn't fresh'''    
+    '''reads current only if the cached value is older than threshold seconds'''    
     def getCurrent(self,threshold = 5.1):
-        tag = self.currentTag
-        val, time = self.tagCache.get(tag,(None, None))
-        if val is not None and time is not None:
-            diff = datetime.now() - time
-            et = diff.total_seconds()    
-                    
-            if et < threshold:
-                return val        
-        return measureCurrent()
+        return tagClient.readTagsCached([self.currentTag],threshold)
     
-    '''calls measureVoltage only if cached value isn't fresh'''
+    '''reads voltage only if the cached value is older than threshold seconds'''
     def getVoltage(self,threshold = 5.1):
-        tag = self.voltageTag
-        val, time = self.tagCache.get(tag,(None, None))
-        if val is not None and time is not None:
-            diff = datetime.now() - time
-            et = diff.total_seconds()
-            
-            if et < threshold:
-                return val
-            
-        return measureVoltage()
+        return tagClient.readTagsCached([self.voltageTag],threshold)
     
-    '''calls measurePower only if cached value isn't fresh'''
+    '''reads current and voltage only if the cached values are older than threshold seconds'''
     def getPower(self,threshold = 5.1):
-        val, time = self.tagCache.get(self.powerTag,(None, None))
-        if val is not None and time is not None:
-            diff = datetime.now() - time
-            et = diff.total_seconds()
-            
-            if et < threshold:
-                return val
-            
-        return measurePower()
+        tagvals = tagClient.readTagsCached([self.currentTag, self.voltageTag],threshold)
+        return tagvals[self.currentTag]*tagvals[self.voltageTag]
     
     def printInfo(self, depth = 0):
         spaces = '    '
@@ -1,6 +1,20 @@
+import math
+import numpy
+
 from volttron.platform.vip.agent import RPC
 from DCMGClasses.resources.demand import human
 
+#longest step in seconds over which a heat pump's efficiency is held constant
+HEATPUMP_STEP = 15
+
+'''1 where the input is nonzero and 0 elsewhere, for a single input or an array of them'''
+def onOff(input):
+    if isinstance(input,(numpy.ndarray,list,tuple)):
+        return numpy.where(numpy.asarray(input) != 0,1,0)
+    if input != 0:
+        return 1
+    return 0
+
 class DeviceComplex(object):
     def __init__(self,**devs):
         self.name = dev["name"]
@@ -145,24 +159,18 @@ class HeatingElement(Device):
             print("generated gridpoints dynamically for {dev}: {grd}".format(dev = self.name, grd = dynamicgrid))
             return dynamicgrid
         
-    #Euler's method, use only for relatively short time periods
+    #the temperature follows mass*shc*dT/dt = pin*input - (T - tamb)/thermR, which has an
+    #exact solution while the input is constant. state and input may be arrays
     def applySimulatedInput(self,state,input,duration,pin = "default"):
         state = self.statePUToEng(state)
         if pin == "default":
             pin = self.nominalpower
             
-        et = 0
-        defstep = 5
-        if input != 0:
-            input = 1
-        while et < duration:
-            if (duration - et) >= defstep:
-                step = defstep
-            else:
-                step = (duration -et)
-            et += step
-            state = (((pin*input)-((state - self.tamb)/self.thermR))/(self.mass*self.shc))*step + state
-            #print("another step: after {et} seconds out of {dur} newstate is {ns}".format(et = et, dur = duration, ns = state))
+        input = onOff(input)
+        #temperature the element would settle at
+        steady = self.tamb + pin*input*self.thermR
+        timeconstant = float(self.thermR*self.mass*self.shc)
+        state = steady + (state - steady)*math.exp(-duration/timeconstant)
             
         return self.stateEngToPU(state)
         
@@ -259,30 +267,33 @@ class HeatPump(Device):
             print("generated gridpoints dynamically for {dev}: {grd}".format(dev = self.name, grd = dynamicgrid))
             return dynamicgrid    
         
-    #Euler's method, use only for relatively short time periods
+    #the temperature follows heatcap*dT/dt = -peff*input - (T - tamb)/thermR. the heat
+    #pumped depends on the temperature through the efficiency, which is held constant
+    #over steps of up to HEATPUMP_STEP so that the exact solution for constant input can
+    #be used within each one. state and input may be arrays
     def applySimulatedInput(self,state,input,duration,pin = "default"):
         state = self.statePUToEng(state)
         if pin == "default":
             pin = self.nominalpower
-        et = 0
-        defstep = 5
-        if input != 0:
-            input = 1
-        while et < duration:
-            if (duration - et) >= defstep:
-                step = defstep
-            else:
-                step = (duration - et)
-            et += step
-            #estimate working fluid temperatures
-            tc = state - 6 + 273
-            th = self.tamb + 4 + 273
-            #print("tc: {cold}, th: {hot}, ratio: {rat}".format(cold = tc, hot = th, rat = (th/tc)))
-            #efficiency = self.carnotrelativeefficiency*(1-((tc + 273)/(th + 273)))
-            efficiency = self.carnotrelativeefficiency/((float(th)/float(tc))-1.0)
-            peff = pin*efficiency
-            state = ((-peff*input-((state - self.tamb)/self.thermR))/(self.heatcap))*step + state            
-            #print("another step: after {et} seconds out of {dur} newstate is {ns}".format(et = et, dur = duration, ns = state))
+        
+        input = onOff(input)
+        steps = max(1,int(math.ceil(duration/float(HEATPUMP_STEP))))
+        #every step is the same length, so the space approaches its steady temperature
+        #by the same fraction in each one
+        decay = math.exp(-(duration/float(steps))/float(self.thermR*self.heatcap))
+        #estimate working fluid temperatures. the cold side tc is 6 degrees below the space
+        th = self.tamb + 4 + 273.0
+        #efficiency = self.carnotrelativeefficiency*(1-((tc + 273)/(th + 273)))
+        #efficiency = self.carnotrelativeefficiency/((th/tc)-1.0), so the space would settle
+        #at tamb - pumped/((th/tc)-1.0)
+        pumped = pin*self.carnotrelativeefficiency*input*self.thermR
+        for i in range(steps):
+            #the efficiency at the starting temperature gives a first estimate of the end
+            #temperature, and the efficiency halfway between the two gives the step
+            steady = self.tamb - pumped/((th/(state + 267))-1.0)
+            end = steady + (state - steady)*decay
+            steady = self.tamb - pumped/((th/((state + end)/2.0 + 267))-1.0)
+            state = steady + (state - steady)*decay
         return self.stateEngToPU(state)
         
     def simulationStep(self,pin,duration):
@@ -1,5 +1,5 @@
 from DCMGClasses.CIP import tagClient
-from DCMGClasses.resources import resource, customer
+from DCMGClasses.resources import resource, customer, market
 from DCMGClasses.resources.misc import faults
 
 import operator
@@ -23,6 +23,31 @@ class Group(object):
         self.supplyBidList = []
         self.reserveBidList = [] 
         
+        #order books for the group's auctions, by period number
+        self.books = {}
+        
+    #the order book for a period, created the first time a bid for the period comes in
+    def book(self,period):
+        book = self.books.get(period)
+        if book is None:
+            book = market.OrderBook(period)
+            self.books[period] = book
+        return book
+    
+    #removes the order book for a period so the bids in it can be auctioned
+    def closeBook(self,period):
+        book = self.books.pop(period,None)
+        if book is None:
+            book = market.OrderBook(period)
+        return book
+    
+    #drops the order books of every period up to and including period. their auctions
+    #are over, so anything still in them came in too late
+    def closeBooksThrough(self,period):
+        for number in self.books.keys():
+            if number is None or number <= period:
+                del self.books[number]
+        
     def rebuildpriorities(self):
         self.nodeprioritylist = []
         self.loadprioritylist = []
@@ -109,13 +134,19 @@ class Zone(object):
         return newfault
             
             
-    def sumCurrents(self):
+    def getCurrentTags(self):
         inftags = []
         for edge in self.interzonaledges:
             inftags.append(edge.currentTag)
+        return inftags
+    
+    '''sums the current flowing into the zone. takes a dictionary of currents that
+    have already been read, otherwise reads them from the tag server'''
+    def sumCurrents(self,infcurrents = None):
+        inftags = self.getCurrentTags()
         
-        if len(inftags) > 0:
-            infcurrents = tagClient.readTags(inftags)
+        if infcurrents is None and len(inftags) > 0:
+            infcurrents = tagClient.readTagsDict(inftags)
             print("inftags: {inf}".format(inf = inftags))
         
         total = 0        
@@ -381,7 +412,7 @@ class Node(BaseNode):
                 inftags.append(edge.currentTag)
         
         if len(inftags) > 0:
-            infcurrents = tagClient.readTags(inftags)
+            infcurrents = tagClient.readTagsDict(inftags)
         
         total = 0
         for edge in self.edges:
@@ -0,0 +1,302 @@
+'''merit order clearing for a group's energy auction. supply bids are stacked from the
+cheapest up and demand bids from the highest rate down. power trades as long as the
+demand bid at the margin pays more than the supply bid at the margin, and the price
+is the rate of the last demand bid that traded'''
+import bisect
+import itertools
+
+import numpy
+
+#amounts closer than this are treated as equal, so rounding in the running sums
+#can't leave slivers of bids accepted
+TOLERANCE = 1e-9
+
+class ClearingResult(object):
+    def __init__(self,price,quantity,supplyaccepted,demandaccepted):
+        #None if nothing traded
+        self.price = price
+        self.quantity = quantity
+        #amount accepted from each bid, in the order the bids were given
+        self.supplyaccepted = supplyaccepted
+        self.demandaccepted = demandaccepted
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "CLEARED {q} at {p}: {ns} of {ts} supply bids, {nd} of {td} demand bids accepted".format(q = self.quantity, p = self.price, ns = int((self.supplyaccepted > 0).sum()), ts = len(self.supplyaccepted), nd = int((self.demandaccepted > 0).sum()), td = len(self.demandaccepted)))
+
+'''clears an auction given the rates and amounts of the supply and demand bids as
+sequences. bids with equal rates keep the order they were given in. the traded
+quantity is where the stacked curves stop crossing: every point where either curve
+steps is a candidate, and the marginal bids on each side of each candidate are found
+with searchsorted, so the whole thing is O(n log n) in the number of bids. bids that
+are already in merit order, e.g. from an OrderBook, can skip the sort'''
+def clear(supplyrates,supplyamounts,demandrates,demandamounts,presorted = False):
+    srates = numpy.asarray(supplyrates,dtype = numpy.float64)
+    samounts = numpy.asarray(supplyamounts,dtype = numpy.float64)
+    drates = numpy.asarray(demandrates,dtype = numpy.float64)
+    damounts = numpy.asarray(demandamounts,dtype = numpy.float64)
+    supplyaccepted = numpy.zeros(len(srates))
+    demandaccepted = numpy.zeros(len(drates))
+    if len(srates) == 0 or len(drates) == 0:
+        return ClearingResult(None,0.0,supplyaccepted,demandaccepted)
+
+    #merit order: cheapest supply first, highest paying demand first
+    if presorted:
+        sorder = numpy.arange(len(srates))
+        dorder = numpy.arange(len(drates))
+    else:
+        sorder = numpy.argsort(srates,kind = "mergesort")
+        dorder = numpy.argsort(-drates,kind = "mergesort")
+    srates = srates[sorder]
+    samounts = samounts[sorder]
+    drates = drates[dorder]
+    damounts = damounts[dorder]
+    scum = numpy.cumsum(samounts)
+    dcum = numpy.cumsum(damounts)
+    limit = min(scum[-1],dcum[-1])
+    if limit <= TOLERANCE:
+        return ClearingResult(None,0.0,supplyaccepted,demandaccepted)
+
+    #the curves are flat between the points where either one steps
+    steps = numpy.union1d(scum,dcum)
+    steps = steps[(steps > TOLERANCE) & (steps < limit - TOLERANCE)]
+    if len(steps):
+        steps = steps[numpy.concatenate(([True],numpy.diff(steps) > TOLERANCE))]
+    starts = numpy.concatenate(([0.0],steps))
+    ends = numpy.concatenate((starts[1:],[limit]))
+    sidx = numpy.searchsorted(scum,starts + TOLERANCE,"right")
+    didx = numpy.searchsorted(dcum,starts + TOLERANCE,"right")
+    crossing = drates[didx] > srates[sidx]
+
+    #the curves only get closer, so trade stops at the first stretch where they don't cross
+    if crossing.all():
+        last = len(starts) - 1
+    else:
+        last = int(numpy.argmin(crossing)) - 1
+    if last < 0:
+        return ClearingResult(None,0.0,supplyaccepted,demandaccepted)
+    quantity = ends[last]
+    price = float(drates[didx[last]])
+
+    #each bid gets whatever part of it lies below the traded quantity
+    supplyaccepted[sorder] = numpy.clip(quantity - (scum - samounts),0,samounts)
+    demandaccepted[dorder] = numpy.clip(quantity - (dcum - damounts),0,damounts)
+    supplyaccepted[supplyaccepted < TOLERANCE] = 0
+    demandaccepted[demandaccepted < TOLERANCE] = 0
+    return ClearingResult(price,float(quantity),supplyaccepted,demandaccepted)
+
+'''clears lists of control.SupplyBid and control.DemandBid objects. bids that trade
+are marked accepted, and a bid that only partly trades is marked modified and has its
+amount cut to the part that did. everything else is marked rejected'''
+def clearBids(supplybids,demandbids,presorted = False):
+    result = clear([bid.rate for bid in supplybids],[bid.amount for bid in supplybids],
+                   [bid.rate for bid in demandbids],[bid.amount for bid in demandbids],presorted)
+    markAccepted(supplybids,result.supplyaccepted)
+    markAccepted(demandbids,result.demandaccepted)
+    return result
+
+def markAccepted(bids,accepted):
+    for bid, amount in zip(bids,accepted):
+        if amount > 0:
+            bid.accepted = True
+            if amount < bid.amount - TOLERANCE:
+                bid.modified = True
+                bid.amount = float(amount)
+        else:
+            bid.accepted = False
+
+'''the bids for one group's auction in one period, kept in merit order as they come
+in: supply and reserve bids cheapest first, demand bids highest paying first, and
+bids with the same rate in the order they arrived. each side is a list of sort keys
+kept in order with bisect next to a list of the bids themselves, so a snapshot for
+clearing is just a copy'''
+class OrderBook(object):
+    SIDES = ["supply","demand","reserve"]
+
+    def __init__(self,period = None):
+        self.period = period
+        self.keys = {}
+        self.entries = {}
+        for side in self.SIDES:
+            self.keys[side] = []
+            self.entries[side] = []
+        #uid -> (side, key)
+        self.byuid = {}
+        self.arrivals = itertools.count()
+
+    def sortKey(self,side,rate):
+        if side == "demand":
+            rate = -rate
+        return (rate, next(self.arrivals))
+
+    '''adds a bid, replacing any bid already in the book with the same uid'''
+    def add(self,bid,side):
+        if bid.uid in self.byuid:
+            self.cancel(bid.uid)
+        key = self.sortKey(side,bid.rate)
+        index = bisect.bisect(self.keys[side],key)
+        self.keys[side].insert(index,key)
+        self.entries[side].insert(index,bid)
+        self.byuid[bid.uid] = (side, key)
+
+    '''removes a bid from the book and returns it, or None if it isn't there'''
+    def cancel(self,uid):
+        entry = self.byuid.pop(uid,None)
+        if entry is None:
+            return None
+        side, key = entry
+        index = bisect.bisect_left(self.keys[side],key)
+        del self.keys[side][index]
+        return self.entries[side].pop(index)
+
+    '''changes a bid's rate and/or amount. a bid whose rate changes goes behind the
+    bids it now ties with, one whose amount changes keeps its place'''
+    def amend(self,uid,rate = None,amount = None):
+        bid = self.find(uid)
+        if bid is None:
+            return None
+        if rate is not None and rate != bid.rate:
+            side = self.byuid[uid][0]
+            self.cancel(uid)
+            bid.rate = rate
+            self.add(bid,side)
+        if amount is not None:
+            bid.amount = amount
+        return bid
+
+    def find(self,uid):
+        entry = self.byuid.get(uid)
+        if entry is None:
+            return None
+        side, key = entry
+        return self.entries[side][bisect.bisect_left(self.keys[side],key)]
+
+    '''the bids on one side in merit order'''
+    def snapshot(self,side):
+        return list(self.entries[side])
+
+    def __len__(self):
+        return len(self.byuid)
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "ORDER BOOK FOR PERIOD {per}: {s} supply, {d} demand, {r} reserve bids".format(per = self.period, s = len(self.entries["supply"]), d = len(self.entries["demand"]), r = len(self.entries["reserve"])))
+
+'''the outcome of every bid in a period's auctions and the rate each customer will pay,
+collected so that each counterparty can be told everything in one message'''
+class MarketResults(object):
+    def __init__(self,period):
+        self.period = period
+        #counterparty -> list of outcome dicts
+        self.outcomes = {}
+        self.rates = {}
+
+    def add(self,bid,rate,accepted):
+        outcome = {"uid": bid.uid,
+                   "side": bid.side,
+                   "amount": bid.amount,
+                   "rate": rate,
+                   "period_number": bid.periodNumber,
+                   "accepted": accepted}
+        if bid.side == "supply":
+            outcome["service"] = bid.service
+        self.outcomes.setdefault(bid.counterparty,[]).append(outcome)
+
+    def setRate(self,counterparty,rate):
+        self.rates[counterparty] = rate
+
+    '''one market_results message for each counterparty'''
+    def messages(self,sender):
+        out = []
+        for name in set(self.outcomes) | set(self.rates):
+            mesdict = {"message_sender": sender,
+                       "message_subject": "market_results",
+                       "message_target": name,
+                       "period_number": self.period,
+                       "results": self.outcomes.get(name,[])}
+            if name in self.rates:
+                mesdict["rate"] = self.rates[name]
+            out.append(mesdict)
+        return out
+
+'''finds the group a bid belongs to without scanning every group. a bid for a specific
+device goes where the device is, any other bid goes where its counterparty's home is.
+the index has to be rebuilt whenever the groups are, and told about customers and
+resources that join a group in between'''
+class GroupIndex(object):
+    def __init__(self,grouplist = []):
+        self.rebuild(grouplist)
+
+    def rebuild(self,grouplist):
+        self.byresource = {}
+        self.bycustomer = {}
+        for group in grouplist:
+            for res in group.resources:
+                self.byresource[res.name] = group
+            for cust in group.customers:
+                self.bycustomer[cust.name] = group
+
+    def addCustomer(self,cust,group):
+        self.bycustomer[cust.name] = group
+
+    def addResource(self,res,group):
+        self.byresource[res.name] = group
+
+    '''the group whose auction the bid belongs in, or None'''
+    def groupForBid(self,bid):
+        return self.groupFor(bid.resourceName,bid.counterparty)
+
+    def groupFor(self,resourcename,counterparty):
+        if resourcename:
+            return self.byresource.get(resourcename)
+        return self.bycustomer.get(counterparty)
+
+'''accepts reserves from the cheapest up until they cover need, cutting the last one
+down to what is still missing. takes rates and amounts like clear() and returns the
+amount accepted from each'''
+def selectReserves(rates,amounts,need):
+    rates = numpy.asarray(rates,dtype = numpy.float64)
+    amounts = numpy.asarray(amounts,dtype = numpy.float64)
+    accepted = numpy.zeros(len(rates))
+    if len(rates) == 0 or need <= 0:
+        return accepted
+    order = numpy.argsort(rates,kind = "mergesort")
+    amounts = amounts[order]
+    cum = numpy.cumsum(amounts)
+    accepted[order] = numpy.clip(need - (cum - amounts),0,amounts)
+    accepted[accepted < TOLERANCE] = 0
+    return accepted
+
+'''the numbers one group's auction needs, taken out of its bids as arrays. supply and
+demand bids have to be in merit order'''
+class AuctionInput(object):
+    def __init__(self,supplybids,demandbids,reservebids,maxload):
+        self.srates = numpy.array([bid.rate for bid in supplybids],dtype = numpy.float64)
+        self.samounts = numpy.array([bid.amount for bid in supplybids],dtype = numpy.float64)
+        #power bids that can be used as reserves if they don't clear
+        self.sreserve = numpy.array([bid.auxilliaryService == "reserve" for bid in supplybids],dtype = bool)
+        self.drates = numpy.array([bid.rate for bid in demandbids],dtype = numpy.float64)
+        self.damounts = numpy.array([bid.amount for bid in demandbids],dtype = numpy.float64)
+        self.rrates = numpy.array([bid.rate for bid in reservebids],dtype = numpy.float64)
+        self.ramounts = numpy.array([bid.amount for bid in reservebids],dtype = numpy.float64)
+        self.maxload = maxload
+
+    def size(self):
+        return len(self.srates) + len(self.drates) + len(self.rrates)
+
+'''clears one group's power auction and picks its reserves. supply bids that can
+provide reserves but didn't clear compete with the reserve bids, after them and in
+supply order. returns the ClearingResult and the amount accepted from each of those
+reserves'''
+def clearAuction(auction):
+    result = clear(auction.srates,auction.samounts,auction.drates,auction.damounts,True)
+    spare = auction.sreserve & (result.supplyaccepted == 0)
+    rates = numpy.concatenate((auction.rrates,auction.srates[spare]))
+    amounts = numpy.concatenate((auction.ramounts,auction.samounts[spare]))
+    need = auction.maxload - result.demandaccepted.sum()
+    return result, selectReserves(rates,amounts,need)
+
+'''clears independent auctions one after another. nothing is settled until every one
+has cleared. returns clearAuction's results in the order of auctions'''
+def clearAuctions(auctions):
+    return [clearAuction(auction) for auction in auctions]
@@ -1,4 +1,12 @@
 import math, operator
+import collections
+
+import numpy
+
+#transitions remembered per device before its cache is emptied
+TRANSITION_CACHE_SIZE = 10000
+#prices whose solutions are remembered for each bid group and period
+WARM_START_PRICES = 64
 
 def generateStates(inputs,grid,nextgrid):
     for state in grid:
@@ -137,6 +145,56 @@ class StateGrid(object):
                         
             return intval    
                 
+    '''the grid points as rows of an array with a column for each device named in names'''
+    def pointArray(self,names):
+        return numpy.array([[point.components[name] for name in names] for point in self.grid],dtype = float)
+    
+    '''interpolatepath for many points and many sets of path costs at once. each row of
+    xs is a point, with a column for each device named in names. values has a row for
+    each grid point and a column for each set of path costs, with nan where a point has
+    no optimal input. returns a row for each point and a column for each set'''
+    def interpolatepaths(self,xs,names,values):
+        return self.weightedPaths(self.interpolationWeights(xs,names),values)
+    
+    '''the weight of each grid point in the interpolated value at each point in xs, as
+    an array with a row for each point and a column for each grid point'''
+    def interpolationWeights(self,xs,names):
+        points = self.pointArray(names)
+        if self.dim > 1:
+            #inverse distance weighting, with the value of the grid point itself for
+            #points that fall on one
+            p = 4
+            d = numpy.sqrt(((xs[:,None,:] - points[None,:,:])**2).sum(axis = 2))
+            exact = d == 0
+            onpoint = exact.any(axis = 1)
+            with numpy.errstate(divide = "ignore"):
+                w = d**-p
+            w[onpoint] = exact[onpoint]
+            return w/w.sum(axis = 1)[:,None]
+        else:
+            #linear interpolation between the neighboring grid points, extrapolating
+            #from the two outermost points beyond the ends of the grid
+            x = xs[:,0]
+            gx = points[:,0]
+            w = numpy.zeros((len(x),len(gx)))
+            if len(gx) == 1:
+                w[:,0] = 1
+                return w
+            i = numpy.clip(numpy.searchsorted(gx,x) - 1,0,len(gx) - 2)
+            t = (x - gx[i])/(gx[i + 1] - gx[i])
+            rows = numpy.arange(len(x))
+            w[rows,i] = 1 - t
+            w[rows,i + 1] = t
+            return w
+    
+    '''interpolated path costs from weights made by interpolationWeights'''
+    def weightedPaths(self,weights,values):
+        #as in interpolatepath, a grid with points lacking an optimal input gives 0
+        missing = numpy.isnan(values).any(axis = 0)
+        out = weights.dot(numpy.where(numpy.isnan(values),0,values))
+        out[:,missing] = 0
+        return out
+                
     def interpolatestate(self,x,debug = False):
         #use inverse distance weighting interpolation
         if debug:
@@ -178,6 +236,108 @@ class StateGrid(object):
         tab = "    "
         print(tab*depth + "STATE GRID has {n} grid points".format(n = len(self.grid)))
     
+'''next states from the devices' models, remembered by device, state, input, duration
+and ambient temperature. the grid points, action points and planning interval stay the
+same from one planning round to the next, so after the first round only transitions
+from newly added states such as the current one have to be simulated'''
+class TransitionCache(object):
+    def __init__(self,maxsize = TRANSITION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.transitions = {}
+        self.hits = 0
+        self.misses = 0
+        
+    '''the device's next state for every state in states and input in actions, as an
+    array with a row for each state and a column for each input'''
+    def table(self,device,states,actions,duration):
+        known = self.transitions.setdefault(device.name,{})
+        #the current state is added to the grid every round, so this keeps growing
+        if len(known) > self.maxsize:
+            known.clear()
+        tamb = getattr(device,"tamb",None)
+        out = numpy.empty((len(states),len(actions)))
+        for i, state in enumerate(states):
+            for k, action in enumerate(actions):
+                key = (state,action,duration,tamb)
+                if key in known:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    known[key] = device.applySimulatedInput(state,action,duration)
+                out[i,k] = known[key]
+        return out
+    
+    def clear(self):
+        self.transitions = {}
+        
+    def printInfo(self,depth = 0):
+        tab = "    "
+        print(tab*depth + "TRANSITION CACHE: {n} devices, {h} hits, {m} misses".format(n = len(self.transitions), h = self.hits, m = self.misses))
+    
+'''what the last solves of one bid group's plan for one period found, so that the next
+solve for the same period only redoes what could have changed. the price independent
+part of the stage is kept by grid point, so the current state being added to the grid
+or dropped from it between rounds leaves the other points usable. the devices' models
+and cost functions are assumed not to change while the agent runs'''
+class StageMemo(object):
+    def __init__(self):
+        self.signature = None
+        #grid point -> (admissible inputs, next states, next state costs)
+        self.rows = {}
+        #price -> StageSolution, oldest first
+        self.solutions = collections.OrderedDict()
+        #the next plan's grid points and the interpolation weights for the next states
+        self.weights = (None, None)
+        
+    '''forgets everything if the inputs being considered have changed, e.g. because of a
+    new DR event'''
+    def setInputs(self,signature):
+        if signature != self.signature:
+            self.signature = signature
+            self.rows = {}
+            self.solutions = collections.OrderedDict()
+            self.weights = (None, None)
+            
+    def addSolution(self,price,solution):
+        self.solutions.pop(price,None)
+        self.solutions[price] = solution
+        while len(self.solutions) > WARM_START_PRICES:
+            self.solutions.popitem(last = False)
+            
+'''the path cost and optimal input index of each grid point for one price, the next
+plan's grid points and path costs they were worked out from, and the cost of each
+input at that price'''
+class StageSolution(object):
+    def __init__(self,nextkeys,nextvalues,inputcosts,values):
+        self.nextkeys = nextkeys
+        self.nextvalues = nextvalues
+        self.inputcosts = inputcosts
+        #grid point -> (path cost, input index)
+        self.values = values
+        
+'''stage memos for every bid group and period in the planning window'''
+class WarmStart(object):
+    def __init__(self):
+        self.memos = {}
+        self.reused = 0
+        self.evaluated = 0
+        
+    def memo(self,devices,periodNumber):
+        key = (tuple(sorted([dev.name for dev in devices])),periodNumber)
+        if key not in self.memos:
+            self.memos[key] = StageMemo()
+        return self.memos[key]
+    
+    '''drops the memos of periods before firstperiod'''
+    def expire(self,firstperiod):
+        for key in self.memos.keys():
+            if key[1] < firstperiod:
+                del self.memos[key]
+                
+    def printInfo(self,depth = 0):
+        tab = "    "
+        print(tab*depth + "WARM START: {n} stage memos, {r} state solutions reused, {e} evaluated".format(n = len(self.memos), r = self.reused, e = self.evaluated))
+    
 class InputSignal(object):
     def __init__(self,comps,gridconnected,drpart):
         self.gridconnected = gridconnected
@@ -17,8 +17,6 @@ class Resource(object):
         self.capCost = res["capCost"]
         self.name = res["name"]
         
-        self.tagCache = {}
-        
         self.isintermittent = False
         self.issource = False
         self.issink = False
@@ -1,67 +1,224 @@
+import os
 import time
 
+'''ring buffer of the most recent samples of one signal, with the average of the
+samples in the buffer and of every sample ever added. if a path is given each
+sample is also appended to <path>/<signal>.csv'''
 class DataSeries(object):
-    def __init(self,signalname,pathname):
-        try:
-            #make directories on path
-            os.makedirs(pathname)
-            self.signalname = signalname
-            self.pathname = pathname + "{sig}.csv".format(sig = self.signalname)
-            #create file, truncating if it exists
-            file = open(self.pathname,'r')
-            file.close()
-            
-            self.bufsize = 10
-            self.length = 0
-            self.buffer = [0] * self.bufsize
+    def __init__(self,signalname,bufsize = 10,pathname = None):
+        self.signalname = signalname
+        self.bufsize = bufsize
+        self.length = 0
+        self.times = [0.0] * self.bufsize
+        self.buffer = [0.0] * self.bufsize
+        self.bufptr = -1
+
+        self.rollingavg = 0
+        self.avg = 0
+
+        self.pathname = None
+        if pathname is not None:
+            try:
+                #make directories on path
+                pathname = os.path.expanduser(pathname)
+                if not os.path.isdir(pathname):
+                    os.makedirs(pathname)
+                self.pathname = os.path.join(pathname,"{sig}.csv".format(sig = self.signalname))
+                #create file, truncating if it exists
+                file = open(self.pathname,'w')
+                file.close()
+            except Exception as e:
+                print(e)
+                self.pathname = None
+
+    def addPoint(self,value,t = None):
+        if t is None:
+            t = time.time()
+        if self.pathname is not None:
+            try:
+                file = open(self.pathname,'a')
+                file.write("{val}, {time}\n".format(val = value, time = t))
+                file.close()
+            except IOError as e:
+                print("couldn't open file")
+
+        self.length += 1
+        self.bufptr += 1
+        if self.bufptr >= self.bufsize:
             self.bufptr = 0
-            
-            self.rollingavg = 0
-            self.avg = 0
-        except Exception as e:
-            print(e)
-            
-            
-    def addPoint(self,value):
-        try:
-            file = open(self.pathname,'a')
-            #write to file here
-            file.write("{val}, {time}\n".format(val = value, time.time()))
-            file.close()
-            #write to buffer here
-            
-            self.length += 1
-            self.bufptr += 1
-            if self.bufptr > 9:
-                self.bufptr = 0
-            old = self.buffer[self.bufptr]
-            self.buffer[self.bufptr] = value
-            
-            #update averages
-            self.rollingavg += ((value - old)/self.bufsize)
-            if self.length == 1:
-                self.avg = value
-            else:
-                self.avg = ((self.length-1)/self.length)*(self.avg + value)
-            
-        except IOError as e:
-            print("couldn't open file")
-        
-            
+        old = self.buffer[self.bufptr]
+        self.buffer[self.bufptr] = value
+        self.times[self.bufptr] = t
+
+        #update averages
+        if self.length <= self.bufsize:
+            self.rollingavg += (value - self.rollingavg)/float(self.length)
+        else:
+            self.rollingavg += (value - old)/float(self.bufsize)
+        self.avg += (value - self.avg)/float(self.length)
+
+    '''the buffered samples as (time, value) pairs, oldest first'''
+    def recent(self):
+        n = min(self.length,self.bufsize)
+        out = []
+        for i in range(n):
+            index = (self.bufptr - n + 1 + i) % self.bufsize
+            out.append((self.times[index],self.buffer[index]))
+        return out
+
+    def last(self):
+        if self.length == 0:
+            return None
+        return self.buffer[self.bufptr]
+
+
+'''min, max, mean and last value of one signal over a window of fixed length. windows
+are aligned to multiples of their length, so every signal's minute rollups start on
+the minute'''
+class Rollup(object):
+    def __init__(self,signalname,window):
+        self.signalname = signalname
+        self.window = window
+        self.start = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    '''adds a sample, first returning the finished window if the sample belongs to a
+    later one'''
+    def addPoint(self,value,t):
+        done = None
+        start = t - (t % self.window)
+        if self.start is not None and start != self.start and self.count:
+            done = self.result()
+            self.reset()
+        self.start = start
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        return done
+
+    def result(self):
+        return RollupResult(self.signalname,self.window,self.start,self.min,self.max,self.total/self.count,self.last,self.count)
+
+    '''returns the window in progress, if it has any samples, and starts over'''
+    def flush(self):
+        if not self.count:
+            return None
+        done = self.result()
+        self.reset()
+        return done
+
+class RollupResult(object):
+    def __init__(self,signalname,window,start,min,max,mean,last,count):
+        self.signalname = signalname
+        self.window = window
+        self.start = start
+        self.min = min
+        self.max = max
+        self.mean = mean
+        self.last = last
+        self.count = count
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "{sig} {w} s from {start}: min {mn} max {mx} mean {avg} last {last} ({n} samples)".format(sig = self.signalname, w = self.window, start = self.start, mn = self.min, mx = self.max, avg = self.mean, last = self.last, n = self.count))
+
+'''streaming aggregator for many signals. every sample goes into the signal's
+rollups, one per window length, and into a short ring buffer of raw samples. the
+caller stores the finished rollups instead of the raw samples, and when something
+interesting happens asks for the raw samples leading up to it and keeps getting raw
+samples for a while afterwards'''
+class RollupAggregator(object):
+    def __init__(self,windows = [60],rawsize = 24):
+        self.windows = list(windows)
+        self.rawsize = rawsize
+        self.series = {}
+        self.rollups = {}
+        self.rawuntil = 0
+        #raw samples up to this time have already been handed out
+        self.rawthrough = 0
+
+        self.samples = 0
+        self.results = 0
+
+    '''adds a sample and returns the rollups it finished, and whether the raw sample
+    should be stored too'''
+    def addPoint(self,signalname,value,t = None):
+        if t is None:
+            t = time.time()
+        series = self.series.get(signalname)
+        if series is None:
+            series = DataSeries(signalname,self.rawsize)
+            self.series[signalname] = series
+            self.rollups[signalname] = [Rollup(signalname,window) for window in self.windows]
+        series.addPoint(value,t)
+        self.samples += 1
+
+        done = []
+        for rollup in self.rollups[signalname]:
+            result = rollup.addPoint(value,t)
+            if result is not None:
+                done.append(result)
+        self.results += len(done)
+        raw = t < self.rawuntil
+        if raw:
+            self.rawthrough = max(self.rawthrough,t)
+        return done, raw
+
+    '''returns the buffered raw samples of every signal that haven't been handed out
+    yet as (signal, time, value) and makes addPoint ask for raw samples for the next
+    duration seconds'''
+    def capture(self,duration = 0):
+        now = time.time()
+        self.rawuntil = max(self.rawuntil,now + duration)
+        out = []
+        for name in self.series:
+            for t, value in self.series[name].recent():
+                if t > self.rawthrough:
+                    out.append((name,t,value))
+        self.rawthrough = max(self.rawthrough,now)
+        return out
+
+    '''finishes every window in progress, e.g. when shutting down'''
+    def flush(self):
+        done = []
+        for name in self.rollups:
+            for rollup in self.rollups[name]:
+                result = rollup.flush()
+                if result is not None:
+                    done.append(result)
+        self.results += len(done)
+        return done
+
+    def printInfo(self,depth = 0):
+        spaces = "    "
+        print(spaces*depth + "ROLLUPS: {n} signals, windows {w} s".format(n = len(self.series), w = self.windows))
+        print(spaces*(depth+1) + "SAMPLES: {s}  ROLLUPS WRITTEN: {r}".format(s = self.samples, r = self.results))
+
+
 class StatsBase(object):
     def __init__(self):
         self.logpathbase = "~/volttron/ugridlogs/"
         self.timeseries = {}
-        
+
     def addNewSeries(self,signalname,pathname):
-        self.timeseries[signalname] = DataSeries(signalname,pathname)
-    
-    
- 
+        self.timeseries[signalname] = DataSeries(signalname,pathname = pathname)
+
+
+
 class HomeownerStats(StatsBase):
     def __init__(self,homename):
-        super(self,HomeownerStats).__init__()
+        super(HomeownerStats,self).__init__()
         self.homename = homename
         self.logpathagent = self.logpathbase + "{path}/".format(path = homename)
-        
-        
\ No newline at end of file
+